@@ -1,60 +1,364 @@
-import requests
+import time
+import json
+import zlib
+import logging
+import threading
+import collections
+import concurrent.futures
+from urllib.parse import urlparse
+from db import storage
+from agents import summarizer
+from agents.source_health import HealthRecorder, plan_order
+from utils import http_client
 from utils.rss_parser import parse_rss
+from utils.topic_matcher import compile_matcher, entry_text
+from utils.logger import log_event, span, record_cache
 from newspaper import Article
+from newspaper.network import get_html_2XX_only
 
-def fetch_articles(sources, max_articles=50):
-    articles = []
-    for src in sources:
-        if len(articles) >= max_articles:
-            return articles
-        filter_topic = src.get('filter_topic')
-        if 'rss' in src['url'].lower():
-            feed_articles = parse_rss(src['url'])
-            filtered = []
-            if filter_topic:
-                keyword = filter_topic.lower()
-                for a in feed_articles:
-                    title = a.get('title', '').lower()
-                    summary = a.get('summary', '').lower()
-                    tags = a.get('tags', '').lower() if 'tags' in a else ''
-                    if keyword in title or keyword in summary or keyword in tags:
-                        filtered.append(a)
-            else:
-                filtered = feed_articles
-            per_source_count = 0
-            for a in filtered:
-                if len(articles) >= max_articles or per_source_count >= 5:
-                    break
-                art = {'title': a['title'], 'url': a['link'], 'source_name': src['name']}
-                try:
-                    article = Article(a['link'])
-                    article.download()
-                    article.parse()
-                    art['raw_text'] = article.text
-                    # Use newspaper3k's top_image as fallback if image_url not set
-                    if not art.get('image_url'):
-                        art['image_url'] = getattr(article, 'top_image', None)
-                except Exception:
-                    art['raw_text'] = a.get('summary', '')
-                articles.append(art)
-                per_source_count += 1
+MAX_PER_SOURCE = 5
+DEFAULT_WORKERS = 8
+DEFAULT_PER_HOST = 2
+DEFAULT_TIMEOUT = 15
+EXTRACTION_CACHE_TTL = 7 * 24 * 3600
+EXTRACTION_CACHE_MAX_ENTRIES = 5000
+
+class HostLimiter:
+    """
+    Hands out one semaphore per host so a single site never sees more than
+    `per_host` concurrent downloads, whatever the size of the worker pool.
+    """
+    def __init__(self, per_host=DEFAULT_PER_HOST):
+        self.per_host = max(1, per_host)
+        self._lock = threading.Lock()
+        self._slots = {}
+
+    def slot(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._slots[host]
+
+class CachedArticle:
+    """
+    Stands in for a downloaded newspaper Article whose text we already have, from the
+    articles table or the extraction cache. parse() has nothing left to do.
+    """
+    def __init__(self, title='', text='', top_image='', summary=None, summary_tier=None):
+        self.title = title
+        self.text = text
+        self.top_image = top_image
+        self.summary = summary
+        self.summary_tier = summary_tier
+        self.publish_date = None
+
+    def parse(self):
+        pass
+
+def cached_articles(urls, db_path=None):
+    """
+    CachedArticles for the `urls` we have already extracted, keyed by URL: stored
+    articles first (with their summary), then the extraction cache. One bulk query each.
+    """
+    found = {}
+    for url, row in storage.known_articles(urls, db_path=db_path).items():
+        if row['raw_text']:
+            found[url] = CachedArticle(row['title'], row['raw_text'], row['image_url'],
+                                       row['summary'] if summarizer.is_usable(row['summary']) else None, row['summary_tier'])
+    missing = [u for u in dict.fromkeys(urls) if u and u not in found]
+    conn = storage.get_connection(db_path)
+    for i in range(0, len(missing), 500):
+        chunk = missing[i:i + 500]
+        rows = conn.execute(f"SELECT url, data FROM extraction_cache WHERE fetched_at > ? AND url IN ({','.join('?' * len(chunk))})",
+                            [time.time() - EXTRACTION_CACHE_TTL, *chunk])
+        for row in rows:
+            data = json.loads(zlib.decompress(row['data']))
+            found[row['url']] = CachedArticle(data.get('title', ''), data.get('text', ''), data.get('top_image', ''))
+    record_cache('extraction', hits=len(found), misses=len(set(urls)) - len(found))
+    return found
+
+def store_extraction(url, article, db_path=None, max_entries=None):
+    """
+    Cache the extracted title, text and top image of `url`, compressed, and evict the
+    oldest entries beyond `max_entries`.
+    """
+    max_entries = max_entries or EXTRACTION_CACHE_MAX_ENTRIES
+    data = zlib.compress(json.dumps({'title': article.title, 'text': article.text,
+                                     'top_image': getattr(article, 'top_image', '')}).encode('utf-8'))
+    conn = storage.get_connection(db_path)
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO extraction_cache (url, data, fetched_at) VALUES (?, ?, ?)', (url, data, time.time()))
+        conn.execute('''
+            DELETE FROM extraction_cache WHERE url IN (
+                SELECT url FROM extraction_cache ORDER BY fetched_at DESC, rowid DESC LIMIT -1 OFFSET ?
+            )''', (max_entries,))
+
+def _fetch_html(url, timeout):
+    # Through the shared pool, capped at MAX_RESPONSE_BYTES; newspaper still decides the encoding
+    response = http_client.fetch(url, timeout=timeout)
+    return get_html_2XX_only(url, response=response)
+
+def _download(url, timeout):
+    with span('download', source=url):
+        article = Article(url, request_timeout=timeout)
+        article.download(input_html=_fetch_html(url, timeout))
+    return article
+
+def _parse(article, url):
+    # Cached articles are already extracted; only time real parses
+    if isinstance(article, CachedArticle):
+        return
+    with span('extract', source=url):
+        article.parse()
+
+def _plan_source(src, new_only=False, topics=None, db_path=None, health=None):
+    """
+    Download jobs for one source, polling its feed: see plan_jobs().
+    """
+    matcher = compile_matcher([*(topics or []), src.get('filter_topic')])
+    if 'rss' not in src['url'].lower():
+        # Direct URL (fallback)
+        return [(None, src, matcher)]
+    match = None
+    if src.get('filter_topic'):
+        match = lambda entry: matcher.search(entry_text(entry)) is not None
+    # The parser stops reading the feed once it has enough matching entries
+    errors = []
+    totals = []
+    if health is not None:
+        health.started(src['url'])
+    started = time.monotonic()
+    entries = parse_rss(src['url'], new_only=new_only, limit=MAX_PER_SOURCE, match=match,
+                        on_error=errors.append, on_total=totals.append, db_path=db_path)[:MAX_PER_SOURCE]
+    if health is not None:
+        # The feed's entries, not just the new ones: polling a quiet feed often says
+        # nothing about its quality
+        health.poll(src['url'], time.monotonic() - started, totals[0] if totals else len(entries),
+                    errors[0] if errors else None)
+    cached = cached_articles([entry['link'] for entry in entries], db_path)
+    jobs = []
+    for entry in entries:
+        entry['cached'] = cached.get(entry['link'])
+        if new_only and entry['cached'] is not None and entry['cached'].summary:
+            continue
+        entry['tags'] = matcher.topics_in(entry_text(entry)) if matcher else []
+        jobs.append((entry, src, matcher))
+    return jobs
+
+def _polled(executor, sources, poll, ahead, expires=None):
+    """
+    Yield poll(src) for each of `sources`, in order, running the polls on `executor`
+    at most `ahead` sources ahead of the consumer. Stops when the monotonic time
+    `expires` passes; polls not started by then are cancelled.
+    """
+    sources = iter(sources)
+    pending = collections.deque()
+    try:
+        while True:
+            while len(pending) < ahead and (src := next(sources, None)) is not None:
+                pending.append(executor.submit(poll, src))
+            if not pending:
+                return
+            remaining = max(0, expires - time.monotonic()) if expires else None
+            try:
+                pending[0].result(timeout=remaining)
+            except concurrent.futures.TimeoutError:
+                # Out of time: plan the feeds that have been read and skip the rest
+                read = [future for future in pending if future.done()]
+                log_event(f"Deadline reached while polling feeds; {len(pending) - len(read)} sources skipped",
+                          logging.WARNING)
+                pending = collections.deque(future for future in pending if not future.done())
+                for future in read:
+                    yield future.result()
+                return
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+def plan_jobs(sources, max_articles, new_only=False, topics=None, db_path=None, health=None, executor=None,
+              ahead=DEFAULT_WORKERS, expires=None):
+    """
+    Yield (entry, src, matcher) download jobs; `entry` is None
+    for a direct URL and `matcher` is the TopicMatcher for the user's `topics` plus the
+    source's filter_topic (None if there are none). Feed entries of hybrid sources are
+    rejected here, on their metadata, before anything is downloaded, and every entry
+    gets the topics it mentions in 'tags'. Entries we have already extracted carry a
+    CachedArticle in 'cached' and never reach the network; with `new_only`, entries
+    that are already stored are skipped altogether.
+    Feed entries always yield an article (falling back to the RSS summary), so they
+    count towards `max_articles` as soon as they are planned; direct URLs may be
+    rejected and do not. Feeds are parsed lazily, as jobs are consumed: one at a time
+    on the caller's thread, or up to `ahead` at once on `executor`. Planning stops at
+    the monotonic time `expires`.
+    Sources whose circuit breaker is open are skipped and the rest are planned best
+    expected yield first; feed polls are reported to the `health` recorder.
+    """
+    db_path = db_path or storage.DB_PATH
+    known = storage.get_source_health([src['url'] for src in sources], db_path=db_path)
+    poll = lambda src: _plan_source(src, new_only, topics, db_path, health)
+    ordered = plan_order(sources, known)
+    if executor is None:
+        polls = (poll(src) for src in ordered if not expires or time.monotonic() < expires)
+    else:
+        polls = _polled(executor, ordered, poll, max(1, ahead), expires)
+    scheduled = 0
+    try:
+        for jobs in polls:
+            for entry, src, matcher in jobs:
+                if scheduled >= max_articles:
+                    return
+                yield entry, src, matcher
+                if entry is not None:
+                    scheduled += 1
+            if scheduled >= max_articles:
+                return
+    finally:
+        polls.close()
+
+def download_job(entry, src, limiter, timeout=DEFAULT_TIMEOUT, health=None):
+    """
+    Network half of a job: download the page without parsing it.
+    Returns the downloaded Article (or the entry's CachedArticle), or None if the
+    download failed. The time spent, not counting the wait for a per-host slot, goes
+    to the `health` recorder; for a direct URL the download is the source's poll.
+    """
+    if entry is not None and entry.get('cached') is not None:
+        return entry['cached']
+    url = entry['link'] if entry is not None else src['url']
+    with limiter.slot(url):
+        if health is not None:
+            health.started(src['url'], 'poll' if entry is None else 'download')
+        started = time.monotonic()
+        try:
+            article, error = _download(url, timeout), None
+        except Exception as e:
+            article, error = None, e
+        elapsed = time.monotonic() - started
+    if health is not None:
+        if entry is None:
+            health.poll(src['url'], elapsed, int(article is not None), error)
         else:
-            # Direct URL (fallback)
-            per_source_count = 0
+            health.download(src['url'], elapsed, article is not None)
+    return article
+
+def _fallback_article(entry, src):
+    return {'title': entry['title'], 'url': entry['link'], 'source_name': src['name'],
+            'published': entry.get('published'), 'trust_score': src.get('trust_score'),
+            'raw_text': entry.get('summary', ''), 'tags': entry.get('tags', [])}
+
+def _record_extraction(health, src, article, ok):
+    # Cached articles say nothing about how the source is doing today
+    if health is not None and not isinstance(article, CachedArticle):
+        health.extraction(src['url'], ok)
+
+def extract_job(entry, src, article, matcher=None, db_path=None, health=None):
+    """
+    CPU half of a job: parse a downloaded Article into an article dict. Feed entries
+    fall back to their RSS summary; direct URLs that fail or miss their
+    filter_topic return None. Freshly extracted feed entries go into the extraction
+    cache; articles already stored with a summary come back with 'summary' and
+    'stored' set. Whether the page yielded text goes to the `health` recorder.
+    """
+    if entry is not None:
+        art = _fallback_article(entry, src)
+        if article is None:
+            _record_extraction(health, src, article, False)
+            return art
+        try:
+            _parse(article, entry['link'])
+        except Exception:
+            _record_extraction(health, src, article, False)
+            return art
+        _record_extraction(health, src, article, bool(article.text))
+        art['raw_text'] = article.text
+        # Use newspaper3k's top_image as fallback if image_url not set
+        if not art.get('image_url'):
+            art['image_url'] = getattr(article, 'top_image', None)
+        if isinstance(article, CachedArticle):
+            if article.summary:
+                art['summary'] = article.summary
+                art['summary_tier'] = article.summary_tier
+                art['stored'] = True
+        elif article.text:
             try:
-                if len(articles) >= max_articles or per_source_count >= 5:
-                    break
-                article = Article(src['url'])
-                article.download()
-                article.parse()
-                art = {'title': article.title, 'url': src['url'], 'raw_text': article.text, 'source_name': src['name']}
-                if filter_topic:
-                    # Only include if keyword appears in title or text
-                    keyword = filter_topic.lower()
-                    if keyword not in (article.title or '').lower() and keyword not in (article.text or '').lower():
-                        continue
-                articles.append(art)
-                per_source_count += 1
+                store_extraction(entry['link'], article, db_path)
+            except Exception as e:
+                log_event(f"Could not cache extraction of {entry['link']}: {e}", logging.WARNING)
+        return art
+    if article is None:
+        _record_extraction(health, src, article, False)
+        return None
+    try:
+        _parse(article, src['url'])
+    except Exception:
+        _record_extraction(health, src, article, False)
+        return None
+    _record_extraction(health, src, article, bool(article.text))
+    # A direct URL has no feed metadata, so it is matched on the parsed page instead
+    tags = matcher.topics_in(f"{article.title or ''}\n{article.text or ''}") if matcher else []
+    if src.get('filter_topic') and not tags:
+        return None
+    publish_date = getattr(article, 'publish_date', None)
+    return {'title': article.title, 'url': src['url'], 'raw_text': article.text, 'source_name': src['name'],
+            'published': publish_date.isoformat() if publish_date else None,
+            'trust_score': src.get('trust_score'), 'tags': tags}
+
+def _fetch_job(entry, src, matcher, limiter, timeout, db_path, health=None):
+    return extract_job(entry, src, download_job(entry, src, limiter, timeout, health), matcher, db_path, health)
+
+def fetch_articles(sources, max_articles=50, max_workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST,
+                   timeout=DEFAULT_TIMEOUT, deadline=None, new_only=False, topics=None, db_path=None):
+    """
+    Download and parse articles from `sources` on a pool of `max_workers` threads.
+    At most `per_host` downloads run against the same host at once and each HTTP
+    request gives up after `timeout` seconds. `deadline` (seconds) bounds the whole
+    batch, feed polls included: feed entries still pending then fall back to their RSS summary and
+    pending direct URLs are dropped. With `new_only`, only feed entries that were not
+    present on the previous poll of that feed are fetched. Articles are tagged with
+    the `topics` they mention. Pages already extracted (stored in `db_path` or in
+    the extraction cache) are not downloaded again.
+    Failing sources are skipped while their circuit breaker is open and the rest are
+    fetched best expected yield first; results come back in that order, and what the
+    run saw of each source is folded into its health record.
+    """
+    # Resolved once: jobs still running after the deadline must not see a different database
+    db_path = db_path or storage.DB_PATH
+    limiter = HostLimiter(per_host)
+    health = HealthRecorder()
+    expires = time.monotonic() + deadline if deadline else None
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        # Feeds are polled on the pool too, so downloads start while later feeds are still being read
+        jobs = [(entry, src, executor.submit(_fetch_job, entry, src, matcher, limiter, timeout, db_path, health))
+                for entry, src, matcher in plan_jobs(sources, max_articles, new_only, topics, db_path, health,
+                                                     executor, max_workers, expires)]
+        articles = []
+        for entry, src, future in jobs:
+            if len(articles) >= max_articles:
+                break
+            remaining = max(0, expires - time.monotonic()) if expires else None
+            try:
+                art = future.result(timeout=remaining)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                if entry is None:
+                    continue
+                art = _fallback_article(entry, src)
             except Exception:
                 continue
-    return articles
+            if art is not None:
+                articles.append(art)
+        return articles
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        # Polls and downloads still running past the deadline are written as timeouts
+        flush_health(health, db_path)
+
+def flush_health(health, db_path=None):
+    # Health bookkeeping must never cost the articles themselves
+    try:
+        health.flush(db_path)
+    except Exception as e:
+        log_event(f"Could not record source health: {e}", logging.WARNING)
@@ -0,0 +1,61 @@
+"""
+Near-duplicate story detection: groups syndicated copies of a story before summarization
+so only one article per story is sent to the LLM.
+"""
+import logging
+from typing import List, Dict
+
+from agents import summarizer
+from db import storage
+from utils import minhash
+from utils.logger import log_event
+
+class StoryClusterer:
+    """
+    Incremental form of cluster_articles(): add() articles one at a time, as they are
+    extracted, and it tells you whether each one still needs a summary.
+    """
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self.representatives = []
+
+    def add(self, art: Dict) -> bool:
+        if art.get('stored'):
+            # Served from the database with its summary; its cluster is already recorded
+            return False
+        sig = minhash.signature(art.get('raw_text'))
+        art['minhash'] = sig
+        if sig is None:
+            # Too short to compare reliably (e.g. an RSS blurb); summarize on its own
+            return True
+        closest = None
+        for rep_sig, rep in self.representatives:
+            score = minhash.similarity(sig, rep_sig)
+            if score >= minhash.THRESHOLD and (closest is None or score > closest[0]):
+                closest = (score, rep)
+        if closest:
+            art['cluster_url'] = closest[1]['cluster_url']
+            art['duplicate_of'] = closest[1]
+            return False
+        stored = storage.find_near_duplicate(sig, db_path=self.db_path)
+        if stored and summarizer.is_usable(stored['summary']):
+            log_event(f"'{art.get('title')}' is a copy of stored story {stored['url']}", logging.DEBUG)
+            art['cluster_url'] = stored['url']
+            art['summary'] = stored['summary']
+            art['summary_tier'] = stored['summary_tier']
+            return False
+        art['cluster_url'] = art['url']
+        self.representatives.append((sig, art))
+        return True
+
+def cluster_articles(articles: List[Dict], db_path=None) -> List[Dict]:
+    """
+    Compute a MinHash signature of each article's raw_text and assign it to a story
+    cluster. Sets 'minhash' and 'cluster_url' (URL of the story's representative
+    article) on every article long enough to compare. Copies of a story seen earlier in the
+    batch get 'duplicate_of' pointing at that article; copies of a story already in
+    the database reuse its stored summary.
+    Returns the articles that still need a summary, in their original order.
+    """
+    clusterer = StoryClusterer(db_path)
+    return [art for art in articles if clusterer.add(art)]
@@ -0,0 +1,295 @@
+"""
+Ingestion pipeline shared by the Streamlit app and the ingest daemon: fetch -> summarize -> store.
+"""
+import time
+import queue
+import logging
+import threading
+import concurrent.futures
+from typing import List, Dict, Iterator
+
+from agents import summarizer
+from agents.article_fetcher import fetch_articles, plan_jobs, download_job, extract_job, flush_health, HostLimiter
+from agents.article_fetcher import DEFAULT_WORKERS, DEFAULT_PER_HOST, DEFAULT_TIMEOUT
+from agents.source_health import HealthRecorder
+from agents.deduplicator import cluster_articles, StoryClusterer
+from agents.summary_scheduler import summarize_tiered_batch, SummaryScheduler
+from agents.summary_scheduler import DEFAULT_WORKERS as SUMMARY_WORKERS
+from db import storage
+from utils.logger import log_event
+from utils.thumbnails import cache_thumbnails
+
+BUFFER_SIZE = 8
+WRITE_BATCH = 10
+WRITE_INTERVAL = 2.0
+
+_DONE = object()
+
+def _local_summary(art):
+    return summarizer.summarize_local(art.get('raw_text')), summarizer.LOCAL
+
+def _cache_thumbnails(articles, db_path):
+    # A missing thumbnail only costs the placeholder; never let it fail the article
+    try:
+        cache_thumbnails([art.get('image_url') for art in articles], db_path=db_path)
+    except Exception as e:
+        log_event(f"Could not cache thumbnails: {e}", logging.WARNING)
+
+def ingest_sources(sources: List[Dict], max_articles: int = 20, new_only: bool = False, db_path=None,
+                   topics: List[str] = None) -> List[Dict]:
+    """
+    Fetch articles from `sources`, tag them with the `topics` they mention, summarize
+    one article per story, cache its image thumbnail and save them all in one transaction.
+    Returns the fetched article dicts with their 'summary' and 'summary_tier' filled in.
+    """
+    articles = fetch_articles(sources, max_articles=max_articles, new_only=new_only, topics=topics, db_path=db_path)
+    if not articles:
+        return []
+    # Summarize one article per story; near-duplicates share its summary
+    to_summarize = cluster_articles(articles, db_path=db_path)
+    summaries = summarize_tiered_batch(to_summarize, db_path=db_path)
+    for art, (summary, tier) in zip(to_summarize, summaries):
+        art['summary'], art['summary_tier'] = summary, tier
+    _cache_thumbnails([art for art in articles if not art.get('stored')], db_path)
+    for art in articles:
+        if 'duplicate_of' in art:
+            art['summary'] = art['duplicate_of']['summary']
+            art['summary_tier'] = art['duplicate_of']['summary_tier']
+    try:
+        # Articles served from the database are already stored as they are
+        saved = storage.save_articles([art for art in articles if not art.get('stored')], db_path=db_path)
+        log_event(f"Saved {saved} of {len(articles)} articles")
+    except Exception as e:
+        log_event(f"Could not save articles: {e}", logging.ERROR)
+    return articles
+
+def _put(q, item, stop):
+    # Block while the next stage is busy (back-pressure), but give up once the pipeline stops
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+class _Pipeline:
+    """
+    download -> extract -> summarize -> store, each stage on its own thread(s) and
+    joined by bounded queues, so a slow stage holds back the ones before it instead
+    of buffering the whole batch in memory.
+    """
+    def __init__(self, sources, max_articles, new_only, topics, db_path, buffer_size, write_batch, write_interval,
+                 download_workers, per_host, timeout, summary_workers):
+        self.sources = sources
+        self.max_articles = max_articles
+        self.new_only = new_only
+        self.topics = topics
+        self.db_path = db_path
+        self.write_batch = max(1, write_batch)
+        self.write_interval = write_interval
+        self.download_workers = max(1, download_workers)
+        self.per_host = per_host
+        self.timeout = timeout
+        self.summary_workers = max(1, summary_workers)
+        self.stop = threading.Event()
+        self.downloaded = queue.Queue(buffer_size)
+        self.extracted = queue.Queue(buffer_size)
+        self.summarized = queue.Queue(buffer_size)
+        self.to_store = queue.Queue()
+        self.saved = 0
+        self.health = HealthRecorder()
+        self.threads = [threading.Thread(target=target, daemon=True)
+                        for target in (self._download, self._extract, self._summarize, self._store)]
+
+    def _bounded_pool(self, workers, jobs, work, output):
+        """
+        Run work(job) on `workers` threads and push each result to `output` as it completes.
+        At most `workers` jobs are in flight, so results never pile up ahead of `output`.
+        """
+        slots = threading.BoundedSemaphore(workers)
+
+        def done(future):
+            try:
+                result = future.result()
+            except Exception as e:
+                log_event(f"Pipeline job failed: {e}", logging.ERROR)
+                result = None
+            if result is not None:
+                _put(output, result, self.stop)
+            slots.release()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for job in jobs:
+                slots.acquire()
+                if self.stop.is_set():
+                    slots.release()
+                    break
+                executor.submit(work, job).add_done_callback(done)
+
+    def _download(self):
+        limiter = HostLimiter(self.per_host)
+
+        def work(job):
+            entry, src, matcher = job
+            return entry, src, download_job(entry, src, limiter, self.timeout, self.health), matcher
+
+        try:
+            # Feeds are polled on their own threads, ahead of the downloads that need them
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.download_workers) as polls:
+                jobs = plan_jobs(self.sources, self.max_articles, self.new_only, self.topics, self.db_path,
+                                 self.health, polls, self.download_workers)
+                try:
+                    self._bounded_pool(self.download_workers, jobs, work, self.downloaded)
+                finally:
+                    jobs.close()
+        except Exception as e:
+            log_event(f"Download stage failed: {e}", logging.ERROR)
+        finally:
+            _put(self.downloaded, _DONE, self.stop)
+
+    def _extract(self):
+        clusterer = StoryClusterer(self.db_path)
+        try:
+            while (job := _get(self.downloaded, self.stop)) is not _DONE:
+                art = extract_job(*job, db_path=self.db_path, health=self.health)
+                if art is None:
+                    continue
+                # Copies of a story skip the LLM; the consumer pairs them with their representative
+                _put(self.extracted if clusterer.add(art) else self.summarized, art, self.stop)
+        except Exception as e:
+            log_event(f"Extraction stage failed: {e}", logging.ERROR)
+        finally:
+            _put(self.extracted, _DONE, self.stop)
+            storage.close_connections()
+
+    def _summarize(self):
+        scheduler = SummaryScheduler(max_workers=self.summary_workers, db_path=self.db_path)
+        template = summarizer.load_prompt()
+
+        def work(art):
+            try:
+                art['summary'], art['summary_tier'] = scheduler.summarize_tiered(art, template)
+            except Exception as e:
+                # A lost representative would take its whole story with it
+                log_event(f"Could not summarize {art.get('url')}: {e}", logging.WARNING)
+                art['summary'], art['summary_tier'] = _local_summary(art)
+            # Ready before the card is shown, so the page renders a local thumbnail
+            _cache_thumbnails([art], self.db_path)
+            return art
+
+        def articles():
+            while (art := _get(self.extracted, self.stop)) is not _DONE:
+                yield art
+
+        try:
+            self._bounded_pool(self.summary_workers, articles(), work, self.summarized)
+        finally:
+            _put(self.summarized, _DONE, self.stop)
+
+    def _flush(self, batch):
+        try:
+            self.saved += storage.save_articles(batch, db_path=self.db_path)
+        except Exception as e:
+            log_event(f"Could not save articles: {e}", logging.ERROR)
+        batch.clear()
+
+    def _store(self):
+        # One transaction per `write_batch` articles, and no article waits more than
+        # `write_interval` seconds to be saved
+        batch = []
+        started = None
+        try:
+            while True:
+                wait = max(0.0, started + self.write_interval - time.monotonic()) if batch else None
+                try:
+                    art = self.to_store.get(timeout=wait)
+                except queue.Empty:
+                    art = None
+                if art is _DONE:
+                    break
+                if art is not None:
+                    if not batch:
+                        started = time.monotonic()
+                    batch.append(art)
+                if batch and (len(batch) >= self.write_batch or time.monotonic() - started >= self.write_interval):
+                    self._flush(batch)
+            if batch:
+                self._flush(batch)
+        finally:
+            storage.close_connections()
+
+    def run(self) -> Iterator[Dict]:
+        for thread in self.threads:
+            thread.start()
+        emitted = 0
+        finished = set()
+        waiting = {}
+        drained = False
+        try:
+            while emitted < self.max_articles and not drained:
+                art = _get(self.summarized, self.stop)
+                if art is _DONE:
+                    if not waiting:
+                        break
+                    # A story whose representative never arrived is led by its first copy
+                    drained = True
+                    ready_articles = []
+                    for copies in waiting.values():
+                        lead = copies[0]
+                        del lead['duplicate_of']
+                        lead['cluster_url'] = lead['url']
+                        lead['summary'], lead['summary_tier'] = _local_summary(lead)
+                        for copy in copies[1:]:
+                            copy['duplicate_of'], copy['cluster_url'] = lead, lead['url']
+                        ready_articles.extend(copies)
+                    waiting.clear()
+                else:
+                    rep = art.get('duplicate_of')
+                    if rep is not None and id(rep) not in finished:
+                        # Hold copies back until their representative has its summary
+                        waiting.setdefault(id(rep), []).append(art)
+                        continue
+                    finished.add(id(art))
+                    ready_articles = [art] + waiting.pop(id(art), [])
+                for ready in ready_articles:
+                    if 'duplicate_of' in ready:
+                        ready['summary'] = ready['duplicate_of']['summary']
+                        ready['summary_tier'] = ready['duplicate_of']['summary_tier']
+                    # The representative is queued before its copies, so cluster_url resolves
+                    if not ready.get('stored'):
+                        self.to_store.put(ready)
+                    emitted += 1
+                    yield ready
+                    if emitted >= self.max_articles:
+                        break
+        finally:
+            self.stop.set()
+            self.to_store.put(_DONE)
+            self.threads[-1].join()
+            # Downloads still in flight once the consumer stops are written as timeouts
+            flush_health(self.health, self.db_path)
+            log_event(f"Saved {self.saved} of {emitted} articles")
+
+def stream_ingest(sources: List[Dict], max_articles: int = 20, new_only: bool = False, db_path=None,
+                  topics: List[str] = None,
+                  buffer_size=BUFFER_SIZE, write_batch=WRITE_BATCH, write_interval=WRITE_INTERVAL,
+                  download_workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, timeout=DEFAULT_TIMEOUT,
+                  summary_workers=SUMMARY_WORKERS) -> Iterator[Dict]:
+    """
+    Streaming form of ingest_sources(): yield each article as soon as its summary is
+    ready, in completion order, while later articles are still downloading.
+    Articles are tagged with the `topics` they mention.
+    Articles are saved in batches of `write_batch`, or every `write_interval` seconds,
+    and everything yielded has been saved once the generator is exhausted or closed.
+    """
+    return _Pipeline(sources, max_articles, new_only, topics, db_path, buffer_size, write_batch, write_interval,
+                     download_workers, per_host, timeout, summary_workers).run()
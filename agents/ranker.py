@@ -0,0 +1,118 @@
+"""
+Feed ranking. The newest CANDIDATE_WINDOW articles that pass the feed filters are
+scored in one NumPy pass on recency, source trust and how strongly they match the
+user's topics, with a penalty for piling up the same story or source, and shown best
+first. Rankings are deterministic and cached per (topics, filters, database write
+generation, TIME_STEP).
+"""
+import time
+from functools import lru_cache
+from typing import Dict, List
+
+import numpy as np
+
+from db import storage
+from agents.source_health import DEFAULT_TRUST_SCORE
+from utils.logger import span
+
+CANDIDATE_WINDOW = 10000
+# An article loses half its recency score every HALF_LIFE_HOURS
+HALF_LIFE_HOURS = 24
+WEIGHTS = {'recency': 0.5, 'trust': 0.2, 'topic': 0.3}
+# Topic match strength (0-1): each selected topic in an article's tags adds TAG_MATCH, and
+# a source scouted for one of the topics (its category) adds CATEGORY_MATCH
+TAG_MATCH = 0.5
+CATEGORY_MATCH = 0.5
+# Subtracted once for every better-scored article of the same story / the same source
+STORY_PENALTY = 0.3
+SOURCE_PENALTY = 0.02
+# Rankings are computed as of the start of a TIME_STEP-second step, so they can be reused
+# within it; any write to the database starts a new generation and a fresh ranking
+TIME_STEP = 600
+CACHE_SIZE = 32
+
+def to_columns(rows: List[tuple]) -> Dict[str, np.ndarray]:
+    """
+    Column arrays from storage.ranking_candidates() rows.
+    """
+    if not rows:
+        return {'id': np.zeros(0, np.int64), 'published': np.zeros(0), 'trust': np.zeros(0), 'story': np.zeros(0, np.int64),
+                'source': np.zeros(0, np.int64), 'category': np.zeros(0, str), 'tags': np.zeros(0, str)}
+    ids, published, trust, story, source, category, tags = zip(*rows)
+    return {
+        'id': np.array(ids, np.int64),
+        # Unparseable dates count as very old, unscored sources as newly scouted ones
+        'published': np.nan_to_num(np.array(published, float), nan=0.0),
+        'trust': np.nan_to_num(np.array(trust, float), nan=DEFAULT_TRUST_SCORE),
+        'story': np.array(story, np.int64),
+        'source': np.array(source, np.int64),
+        'category': np.array(category, str),
+        'tags': np.array(tags, str),
+    }
+
+def topic_strength(tags: np.ndarray, categories: np.ndarray, topics) -> np.ndarray:
+    """
+    0-1 per article: selected topics among its comma-separated tags, and whether its
+    source was scouted for one of them.
+    """
+    if not topics or not len(tags):
+        return np.zeros(len(tags))
+    # Tag strings repeat a lot, so each distinct one is parsed once
+    distinct, inverse = np.unique(tags, return_inverse=True)
+    wanted = set(topics)
+    hits = np.array([len(wanted.intersection(t.split(','))) for t in distinct], float)[inverse.reshape(-1)]
+    strength = TAG_MATCH * hits + CATEGORY_MATCH * np.isin(categories, list(wanted))
+    return np.minimum(1.0, strength)
+
+def _rank_within(groups: np.ndarray, order: np.ndarray) -> np.ndarray:
+    # For each item, how many items of its group come before it in `order`
+    grouped = groups[order]
+    by_group = np.argsort(grouped, kind='stable')
+    sorted_groups = grouped[by_group]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(grouped)])
+    within = np.empty(len(groups))
+    within[order[by_group]] = np.arange(len(grouped)) - np.repeat(starts, sizes)
+    return within
+
+def _best_first(score, columns):
+    # Ties go to the newer article, then the higher id, so the order is fully determined
+    return np.lexsort((-columns['id'], -columns['published'], -score))
+
+def score(columns: Dict[str, np.ndarray], topics, now) -> np.ndarray:
+    """
+    Ranking score of every candidate in `columns` as of `now` (epoch seconds).
+    """
+    age_hours = np.maximum(0.0, now - columns['published']) / 3600
+    recency = np.exp2(-age_hours / HALF_LIFE_HOURS)
+    trust = np.clip(columns['trust'], 0, 10) / 10
+    topic = topic_strength(columns['tags'], columns['category'], topics)
+    base = WEIGHTS['recency'] * recency + WEIGHTS['trust'] * trust + WEIGHTS['topic'] * topic
+    order = _best_first(base, columns)
+    penalty = STORY_PENALTY * _rank_within(columns['story'], order) + SOURCE_PENALTY * _rank_within(columns['source'], order)
+    return base - penalty
+
+def rank(columns: Dict[str, np.ndarray], topics, now) -> np.ndarray:
+    """
+    Article ids of `columns`, best first.
+    """
+    return columns['id'][_best_first(score(columns, topics, now), columns)]
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _ranked(topics, filters, generation, as_of, window, db_path):
+    with span('rank'):
+        columns = to_columns(storage.ranking_candidates(window, *filters, db_path=db_path))
+        ids = rank(columns, topics, as_of)
+    ids.flags.writeable = False
+    return ids
+
+def ranked_ids(topics=(), source_ids=None, categories=None, date_from=None, date_to=None, window=CANDIDATE_WINDOW,
+               db_path=None, now=None) -> np.ndarray:
+    """
+    Ids of the feed articles matching the filters (see storage.feed_page), best first
+    for `topics`. Cached until the database is written to or the next TIME_STEP.
+    """
+    as_of = (now or time.time()) // TIME_STEP * TIME_STEP
+    topics = tuple(sorted({t for t in topics or () if t}))
+    filters = (tuple(source_ids or ()), tuple(categories or ()), date_from, date_to)
+    return _ranked(topics, filters, storage.data_generation(db_path), as_of, window, db_path)
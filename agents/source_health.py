@@ -0,0 +1,186 @@
+"""
+Per-source health: what fetching each source has been like (latency, errors and
+timeouts, entries per poll, share of articles that extract), a circuit breaker that
+skips sources while they keep failing, and the trust_score and fetch order derived
+from those numbers.
+"""
+import time
+import logging
+import threading
+from typing import Dict, List
+
+from db import storage
+from utils.logger import log_event, is_timeout
+
+# Weight of the newest observation in the moving averages
+EWMA_ALPHA = 0.3
+# The breaker opens after this many failed polls in a row, for BREAKER_BASE seconds,
+# doubling with every further failure up to BREAKER_MAX
+FAILURE_THRESHOLD = 3
+BREAKER_BASE = 15 * 60
+BREAKER_MAX = 24 * 3600
+# What we assume about a source we have never fetched, so new sources get tried early
+PRIOR = {'error_rate': 0.0, 'latency': 1.0, 'entries': 5.0, 'extract_rate': 0.8, 'article_latency': 1.0}
+# Scouted sources start here; observed health takes over as polls accumulate
+DEFAULT_TRUST_SCORE = 7.0
+PRIOR_POLLS = 3
+
+def _ewma(old, value):
+    return value if old is None else old + EWMA_ALPHA * (value - old)
+
+def _new_row(url):
+    return {'url': url, 'polls': 0, 'failures': 0, 'timeouts': 0, 'consecutive_failures': 0, 'error_rate': None,
+            'timeout_rate': None, 'latency': None, 'entries': None, 'articles': 0, 'extracted': 0,
+            'extract_rate': None, 'article_latency': None, 'open_until': None, 'updated_at': None}
+
+def _estimate(row, field):
+    value = row.get(field) if row else None
+    return PRIOR[field] if value is None else value
+
+def breaker_open(row, now=None) -> bool:
+    return bool(row and row.get('open_until') and row['open_until'] > (now or time.time()))
+
+def expected_yield(row) -> float:
+    """
+    Articles with full text we expect per second spent on the source: its usable
+    entries per poll, discounted by failures and failed extractions, over the time a
+    poll and its article downloads take.
+    """
+    articles = (1 - _estimate(row, 'error_rate')) * _estimate(row, 'entries') * _estimate(row, 'extract_rate')
+    seconds = _estimate(row, 'latency') + _estimate(row, 'entries') * _estimate(row, 'article_latency')
+    return articles / max(seconds, 0.01)
+
+def trust_score(row) -> float:
+    """
+    0-10: reliability, extraction success and entries per poll, blended with
+    DEFAULT_TRUST_SCORE while the source has only a few polls behind it.
+    """
+    if not row or not row['polls']:
+        return DEFAULT_TRUST_SCORE
+    reliability = 1 - _estimate(row, 'error_rate')
+    extraction = _estimate(row, 'extract_rate')
+    supply = min(1.0, _estimate(row, 'entries') / PRIOR['entries'])
+    observed = 10 * reliability * (0.5 + 0.5 * extraction) * (0.5 + 0.5 * supply)
+    weight = row['polls'] / (row['polls'] + PRIOR_POLLS)
+    return round((1 - weight) * DEFAULT_TRUST_SCORE + weight * observed, 1)
+
+def plan_order(sources: List[Dict], health: Dict[str, Dict], now=None) -> List[Dict]:
+    """
+    `sources` minus those whose breaker is open, best expected yield first (ties keep
+    their original order).
+    """
+    ready = []
+    for src in sources:
+        row = health.get(src['url'])
+        if breaker_open(row, now):
+            log_event(f"Skipping {src['url']}: {row['consecutive_failures']} failures in a row, "
+                      f"retrying after {time.strftime('%H:%M', time.localtime(row['open_until']))}", logging.INFO)
+            continue
+        ready.append(src)
+    return sorted(ready, key=lambda src: -expected_yield(health.get(src['url'])))
+
+def fold(row, polls, downloads, extractions, now):
+    """
+    Update a health row with one run's observations: `polls` are (seconds, entries,
+    error), `downloads` are (seconds, ok) and `extractions` are ok flags.
+    """
+    row = dict(row)
+    for seconds, entries, error in polls:
+        row['polls'] += 1
+        timed_out = error is not None and is_timeout(error)
+        row['error_rate'] = _ewma(row['error_rate'], float(error is not None))
+        row['timeout_rate'] = _ewma(row['timeout_rate'], float(timed_out))
+        row['latency'] = _ewma(row['latency'], seconds)
+        if error is None:
+            row['consecutive_failures'] = 0
+            row['open_until'] = None
+            row['entries'] = _ewma(row['entries'], entries)
+            continue
+        row['failures'] += 1
+        row['timeouts'] += int(timed_out)
+        row['consecutive_failures'] += 1
+        if row['consecutive_failures'] >= FAILURE_THRESHOLD:
+            backoff = BREAKER_BASE * 2 ** (row['consecutive_failures'] - FAILURE_THRESHOLD)
+            row['open_until'] = now + min(BREAKER_MAX, backoff)
+    if downloads:
+        row['article_latency'] = _ewma(row['article_latency'], sum(s for s, _ in downloads) / len(downloads))
+    if extractions:
+        row['articles'] += len(extractions)
+        row['extracted'] += sum(extractions)
+        # One sample per run, so a source's weight does not depend on how many articles it had
+        row['extract_rate'] = _ewma(row['extract_rate'], sum(extractions) / len(extractions))
+    row['updated_at'] = now
+    return row
+
+class HealthRecorder:
+    """
+    Collects what one fetch run observes about each source, from any thread, and
+    folds it into source_health (and the sources' trust_score) with flush().
+    Polls and downloads announced with started() that are still running at flush()
+    are written as timeouts, so sources too slow to finish within a run are not
+    the ones left out of their health record.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._observed = {'poll': {}, 'download': {}, 'extraction': {}}
+        self._running = {}
+        self._abandoned = {}
+
+    def _add(self, kind, url, item):
+        key = (kind, url)
+        with self._lock:
+            if self._running.get(key):
+                self._running[key].pop(0)
+            elif self._abandoned.get(key):
+                # Already written as a timeout by flush()
+                self._abandoned[key] -= 1
+                return
+            self._observed[kind].setdefault(url, []).append(item)
+
+    def started(self, url, kind='poll'):
+        """
+        A poll (or, with kind='download', an article download) of `url` began; its
+        result is expected through poll() or download().
+        """
+        with self._lock:
+            self._running.setdefault((kind, url), []).append(time.monotonic())
+
+    def poll(self, url, seconds, entries=0, error=None):
+        """
+        A feed poll (or, for a direct URL, the page download) took `seconds` and found
+        `entries` usable entries in the feed, new or not, or failed with `error`.
+        """
+        self._add('poll', url, (seconds, entries, error))
+
+    def download(self, url, seconds, ok):
+        self._add('download', url, (seconds, ok))
+
+    def extraction(self, url, ok):
+        self._add('extraction', url, bool(ok))
+
+    def flush(self, db_path=None, now=None):
+        """
+        Write everything recorded so far, and what is still running as timed out,
+        then start over. Returns the updated rows.
+        """
+        with self._lock:
+            observed = self._observed
+            for (kind, url), starts in self._running.items():
+                for started in starts:
+                    seconds = time.monotonic() - started
+                    item = (seconds, 0, TimeoutError(f'{url} still running')) if kind == 'poll' else (seconds, False)
+                    observed[kind].setdefault(url, []).append(item)
+                if starts:
+                    self._abandoned[(kind, url)] = self._abandoned.get((kind, url), 0) + len(starts)
+            self._observed = {'poll': {}, 'download': {}, 'extraction': {}}
+            self._running = {}
+        polls, downloads, extractions = observed['poll'], observed['download'], observed['extraction']
+        urls = list({*polls, *downloads, *extractions})
+        if not urls:
+            return []
+        now = now or time.time()
+        stored = storage.get_source_health(urls, db_path=db_path)
+        rows = [fold(stored.get(url) or _new_row(url), polls.get(url, []), downloads.get(url, []),
+                     extractions.get(url, []), now) for url in urls]
+        storage.save_source_health(rows, {row['url']: trust_score(row) for row in rows}, db_path=db_path)
+        return rows
@@ -2,94 +2,244 @@
 AI-powered source scouting using SerpAPI and RSS feed discovery for Clearfeed.
 """
 import os
+import json
+import time
+import logging
 from typing import List, Dict
+from urllib.parse import urljoin
+
+from db import storage
+from agents.source_health import DEFAULT_TRUST_SCORE
+from utils import http_client
+from utils.logger import log_event, span, record_cache, record_timeout
 
 try:
     from serpapi import GoogleSearch
 except ImportError:
-    raise ImportError("google-search-results package not installed. Please install with 'pip install google-search-results'.")
+    GoogleSearch = None
 
 try:
-    from feedfinder2 import find_feeds
+    import feedfinder2
+    from bs4 import BeautifulSoup
 except ImportError:
-    def find_feeds(url):
+    feedfinder2 = None
+
+FEED_LINK_TYPES = ('application/rss+xml', 'text/xml', 'application/atom+xml', 'application/x.atom+xml',
+                   'application/x-atom+xml')
+GUESSED_FEED_PATHS = ('atom.xml', 'index.atom', 'index.rdf', 'rss.xml', 'index.xml', 'index.rss')
+
+if feedfinder2 is not None:
+    class PooledFeedFinder(feedfinder2.FeedFinder):
+        """
+        feedfinder2's FeedFinder fetching through the shared HTTP client (timeouts, size cap,
+        kept-alive connections) instead of a bare requests.get per candidate.
+        """
+        def get_feed(self, url):
+            try:
+                return http_client.fetch(url).text
+            except Exception:
+                return None
+
+def find_feeds(url: str) -> List[str]:
+    """
+    feedfinder2.find_feeds(): the page itself if it is a feed, else its <link> feeds,
+    then feed-looking local and remote <a> links, then common feed paths; the first
+    kind that turns up feeds wins.
+    """
+    if feedfinder2 is None:
         return []  # fallback if feedfinder2 is not installed
+    finder = PooledFeedFinder()
+    url = feedfinder2.coerce_url(url)
+    text = finder.get_feed(url)
+    if text is None:
+        return []
+    if finder.is_feed_data(text):
+        return [url]
+    tree = BeautifulSoup(text, 'lxml')
+    hrefs = [a['href'] for a in tree.find_all('a', href=True)]
+    candidates = (
+        [urljoin(url, link.get('href', '')) for link in tree.find_all('link') if link.get('type') in FEED_LINK_TYPES],
+        [urljoin(url, h) for h in hrefs if '://' not in h and finder.is_feed_url(h)],
+        [urljoin(url, h) for h in hrefs if finder.is_feedlike_url(h)],
+        [urljoin(url, path) for path in GUESSED_FEED_PATHS],
+    )
+    for urls in candidates:
+        feeds = [u for u in dict.fromkeys(urls) if finder.is_feed(u)]
+        if feeds:
+            return feedfinder2.sort_urls(feeds)
+    return []
 
 SERPAPI_KEY = os.environ.get('SERPAPI_KEY')
 
+# Scouting cache (scout_cache table in storage.DB_PATH). Failures and empty results expire
+# sooner so that dead sites are retried eventually, but not on every click.
+SEARCH_CACHE_TTL = 24 * 3600
+FEEDS_CACHE_TTL = 7 * 24 * 3600
+NEGATIVE_CACHE_TTL = 3600
+
+def cache_get(kind: str, key: str):
+    """
+    Return (value, ok) for an unexpired scout_cache entry, or None.
+    """
+    conn = storage.get_connection()
+    row = conn.execute('SELECT value, ok FROM scout_cache WHERE kind = ? AND key = ? AND expires_at > ?',
+                       (kind, key, time.time())).fetchone()
+    return (json.loads(row[0]), bool(row[1])) if row else None
+
+def cache_put(kind: str, key: str, value, ok: bool = True, ttl: float = None):
+    if ttl is None:
+        ttl = (SEARCH_CACHE_TTL if kind == 'search' else FEEDS_CACHE_TTL) if ok else NEGATIVE_CACHE_TTL
+    conn = storage.get_connection()
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO scout_cache (kind, key, value, ok, expires_at) VALUES (?, ?, ?, ?, ?)',
+                     (kind, key, json.dumps(value), int(ok), time.time() + ttl))
+
 def scout_sources_for_topic(topic: str, max_results: int = 10) -> List[str]:
     """
     Search for candidate news sources using SerpAPI for a given topic.
-    Returns a list of URLs. Prints progress for debugging.
+    Returns a list of URLs.
+    Results are cached per (query, num), so a recent repeat search costs no API quota.
     """
+    query = f"{topic} news rss feed"
+    cache_key = f"{query}|{max_results}"
+    cached = cache_get('search', cache_key)
+    if cached is not None:
+        record_cache('search', hits=1)
+        log_event(f"SerpApi cache hit for topic: {topic}", logging.DEBUG)
+        return cached[0]
+    record_cache('search', misses=1)
     if not SERPAPI_KEY:
         raise EnvironmentError("SERPAPI_KEY environment variable not set.")
-    print(f"[DEBUG] Starting SerpApi search for topic: {topic}")
+    if GoogleSearch is None:
+        raise ImportError("google-search-results package not installed. Please install with 'pip install google-search-results'.")
+    log_event(f"Starting SerpApi search for topic: {topic}", logging.DEBUG)
     params = {
         "engine": "google",
-        "q": f"{topic} news rss feed",
+        "q": query,
         "num": max_results,
         "api_key": SERPAPI_KEY,
     }
     try:
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        print(f"[DEBUG] SerpApi search completed. Results: {results.get('search_information', {})}")
+        with span('scout.search'):
+            search = GoogleSearch(params)
+            results = search.get_dict()
+        log_event(f"SerpApi search completed. Results: {results.get('search_information', {})}", logging.DEBUG)
     except Exception as e:
-        print(f"[SerpAPI Error] {e}")
+        log_event(f"SerpAPI error: {e}", logging.ERROR)
+        cache_put('search', cache_key, [], ok=False)
         return []
     urls = []
     for idx, res in enumerate(results.get('organic_results', [])):
         link = res.get('link')
         if link:
-            print(f"[DEBUG] Found URL {idx+1}: {link}")
+            log_event(f"Found URL {idx+1}: {link}", logging.DEBUG)
             urls.append(link)
         if len(urls) >= max_results:
             break
-    print(f"[DEBUG] Total URLs to process: {len(urls)}")
+    log_event(f"Total URLs to process: {len(urls)}", logging.DEBUG)
+    cache_put('search', cache_key, urls, ok=bool(urls))
     return urls
 
+def find_site_feeds(url: str) -> List[str]:
+    """
+    find_feeds() behind the scouting cache. Sites that recently failed or had no
+    feeds return [] without being crawled again.
+    """
+    cached = cache_get('feeds', url)
+    if cached is not None:
+        record_cache('feeds', hits=1)
+        return cached[0]
+    record_cache('feeds', misses=1)
+    try:
+        with span('scout.discover', source=url):
+            found = find_feeds(url)
+    except Exception:
+        cache_put('feeds', url, [], ok=False)
+        raise
+    cache_put('feeds', url, found, ok=bool(found))
+    return found
+
+def record_feed_timeout(url: str):
+    record_timeout('scout.discover', url)
+    cache_put('feeds', url, [], ok=False)
+
 import concurrent.futures
 
+CONNECTION_ERROR_MARKERS = ["CERTIFICATE_VERIFY_FAILED", "No connection adapters were found", "NameResolutionError", "TLSV1_ALERT_INTERNAL_ERROR", "Max retries exceeded", "Failed to resolve", "SSLError", "HTTPSConnectionPool"]
+
+# Limits per scouting phase: topic-specific search first, then the general group fallback
+SPECIFIC_PHASE = {'max_results': 10, 'max_feeds': 10, 'timeout': 20, 'max_feeds_per_site': 10}
+GROUP_PHASE = {'max_results': 3, 'max_feeds': 3, 'timeout': 10, 'max_feeds_per_site': 3}
+SCOUT_DEADLINE = 60
+SCOUT_WORKERS = 16
+
+def _log_discovery_error(url, e):
+    err_str = str(e)
+    if any(x in err_str for x in CONNECTION_ERROR_MARKERS):
+        log_event(f"Connection/SSL error for {url}: {e}", logging.WARNING)
+    else:
+        log_event(f"Feed discovery error for {url}: {e}", logging.ERROR)
+
 def discover_feeds(urls: List[str], max_feeds: int = 10, timeout: int = 20, max_feeds_per_site: int = 10) -> List[str]:
     """
-    Discover RSS feeds from a list of URLs using feedfinder2. Prints progress. Skips URLs that take too long.
+    Discover RSS feeds from a list of URLs using feedfinder2. Skips URLs that take too long.
     Limits number of feeds per site to max_feeds_per_site.
+    All sites are crawled at once on a shared pool; every site gets the same `timeout`.
     """
     feeds = []
     skipped_non_http = []
     skipped_errors = []
     skipped_timeouts = []
-    for idx, url in enumerate(urls):
+    http_urls = []
+    for url in urls:
         if not url.startswith(('http://', 'https://')):
-            print(f"[DEBUG] Skipping non-HTTP URL: {url}")
+            log_event(f"Skipping non-HTTP URL: {url}", logging.DEBUG)
             skipped_non_http.append(url)
-            continue
-        print(f"[DEBUG] Discovering feeds for URL {idx+1}/{len(urls)}: {url}")
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(find_feeds, url)
+        else:
+            http_urls.append(url)
+    if not http_urls:
+        return []
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(len(http_urls), SCOUT_WORKERS))
+    try:
+        futures = []
+        for idx, url in enumerate(http_urls):
+            log_event(f"Discovering feeds for URL {idx+1}/{len(http_urls)}: {url}", logging.DEBUG)
+            futures.append((url, executor.submit(find_site_feeds, url)))
+        expires = time.monotonic() + timeout
+        # Collect in submission order so the result matches the search ranking
+        for url, future in futures:
             try:
-                found = future.result(timeout=timeout)[:max_feeds_per_site]
-                print(f"[DEBUG] Feeds found (limited to {max_feeds_per_site}): {found}")
+                found = future.result(timeout=max(0, expires - time.monotonic()))[:max_feeds_per_site]
+                log_event(f"Feeds found (limited to {max_feeds_per_site}): {found}", logging.DEBUG)
                 feeds.extend(found)
             except concurrent.futures.TimeoutError:
-                print(f"[WARN] Feed discovery timed out for {url} (>{timeout}s). Skipping.")
+                log_event(f"Feed discovery timed out for {url} (>{timeout}s). Skipping.", logging.WARNING)
+                record_feed_timeout(url)
                 skipped_timeouts.append(url)
-                continue
             except Exception as e:
-                err_str = str(e)
-                if any(x in err_str for x in ["CERTIFICATE_VERIFY_FAILED", "No connection adapters were found", "NameResolutionError", "TLSV1_ALERT_INTERNAL_ERROR", "Max retries exceeded", "Failed to resolve", "SSLError", "HTTPSConnectionPool"]):
-                    print(f"[WARN] Connection/SSL error for {url}: {e}")
-                else:
-                    print(f"[Feed Discovery Error] {url}: {e}")
+                _log_discovery_error(url, e)
                 skipped_errors.append(url)
-                continue
-        if len(feeds) >= max_feeds:
-            break
-    print(f"[DEBUG] Total feeds discovered: {len(feeds)} (before deduplication)")
-    print(f"[SUMMARY] URLs processed: {len(urls)} | Feeds found: {len(feeds)} | Skipped non-HTTP: {len(skipped_non_http)} | Skipped errors: {len(skipped_errors)} | Skipped timeouts: {len(skipped_timeouts)}")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    log_event(f"Total feeds discovered: {len(feeds)} (before deduplication)", logging.DEBUG)
+    log_event(f"URLs processed: {len(urls)} | Feeds found: {len(feeds)} | Skipped non-HTTP: {len(skipped_non_http)} | Skipped errors: {len(skipped_errors)} | Skipped timeouts: {len(skipped_timeouts)}")
     return feeds[:max_feeds]
 
+def _feed_domain(feed_url):
+    try:
+        return feed_url.split('/')[2]
+    except Exception:
+        return feed_url
+
+def _format_source(feed_url, category):
+    return {
+        'name': _feed_domain(feed_url),
+        'url': feed_url,
+        'category': category,
+        # Replaced by a score computed from the source's health once it has been fetched
+        'trust_score': DEFAULT_TRUST_SCORE
+    }
+
 def vet_and_format_feeds(feeds: List[str], topic: str) -> List[Dict]:
     """
     Deduplicate and format feed URLs into source dicts.
@@ -99,54 +249,146 @@ def vet_and_format_feeds(feeds: List[str], topic: str) -> List[Dict]:
     seen_domains = set()
     seen_urls = set()
     for feed_url in feeds:
-        try:
-            domain = feed_url.split('/')[2]
-        except Exception:
-            domain = feed_url
+        domain = _feed_domain(feed_url)
         if feed_url in seen_urls or domain in seen_domains:
-            print(f"[DEBUG] Skipping duplicate feed or domain: {feed_url}")
+            log_event(f"Skipping duplicate feed or domain: {feed_url}", logging.DEBUG)
             continue
-        vetted.append({
-            'name': domain,
-            'url': feed_url,
-            'category': topic,
-            'trust_score': 7.0  # Placeholder for trust scoring
-        })
+        vetted.append(_format_source(feed_url, topic))
         seen_urls.add(feed_url)
         seen_domains.add(domain)
-    print(f"[DEBUG] Total vetted sources after deduplication: {len(vetted)}")
+    log_event(f"Total vetted sources after deduplication: {len(vetted)}", logging.DEBUG)
     return vetted
 
+class _TopicScout:
+    """
+    Progress of one topic through the scouting phases inside scout_topics().
+    """
+    def __init__(self, topic, group):
+        self.topic = topic
+        self.group = group
+        self.phase = SPECIFIC_PHASE
+        self.outstanding = 0
+        self.searching = True
+        self.feeds_seen = 0
+        self.seen_domains = set()
+        self.seen_urls = set()
+        self.vetted = 0
+
+    @property
+    def category(self):
+        return self.topic if self.phase is SPECIFIC_PHASE else self.group
+
+    def accept(self, feed_url):
+        """
+        Apply the per-phase feed cap and the domain/URL dedup of vet_and_format_feeds.
+        Returns a source dict, or None if the feed is dropped.
+        """
+        if self.feeds_seen >= self.phase['max_feeds']:
+            return None
+        self.feeds_seen += 1
+        domain = _feed_domain(feed_url)
+        if feed_url in self.seen_urls or domain in self.seen_domains:
+            return None
+        self.seen_urls.add(feed_url)
+        self.seen_domains.add(domain)
+        self.vetted += 1
+        source = _format_source(feed_url, self.category)
+        if self.phase is GROUP_PHASE:
+            # Mark sources for filtering by topic
+            source['filter_topic'] = self.topic
+        return source
+
+def scout_topics(topics: List[str], topic_to_group: Dict[str, str] = None, deadline: float = SCOUT_DEADLINE,
+                 max_workers: int = SCOUT_WORKERS):
+    """
+    Scout all topics at once: SerpAPI searches and feed discovery for every candidate
+    site share one worker pool and one overall `deadline` (seconds).
+    Yields vetted source dicts as soon as they are discovered. Topics with no specific
+    feeds fall back to their group, exactly as scout_and_vet_sources does.
+    """
+    topic_to_group = topic_to_group or {}
+    expires = time.monotonic() + deadline
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    pending = {}  # future -> (kind, scout, url, site expiry)
+
+    def search(scout, query):
+        future = executor.submit(scout_sources_for_topic, query, scout.phase['max_results'])
+        pending[future] = ('search', scout, query, None)
+
+    try:
+        scouts = [_TopicScout(topic, topic_to_group.get(topic)) for topic in topics]
+        for scout in scouts:
+            search(scout, scout.topic)
+        while pending:
+            now = time.monotonic()
+            if now >= expires:
+                log_event(f"Scouting deadline of {deadline}s reached; {len(pending)} lookups abandoned.", logging.WARNING)
+                # Sites still being crawled at the deadline count as timeouts; queued ones were never tried
+                for future, (kind, scout, url, _) in pending.items():
+                    if kind == 'feeds' and future.running():
+                        record_feed_timeout(url)
+                break
+            # Drop sites that blew their per-site timeout
+            for future, (kind, scout, url, site_expires) in list(pending.items()):
+                if kind == 'feeds' and site_expires <= now:
+                    log_event(f"Feed discovery timed out for {url} (>{scout.phase['timeout']}s). Skipping.", logging.WARNING)
+                    record_feed_timeout(url)
+                    del pending[future]
+                    scout.outstanding -= 1
+            wait_for = min([expires - now] + [e - now for k, _, _, e in pending.values() if k == 'feeds'])
+            done, _ = concurrent.futures.wait(list(pending), timeout=max(0, wait_for),
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future not in pending:
+                    continue
+                kind, scout, url, _ = pending.pop(future)
+                if kind == 'search':
+                    scout.searching = False
+                    try:
+                        candidate_urls = future.result()
+                    except EnvironmentError:
+                        raise
+                    except Exception as e:
+                        log_event(f"SerpAPI error: {e}", logging.ERROR)
+                        candidate_urls = []
+                    for site in candidate_urls:
+                        if not site.startswith(('http://', 'https://')):
+                            log_event(f"Skipping non-HTTP URL: {site}", logging.DEBUG)
+                            continue
+                        pending[executor.submit(find_site_feeds, site)] = ('feeds', scout, site, time.monotonic() + scout.phase['timeout'])
+                        scout.outstanding += 1
+                else:
+                    scout.outstanding -= 1
+                    try:
+                        found = future.result()[:scout.phase['max_feeds_per_site']]
+                    except Exception as e:
+                        _log_discovery_error(url, e)
+                        continue
+                    for feed_url in found:
+                        source = scout.accept(feed_url)
+                        if source:
+                            yield source
+            # Fall back to the group for topics whose specific phase found nothing
+            for scout in scouts:
+                if scout.searching or scout.outstanding > 0:
+                    continue
+                if scout.phase is SPECIFIC_PHASE and scout.vetted == 0 and scout.group:
+                    log_event(f"No specific feeds for '{scout.topic}'. Trying general '{scout.group}' feeds and will filter articles.")
+                    scout.phase = GROUP_PHASE
+                    scout.searching = True
+                    scout.feeds_seen = 0
+                    search(scout, scout.group)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
 def scout_and_vet_sources(topic: str, group: str = None) -> List[Dict]:
-    # Try specific-topic feeds first
-    candidate_urls = scout_sources_for_topic(topic, max_results=10)
-    feeds = discover_feeds(candidate_urls, max_feeds=10, timeout=20, max_feeds_per_site=10) if candidate_urls else []
-    if feeds:
-        sources = vet_and_format_feeds(feeds, topic)
-        return sources
-    # Fallback: try general/group feeds and mark for filtering
-    if group:
-        print(f"[HYBRID] No specific feeds for '{topic}'. Trying general '{group}' feeds and will filter articles.")
-        gen_urls = scout_sources_for_topic(group, max_results=3)
-        gen_feeds = discover_feeds(gen_urls, max_feeds=3, timeout=10, max_feeds_per_site=3) if gen_urls else []
-        sources = vet_and_format_feeds(gen_feeds, group)
-        # Mark sources for filtering by topic
-        for s in sources:
-            s['filter_topic'] = topic
-        return sources
-    print(f"[HYBRID] No feeds found for '{topic}' and no group fallback.")
-    return []
     """
     Main entry: scouts and vets sources for a topic.
+    Tries topic-specific feeds first, then general feeds for `group` marked with
+    'filter_topic' so articles get filtered by the topic.
     Returns a list of vetted source dicts.
     """
-    candidate_urls = scout_sources_for_topic(topic)
-    if not candidate_urls:
-        print("No candidate URLs found for topic.")
-        return []
-    feeds = discover_feeds(candidate_urls)
-    if not feeds:
-        print("No RSS feeds discovered from candidate URLs.")
-        return []
-    sources = vet_and_format_feeds(feeds, topic)
+    sources = list(scout_topics([topic], {topic: group}))
+    if not sources:
+        log_event(f"No feeds found for '{topic}'.", logging.WARNING)
     return sources
@@ -1,21 +1,119 @@
-import openai
+"""
+Article summaries in two tiers: LLM summaries from the chat completions API (cached
+by content), and instant local extractive summaries (utils/extractive.py) for when
+the LLM is not worth it, not configured or failing. summary_scheduler decides which
+articles get which.
+"""
 import os
+import time
+import hashlib
+from db import storage
+from utils import extractive
+from utils.logger import span, record_cache
+
 PROMPT_PATH = os.path.join(os.path.dirname(__file__), '../prompts/summary_prompt.txt')
+MODEL = 'gpt-4o'
+MAX_INPUT_CHARS = 4000
+CACHE_MAX_ENTRIES = 5000
+# Stored with each article's summary
+LLM = 'llm'
+LOCAL = 'local'
 
 def load_prompt():
     with open(PROMPT_PATH, 'r') as f:
         return f.read()
 
-def summarize_article(text):
-    prompt = load_prompt().replace('[ARTICLE TEXT HERE]', text[:4000])
+def cache_key(text, prompt_template, model=MODEL):
+    """
+    Content address of a summary: the truncated article text, the prompt template
+    and the model name. Identical wire stories under different URLs share a key.
+    """
+    h = hashlib.sha256()
+    for part in (model, prompt_template, text[:MAX_INPUT_CHARS]):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def _bump_stat(conn, field):
+    conn.execute("INSERT OR IGNORE INTO cache_stats (name) VALUES ('summary')")
+    conn.execute(f"UPDATE cache_stats SET {field} = {field} + 1 WHERE name = 'summary'")
+
+def get_cached_summary(key, db_path=None):
+    conn = storage.get_connection(db_path)
+    with conn:
+        row = conn.execute('SELECT summary FROM summary_cache WHERE key = ?', (key,)).fetchone()
+        if row:
+            conn.execute('UPDATE summary_cache SET last_used_at = ?, hits = hits + 1 WHERE key = ?', (time.time(), key))
+            _bump_stat(conn, 'hits')
+        else:
+            _bump_stat(conn, 'misses')
+    record_cache('summary', hits=int(row is not None), misses=int(row is None))
+    return row[0] if row else None
+
+def store_summary(key, summary, model=MODEL, db_path=None, max_entries=None):
+    """
+    Store a summary and evict the least recently used entries beyond `max_entries`.
+    """
+    max_entries = max_entries or CACHE_MAX_ENTRIES
+    now = time.time()
+    conn = storage.get_connection(db_path)
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO summary_cache (key, model, summary, created_at, last_used_at, hits) VALUES (?, ?, ?, ?, ?, 0)',
+                     (key, model, summary, now, now))
+        conn.execute('''
+            DELETE FROM summary_cache WHERE key IN (
+                SELECT key FROM summary_cache ORDER BY last_used_at DESC, rowid DESC LIMIT -1 OFFSET ?
+            )''', (max_entries,))
+
+def summary_cache_stats(db_path=None):
+    conn = storage.get_connection(db_path)
+    row = conn.execute("SELECT hits, misses FROM cache_stats WHERE name = 'summary'").fetchone()
+    entries = conn.execute('SELECT COUNT(*) FROM summary_cache').fetchone()[0]
+    hits, misses = row if row else (0, 0)
+    return {'hits': hits, 'misses': misses, 'entries': entries}
+
+@span('summarize')
+def request_summary(prompt, model=MODEL):
+    # Imported on first use: pages that only read stored summaries never load the client
+    import openai
     # Replace with your OpenAI API key
     openai.api_key = os.environ.get('OPENAI_API_KEY', 'sk-...')
+    response = openai.ChatCompletion.create(
+        model=model,
+        messages=[{"role": "system", "content": prompt}],
+        max_tokens=300
+    )
+    return response['choices'][0]['message']['content'].strip()
+
+def llm_available():
+    return bool(os.environ.get('OPENAI_API_KEY'))
+
+def is_usable(summary):
+    return bool(summary) and not summary.startswith(storage.FAILED_SUMMARY)
+
+def failed_summary(error):
+    # Stored in place of a summary when the request failed; is_usable() rejects it
+    return f"{storage.FAILED_SUMMARY}: {error}]"
+
+@span('summarize.local')
+def summarize_local(text):
+    """
+    Extractive summary of `text`: its key sentences, computed in-process.
+    """
+    return extractive.summarize(text or '')
+
+def summarize_article(text, model=MODEL, use_cache=True, db_path=None):
+    template = load_prompt()
+    prompt = template.replace('[ARTICLE TEXT HERE]', text[:MAX_INPUT_CHARS])
+    key = cache_key(text, template, model)
+    if use_cache:
+        cached = get_cached_summary(key, db_path)
+        if cached is not None:
+            return cached
     try:
-        response = openai.ChatCompletion.create(
-            model='gpt-4o',
-            messages=[{"role": "system", "content": prompt}],
-            max_tokens=300
-        )
-        return response['choices'][0]['message']['content'].strip()
+        summary = request_summary(prompt, model)
     except Exception as e:
-        return f"[Summary unavailable: {e}]"
+        return failed_summary(e)
+    if use_cache:
+        store_summary(key, summary, model, db_path)
+    return summary
@@ -0,0 +1,263 @@
+"""
+Concurrent summarization under OpenAI requests-per-minute and tokens-per-minute budgets,
+and the tier policy: articles from sources trusted at LLM_MIN_TRUST or more get an LLM
+summary at ingest, the rest an instant local one that is upgraded once somebody views it.
+"""
+import time
+import random
+import logging
+import threading
+import datetime
+import concurrent.futures
+from email.utils import parsedate_to_datetime
+from typing import List, Dict
+
+from db import storage
+from agents import summarizer
+from agents.source_health import DEFAULT_TRUST_SCORE
+from utils.logger import log_event
+
+DEFAULT_RPM = 60
+DEFAULT_TPM = 30000
+DEFAULT_WORKERS = 4
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+COMPLETION_TOKENS = 300
+# Sources trusted at least this much get LLM summaries straight away: a point above the
+# score new sources start at, so a source earns it through its health record. Everything
+# else, unscored sources included, gets a local summary that is upgraded once viewed.
+LLM_MIN_TRUST = DEFAULT_TRUST_SCORE + 1.0
+# Articles whose upgrade failed are not retried for this long (seconds), however often they are viewed
+UPGRADE_RETRY_AFTER = 10 * 60
+
+class RateLimiter:
+    """
+    Two token buckets (requests and tokens) refilled continuously at their per-minute rate.
+    acquire() blocks until both buckets can cover the request.
+    """
+    def __init__(self, requests_per_minute=DEFAULT_RPM, tokens_per_minute=DEFAULT_TPM):
+        self.rpm = float(requests_per_minute)
+        self.tpm = float(tokens_per_minute)
+        self._requests = self.rpm
+        self._tokens = self.tpm
+        self._last = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def acquire(self, tokens):
+        # A single request larger than the whole budget can never fit; let it through alone
+        tokens = min(tokens, self.tpm)
+        with self._cond:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max((1 - self._requests) * 60.0 / self.rpm, (tokens - self._tokens) * 60.0 / self.tpm, 0.01)
+                self._cond.wait(wait)
+
+def estimate_tokens(prompt):
+    # Rough count (about four characters per token) plus the completion budget
+    return len(prompt) // 4 + COMPLETION_TOKENS
+
+def is_retryable(exc):
+    status = getattr(exc, 'http_status', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(exc).__name__ in ('RateLimitError', 'ServiceUnavailableError', 'Timeout', 'APIConnectionError')
+
+def backoff_delay(attempt, exc=None, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """
+    Exponential backoff with full jitter. A Retry-After header from the server wins.
+    """
+    headers = getattr(exc, 'headers', None) or {}
+    retry_after = headers.get('retry-after') or headers.get('Retry-After')
+    if retry_after:
+        try:
+            return min(cap, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def _published_ts(value):
+    if not value:
+        return 0.0
+    try:
+        dt = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            dt = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return 0.0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+def priority(article: Dict):
+    """
+    Sort key: highest-trust source first, newest article first within the same trust.
+    """
+    return (-(article.get('trust_score') or 0.0), -_published_ts(article.get('published')))
+
+def wants_llm(article: Dict) -> bool:
+    """
+    Whether `article` should get an LLM summary at ingest rather than a local one.
+    """
+    trust = article.get('trust_score')
+    return summarizer.llm_available() and (DEFAULT_TRUST_SCORE if trust is None else trust) >= LLM_MIN_TRUST
+
+class SummaryScheduler:
+    def __init__(self, requests_per_minute=DEFAULT_RPM, tokens_per_minute=DEFAULT_TPM, max_workers=DEFAULT_WORKERS,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, model=summarizer.MODEL, use_cache=True, db_path=None):
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.model = model
+        self.use_cache = use_cache
+        self.db_path = db_path
+
+    def _summarize(self, text, template):
+        key = summarizer.cache_key(text, template, self.model)
+        if self.use_cache:
+            cached = summarizer.get_cached_summary(key, self.db_path)
+            if cached is not None:
+                return cached
+        prompt = template.replace('[ARTICLE TEXT HERE]', text[:summarizer.MAX_INPUT_CHARS])
+        attempt = 0
+        while True:
+            self.limiter.acquire(estimate_tokens(prompt))
+            try:
+                summary = summarizer.request_summary(prompt, self.model)
+                break
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    return summarizer.failed_summary(e)
+                time.sleep(backoff_delay(attempt, e, base=self.backoff_base))
+                attempt += 1
+        if self.use_cache:
+            summarizer.store_summary(key, summary, self.model, self.db_path)
+        return summary
+
+    def summarize(self, text, template=None):
+        """
+        Summarize a single text under the shared budgets; safe to call from many threads.
+        """
+        return self._summarize(text or '', template or summarizer.load_prompt())
+
+    def summarize_tiered(self, article: Dict, template=None):
+        """
+        (summary, tier) for one article under the tier policy. A failed LLM request
+        falls back to the local summary instead of an error message.
+        """
+        text = article.get('raw_text') or ''
+        if wants_llm(article):
+            summary = self.summarize(text, template)
+            if summarizer.is_usable(summary):
+                return summary, summarizer.LLM
+        return summarizer.summarize_local(text), summarizer.LOCAL
+
+    def summarize_all(self, articles: List[Dict]) -> List[str]:
+        """
+        Summarize each article's 'raw_text'. Work is dispatched in priority order;
+        the returned summaries line up with `articles`.
+        """
+        template = summarizer.load_prompt()
+        order = sorted(range(len(articles)), key=lambda i: priority(articles[i]))
+        summaries = [None] * len(articles)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            futures = {executor.submit(self._summarize, articles[i].get('raw_text') or '', template): i for i in order}
+            for future in concurrent.futures.as_completed(futures):
+                summaries[futures[future]] = future.result()
+        return summaries
+
+def summarize_batch(articles: List[Dict], **kwargs) -> List[str]:
+    """
+    Synchronous entry point for app.py: summarize a batch and return summaries in input order.
+    """
+    return SummaryScheduler(**kwargs).summarize_all(articles)
+
+def summarize_tiered_batch(articles: List[Dict], **kwargs) -> List[tuple]:
+    """
+    (summary, tier) for each article in `articles`, in input order: LLM summaries for
+    the articles wants_llm() picks, concurrently, and local ones for the rest.
+    """
+    picked = [i for i, art in enumerate(articles) if wants_llm(art)]
+    results = [None] * len(articles)
+    if picked:
+        for i, summary in zip(picked, summarize_batch([articles[i] for i in picked], **kwargs)):
+            if summarizer.is_usable(summary):
+                results[i] = (summary, summarizer.LLM)
+    for i, art in enumerate(articles):
+        if results[i] is None:
+            results[i] = (summarizer.summarize_local(art.get('raw_text')), summarizer.LOCAL)
+    return results
+
+def upgrade_summaries(article_ids, db_path=None, on_failed=None, **kwargs) -> int:
+    """
+    Replace the local summaries among `article_ids` with LLM ones. Articles whose
+    LLM request fails keep their local summary and are passed to on_failed(ids).
+    Returns the number upgraded.
+    """
+    if not summarizer.llm_available():
+        return 0
+    rows = storage.local_summaries(article_ids, db_path=db_path)
+    if not rows:
+        return 0
+    articles = [dict(row) for row in rows]
+    summaries = summarize_batch(articles, db_path=db_path, **kwargs)
+    upgraded = {art['id']: summary for art, summary in zip(articles, summaries) if summarizer.is_usable(summary)}
+    storage.save_summaries(upgraded, summarizer.LLM, db_path=db_path)
+    if on_failed is not None and len(upgraded) < len(articles):
+        on_failed([art['id'] for art in articles if art['id'] not in upgraded])
+    return len(upgraded)
+
+_upgrading = set()
+# Article id -> when its last upgrade failed
+_upgrade_failed = {}
+_upgrading_lock = threading.Lock()
+
+def _upgrades_failed(ids):
+    with _upgrading_lock:
+        _upgrade_failed.update(dict.fromkeys(ids, time.monotonic()))
+
+def upgrade_in_background(article_ids, db_path=None):
+    """
+    upgrade_summaries() on a daemon thread, so a page can render with the local
+    summaries meanwhile. Articles already being upgraded, or whose upgrade failed
+    less than UPGRADE_RETRY_AFTER seconds ago, are skipped, so a failing backend is
+    not asked again on every page view.
+    """
+    if not summarizer.llm_available():
+        return None
+    with _upgrading_lock:
+        retry_from = time.monotonic() - UPGRADE_RETRY_AFTER
+        for article_id in [i for i, failed_at in _upgrade_failed.items() if failed_at <= retry_from]:
+            del _upgrade_failed[article_id]
+        ids = [i for i in dict.fromkeys(article_ids) if i not in _upgrading and i not in _upgrade_failed]
+        _upgrading.update(ids)
+    if not ids:
+        return None
+
+    def run():
+        try:
+            upgrade_summaries(ids, db_path=db_path, on_failed=_upgrades_failed)
+        except Exception as e:
+            _upgrades_failed(ids)
+            log_event(f"Could not upgrade {len(ids)} summaries: {e}", logging.WARNING)
+        finally:
+            with _upgrading_lock:
+                _upgrading.difference_update(ids)
+            storage.close_connections()
+
+    thread = threading.Thread(target=run, name='summary-upgrade', daemon=True)
+    thread.start()
+    return thread
@@ -1,11 +1,115 @@
-from googletrans import Translator
+"""
+Summary translation: a pluggable backend (googletrans by default) behind a
+per-(article, language) cache in the database.
+"""
+import logging
+import threading
+from typing import List, Dict
+
+from agents import summarizer
+from db import storage
+from utils.logger import log_event, span, record_cache
+
+LANGUAGES = {
+    'English': 'en', 'Hindi': 'hi', 'Spanish': 'es', 'French': 'fr', 'German': 'de', 'Portuguese': 'pt',
+    'Italian': 'it', 'Arabic': 'ar', 'Bengali': 'bn', 'Chinese (Simplified)': 'zh-cn', 'Japanese': 'ja',
+    'Korean': 'ko', 'Russian': 'ru', 'Tamil': 'ta', 'Telugu': 'te', 'Urdu': 'ur',
+}
+# Summaries are generated in English
+SOURCE_LANG = 'en'
+BATCH_SIZE = 20
+MAX_REQUEST_CHARS = 4500
+
+class GoogleTransBackend:
+    """
+    googletrans with one shared client. A batch is sent as one request, one text per
+    line; if the line count does not survive the round trip, the batch is retried
+    one text at a time.
+    """
+    def __init__(self):
+        from googletrans import Translator
+        self.client = Translator()
+        # The client's HTTP session is not safe to share between threads
+        self._lock = threading.Lock()
+
+    def _translate(self, text, dest):
+        with self._lock:
+            return self.client.translate(text, dest=dest, src=SOURCE_LANG).text
+
+    def translate_batch(self, texts: List[str], dest: str) -> List[str]:
+        lines = [' '.join(t.split()) for t in texts]
+        results = []
+        chunk = []
+        for line in lines + [None]:
+            if chunk and (line is None or sum(len(c) + 1 for c in chunk) + len(line) > MAX_REQUEST_CHARS):
+                translated = self._translate('\n'.join(chunk), dest).split('\n')
+                if len(translated) != len(chunk):
+                    translated = [self._translate(c, dest) for c in chunk]
+                results.extend(translated)
+                chunk = []
+            if line is not None:
+                chunk.append(line)
+        return results
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def set_backend(backend):
+    """
+    Use `backend` (any object with translate_batch(texts, dest) -> list of str) for all
+    translations; None goes back to the default googletrans backend.
+    """
+    global _backend
+    _backend = backend
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = GoogleTransBackend()
+        return _backend
+
+def translate_texts(texts: List[str], target_lang: str) -> List[str]:
+    """
+    Translate `texts` to `target_lang` (a name from LANGUAGES or a language code) in
+    batches of BATCH_SIZE. Texts that cannot be translated are returned unchanged.
+    """
+    lang_code = LANGUAGES.get(target_lang, target_lang)
+    if lang_code == SOURCE_LANG or not texts:
+        return list(texts)
+    backend = get_backend()
+    results = []
+    for i in range(0, len(texts), BATCH_SIZE):
+        batch = texts[i:i + BATCH_SIZE]
+        try:
+            with span('translate'):
+                results.extend(backend.translate_batch(batch, lang_code))
+        except Exception as e:
+            log_event(f"Translation failed: {e}", logging.ERROR)
+            results.extend(batch)
+    return results
 
 def translate_summary(text, target_lang):
-    translator = Translator()
-    lang_map = {'Hindi': 'hi', 'Spanish': 'es', 'English': 'en'}
-    lang_code = lang_map.get(target_lang, 'en')
-    try:
-        translated = translator.translate(text, dest=lang_code)
-        return translated.text
-    except Exception:
-        return text
+    return translate_texts([text], target_lang)[0]
+
+def translate_articles(articles: List[Dict], target_lang: str, db_path=None) -> Dict[int, str]:
+    """
+    Summaries of `articles` (rows with 'id' and 'summary') in `target_lang`, keyed by
+    article id. Stored translations are reused; only the missing ones are translated,
+    in batches, and stored.
+    """
+    lang_code = LANGUAGES.get(target_lang, target_lang)
+    summaries = {a['id']: a['summary'] for a in articles if a['summary']}
+    if lang_code == SOURCE_LANG:
+        return summaries
+    translations = storage.get_translations(list(summaries), lang_code, db_path=db_path)
+    missing = [article_id for article_id, summary in summaries.items()
+               if article_id not in translations and summarizer.is_usable(summary)]
+    record_cache('translation', hits=len(translations), misses=len(missing))
+    if missing:
+        translated = translate_texts([summaries[i] for i in missing], lang_code)
+        # Failed translations come back unchanged; do not store them as translations
+        fresh = {i: t for i, t in zip(missing, translated) if t != summaries[i]}
+        storage.save_translations(fresh, lang_code, db_path=db_path)
+        translations.update(fresh)
+    return {i: translations.get(i, summary) for i, summary in summaries.items()}
@@ -1,85 +1,105 @@
 import streamlit as st
 import os
 import json
-import sqlite3
-from agents.source_scout import scout_and_vet_sources
-from agents.article_fetcher import fetch_articles
-from agents.summarizer import summarize_article
-from agents.translator import translate_summary
+import logging
+import datetime
+from db import storage, archive
+from utils.logger import log_event, stage_table, export_prometheus, export_json
+from utils.topic_matcher import ALL_TOPICS, TOPIC_TO_GROUP
+from utils.thumbnails import load_thumbnails, thumbnail_for
+# Streamlit runs this script again on every interaction. Agents (and the HTTP, LLM,
+# search and extraction clients they pull in) are imported by the page that uses them,
+# and database reads go through the cached_* functions below.
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'db', 'clearfeed.db')
 SOURCES_JSON = os.path.join(os.path.dirname(__file__), 'data', 'sources.json')
+SELECTED_TOPICS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'selected_topics.json')
 
-# Ensure DB exists
-if not os.path.exists(DB_PATH):
-    from db import schema
-    schema.init_db(DB_PATH)
-
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# The storage layer creates and migrates the DB on first use
+storage.DB_PATH = DB_PATH
 
 def load_all_sources():
     with open(SOURCES_JSON, 'r') as f:
         json_sources = json.load(f)
-    db_sources = load_sources(DB_PATH)
+    db_sources = storage.list_sources()
     # Merge sources (simple union by URL)
     all_sources = {s['url']: s for s in json_sources}
     for s in db_sources:
         all_sources[s['url']] = s
     return list(all_sources.values())
 
+@st.cache_data(show_spinner=False)
+def _read_selected_topics(mtime):
+    try:
+        with open(SELECTED_TOPICS_PATH, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return []
+
+def load_selected_topics():
+    # Previously selected topics, if any were saved; the file is only read again once it changes
+    try:
+        mtime = os.path.getmtime(SELECTED_TOPICS_PATH)
+    except OSError:
+        return []
+    return list(_read_selected_topics(mtime))
+
+# Cached database reads. Every write bumps storage.data_generation(), which is part of
+# each cache key, so a cached result is never older than the last write from any
+# process (the ingest daemon included).
+
+def _rows(rows):
+    # sqlite3.Row does not pickle, and st.cache_data stores pickled copies
+    return [dict(row) for row in rows]
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def cached_sources(generation):
+    return storage.list_sources()
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def cached_source_categories(generation):
+    return storage.source_categories()
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def cached_source_health(urls, generation):
+    return storage.get_source_health(urls)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def cached_feed_page(cursor, limit, source_ids, categories, date_from, date_to, generation):
+    rows, next_cursor = storage.feed_page(cursor=cursor, limit=limit, source_ids=source_ids, categories=categories,
+                                          date_from=date_from, date_to=date_to)
+    return _rows(rows), next_cursor
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def cached_feed_rows(article_ids, generation):
+    return _rows(storage.feed_rows(article_ids))
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def cached_cluster_members(cluster_ids, generation):
+    return {cluster_id: _rows(rows) for cluster_id, rows in storage.cluster_members(cluster_ids).items()}
+
 st.set_page_config(page_title='Clearfeed', layout='wide')
 st.title('📰 Clearfeed: Curated news for what you care about')
 
 # --- Page selector ---
-page = st.sidebar.radio('Navigate', ['Source Scout', 'News Feed', 'Manage Sources'])
-
-import datetime
-
-def normalize_timestamp(ts):
-    if not ts:
-        return datetime.datetime.utcnow().replace(microsecond=0).isoformat() + 'Z'
-    try:
-        # Try parsing common formats
-        dt = None
-        for fmt in ("%a, %d %b %Y %H:%M:%S %Z", "%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):  # RSS, ISO, fallback
-            try:
-                dt = datetime.datetime.strptime(ts, fmt)
-                break
-            except Exception:
-                continue
-        if dt is None:
-            # Try fromisoformat (Python 3.7+)
-            try:
-                dt = datetime.datetime.fromisoformat(ts.replace('Z', '+00:00'))
-            except Exception:
-                pass
-        if dt is None:
-            return datetime.datetime.utcnow().replace(microsecond=0).isoformat() + 'Z'
-        return dt.replace(microsecond=0, tzinfo=datetime.timezone.utc).isoformat().replace('+00:00', 'Z')
-    except Exception:
-        return datetime.datetime.utcnow().replace(microsecond=0).isoformat() + 'Z'
+page = st.sidebar.radio('Navigate', ['Source Scout', 'News Feed', 'Manage Sources'], key='page')
+generation = storage.data_generation()
 
 if page == 'Manage Sources':
+    from agents.source_health import breaker_open
+    from utils.http_client import pool_stats
     st.header('Manage News Sources')
     if st.button('Reset Feed (Delete All Articles)', type='primary'):
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute('DELETE FROM articles')
-        conn.commit()
-        conn.close()
+        storage.delete_all_articles()
+        archive.remove_segments()
+        storage.reclaim_space()
         st.success('All articles have been deleted from your feed.')
         st.rerun()
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT id, name, url, category, trust_score FROM sources ORDER BY name')
-    sources = cur.fetchall()
-    conn.close()
+    sources = cached_sources(generation)
     if not sources:
         st.info('No sources in your database.')
     else:
+        health = cached_source_health(tuple(src['url'] for src in sources), generation)
         for src in sources:
             col1, col2, col3, col4, col5, col6 = st.columns([2,3,4,2,2,2])
             col1.write(src['name'])
@@ -87,52 +107,39 @@ if page == 'Manage Sources':
             col3.write(src['url'])
             col4.write(f"Trust: {src['trust_score']}")
             if col5.button('Remove', key=f"remove_{src['id']}"):
-                conn = get_db_connection()
-                cur = conn.cursor()
-                cur.execute('DELETE FROM sources WHERE id = ?', (src['id'],))
-                conn.commit()
-                conn.close()
+                storage.delete_source(src['id'])
                 st.success(f"Source '{src['name']}' removed.")
                 st.rerun()
+            row = health.get(src['url'])
+            if row:
+                status = (f"Paused until {datetime.datetime.fromtimestamp(row['open_until']):%H:%M}"
+                          if breaker_open(row) else 'OK')
+                col6.caption(f"{status} · {row['error_rate'] or 0:.0%} errors · {row['latency'] or 0:.1f}s/poll")
+            else:
+                col6.caption('Not fetched yet')
     st.markdown('---')
+    with st.expander('Pipeline timings (this session)'):
+        timings = stage_table()
+        if timings:
+            # Busiest stage and source first
+            st.dataframe(timings)
+            col_prom, col_json = st.columns(2)
+            col_prom.download_button('Download Prometheus metrics', export_prometheus(), file_name='clearfeed_metrics.prom')
+            col_json.download_button('Download JSON snapshot', export_json(), file_name='clearfeed_metrics.json')
+        else:
+            st.caption('No timings recorded yet. Scout or fetch some news first.')
+        pools = pool_stats()
+        if pools:
+            st.markdown('**HTTP connection pools** (requests per host and how many reused a kept-alive connection)')
+            st.dataframe(pools)
 
 elif page == 'Source Scout':
+    from agents.source_scout import scout_topics
+    from agents.pipeline import stream_ingest
 
     # --- Scouting new sources ---
-    grouped_topics = {
-        'Sports': ['Football', 'Cricket', 'Tennis', 'Basketball', 'Baseball', 'Formula 1', 'Olympics', 'Golf', 'Hockey'],
-        'Health': [
-            'Diabetes', 'Cancer', 'Mental Health', 'Heart Disease', 'COVID-19', 'Nutrition', 'Fitness', 'Obesity', "Alzheimer's",
-            'Malaria', 'HIV/AIDS', 'Tuberculosis', 'Dengue', 'Zika', 'Ebola', 'Polio', 'Measles', 'Influenza', 'Asthma', 'Arthritis', 'Epilepsy', 'Autism', 'Parkinson\'s', 'Multiple Sclerosis', 'Lupus', 'Cystic Fibrosis', 'Rare Diseases'
-        ],
-        'Technology': ['Artificial Intelligence', 'Cybersecurity', 'Gadgets', 'Software Development', 'Space', 'Blockchain', 'Startups'],
-        'Science': ['Astronomy', 'Physics', 'Biology', 'Climate Change', 'Genetics', 'Chemistry'],
-        'World': ['Asia', 'Europe', 'Americas', 'Africa', 'Middle East', 'Oceania'],
-        'Business': ['Stock Market', 'Startups', 'Economy', 'Personal Finance', 'Real Estate', 'Cryptocurrency'],
-        'Education': ['EdTech', 'Higher Education', 'K-12', 'Online Learning'],
-        'Politics': ['Elections', 'Policy', 'International Relations', 'Government'],
-        'Entertainment': ['Movies', 'Music', 'Television', 'Celebrities', 'Gaming'],
-        'Climate': ['Global Warming', 'Renewable Energy', 'Wildlife', 'Pollution']
-    }
-    # Flat list of all subtopics
-    all_subtopics = [sub for subs in grouped_topics.values() for sub in subs]
-    # Map subtopic to group for backend
-    topic_to_group = {}
-    for group, subtopics in grouped_topics.items():
-        for sub in subtopics:
-            topic_to_group[sub] = group
-    import json
-    SELECTED_TOPICS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'selected_topics.json')
-    # Load previously selected topics if available
-    if os.path.exists(SELECTED_TOPICS_PATH):
-        try:
-            with open(SELECTED_TOPICS_PATH, 'r') as f:
-                default_selected_topics = json.load(f)
-        except Exception:
-            default_selected_topics = []
-    else:
-        default_selected_topics = []
-    selected_topics = st.multiselect('Search and select topics of interest:', all_subtopics, default=default_selected_topics, key='topic_multiselect')
+    default_selected_topics = load_selected_topics()
+    selected_topics = st.multiselect('Search and select topics of interest:', ALL_TOPICS, default=default_selected_topics, key='topic_multiselect')
     # Persist selected topics on change
     if set(selected_topics) != set(default_selected_topics):
         try:
@@ -149,21 +156,19 @@ elif page == 'Source Scout':
     if st.button('Scout and Vet News Sources'):
         all_sources = []
         seen_urls = set()
-        # Map subtopic to group
-        topic_to_group = {}
-        for group, subtopics in grouped_topics.items():
-            for sub in subtopics:
-                topic_to_group[sub] = group
-        for topic in selected_topics:
-            group = topic_to_group.get(topic)
-            print(f"[DEBUG] User selected topic: {topic} (group: {group})")
-            with st.spinner(f'Scouting news sources for "{topic}"...'):
-                sources = scout_and_vet_sources(topic, group)
-            print(f"[DEBUG] Sources found for {topic}: {sources}")
-            for src in sources:
+        log_event(f"User selected topics: {selected_topics}", logging.DEBUG)
+        progress = st.empty()
+        partial = st.empty()
+        with st.spinner(f'Scouting news sources for {len(selected_topics)} topics...'):
+            for src in scout_topics(selected_topics, TOPIC_TO_GROUP):
                 if src['url'] not in seen_urls:
                     all_sources.append(src)
                     seen_urls.add(src['url'])
+                    # Show sources as they are discovered instead of waiting for the slowest site
+                    progress.info(f"Found {len(all_sources)} sources so far...")
+                    partial.dataframe(all_sources)
+        progress.empty()
+        partial.empty()
         if not all_sources:
             st.warning('No sources found for these topics. Try others.')
         else:
@@ -175,28 +180,18 @@ elif page == 'Source Scout':
         if st.button('Show Vetted Sources Table', key='show_vetted_sources_table_btn'):
             st.dataframe(sources)
         if st.button('Save Vetted Sources to Database', key='save_vetted_sources_btn'):
-            conn = get_db_connection()
-            cur = conn.cursor()
-            added = 0
-            for src in sources:
-                try:
-                    cur.execute('INSERT OR IGNORE INTO sources (name, url, category, trust_score, user_added) VALUES (?, ?, ?, ?, ?)',
-                        (src['name'], src['url'], src['category'], src['trust_score'], 1))
-                    added += cur.rowcount
-                except Exception as e:
-                    st.warning(f"Could not save source {src['name']}: {e}")
-            conn.commit()
-            conn.close()
+            try:
+                added = storage.save_sources(sources)
+            except Exception as e:
+                added = 0
+                st.warning(f"Could not save sources: {e}")
             st.success(f"Saved {added} new sources to the database.")
     st.markdown('---')
     st.markdown('#### Or fetch news from your saved sources below:')
 
     # --- Load sources from database ---
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('SELECT name, url, category, trust_score FROM sources ORDER BY name')
-    db_sources = [dict(row) for row in cur.fetchall()]
-    conn.close()
+    # Sources may have just been saved above
+    db_sources = cached_sources(storage.data_generation())
 
     if db_sources:
         if selected_topics:
@@ -204,77 +199,120 @@ elif page == 'Source Scout':
         st.info(f"{len(db_sources)} sources found in your database. Select which to use.")
         source_names = [s['name'] for s in db_sources]
         selected_sources = st.multiselect('Select news sources to fetch from:', source_names, default=source_names, key='db_source_multiselect')
-        print(f"[DEBUG] User selected sources from DB: {selected_sources}")
+        log_event(f"User selected sources from DB: {selected_sources}", logging.DEBUG)
         if not selected_sources:
             st.warning('Please select at least one news source to continue.')
         if st.button('Fetch & Summarize News from DB Sources', key='fetch_summarize_news_db_btn'):
             chosen = [s for s in db_sources if s['name'] in selected_sources]
-            print(f"[DEBUG] Fetching articles from DB sources: {chosen}")
-            st.info('Fetching articles...')
+            log_event(f"Fetching articles from DB sources: {[s['name'] for s in chosen]}", logging.DEBUG)
+            st.info('Fetching and summarizing articles...')
             MAX_ARTICLES = 20
-            articles = fetch_articles(chosen, max_articles=MAX_ARTICLES)
-            print(f"[DEBUG] Articles fetched: {articles}")
-            if not articles:
+            # Cards appear as soon as each summary is ready; copies of a story are listed under it
+            progress = st.empty()
+            fetched = 0
+            copies = {}
+            also_covered = {}
+            for art in stream_ingest(chosen, max_articles=MAX_ARTICLES, topics=selected_topics):
+                fetched += 1
+                progress.info(f'Fetched and summarized {fetched} articles so far...')
+                rep = art.get('duplicate_of')
+                if rep is not None and id(rep) in also_covered:
+                    copies[id(rep)].append(art)
+                    also_covered[id(rep)].caption('Also covered by: ' + ', '.join(f"[{c['source_name']}]({c['url']})" for c in copies[id(rep)]))
+                    continue
+                col_img, col_txt = st.columns([1,4])
+                with col_img:
+                    st.image(thumbnail_for(art.get('image_url'), load_thumbnails([art.get('image_url')])), width=120)
+                with col_txt:
+                    st.markdown(f"### [{art['title']}]({art['url']})\n**Source:** {art['source_name']}\n\n{art['summary']}")
+                    if art.get('tags'):
+                        st.caption('Topics: ' + ', '.join(art['tags']))
+                    also_covered[id(art)] = st.empty()
+                    copies[id(art)] = []
+            progress.empty()
+            log_event(f"Articles fetched: {fetched}")
+            if not fetched:
                 st.warning('No articles could be fetched from the selected sources.')
-            else:
-                st.info('Summarizing articles...')
-                for art in articles:
-                    print(f"[DEBUG] Summarizing article: {art.get('title')}")
-                    summary = summarize_article(art['raw_text'])
-                    image_url = art.get('image_url') or 'https://placehold.co/120x80?text=No+Image'
-                    col_img, col_txt = st.columns([1,4])
-                    with col_img:
-                        st.image(image_url, width=120)
-                    with col_txt:
-                        st.markdown(f"### [{art['title']}]({art['url']})\n**Source:** {art['source_name']}\n\n{summary}")
-                    # Save to DB immediately
-                    try:
-                        print(f"[DB] Attempting to save article: {art.get('title')} from source: {art.get('source_name')}")
-                        conn = get_db_connection()
-                        cur = conn.cursor()
-                        print(f"[DB] Looking up source_id for source: {art.get('source_name')}")
-                        cur.execute('SELECT id FROM sources WHERE name = ? LIMIT 1', (art.get('source_name'),))
-                        source_row = cur.fetchone()
-                        source_id = source_row['id'] if source_row else None
-                        print(f"[DB] Found source_id: {source_id}")
-                        if source_id:
-                            print(f"[DB] Inserting article into DB: {art.get('title')} ({art.get('url')})")
-                            cur.execute('''
-                                INSERT INTO articles (source_id, title, url, image_url, published_at, raw_text, summary, language, tags)
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                                (source_id, art['title'], art['url'], art.get('image_url', ''), normalize_timestamp(art.get('published')), art['raw_text'], summary, 'en', ','.join(art.get('tags', []))))
-                            conn.commit()
-                            print(f"[DB] Article saved (or duplicate ignored): {art.get('title')} ({art.get('url')})")
-                        else:
-                            print(f"[DB] Source not found for article: {art.get('title')} (source: {art.get('source_name')})")
-                        conn.close()
-                    except Exception as e:
-                        print(f"[DB ERROR] Could not save article '{art.get('title')}': {e}")
+        st.caption('Tip: run `python ingest.py` to keep your feed updated in the background.')
 
 elif page == 'News Feed':
+    from agents.ranker import ranked_ids
+    from agents.summary_scheduler import upgrade_in_background
+    from agents.translator import LANGUAGES, translate_articles
     st.header('📰 My Saved News Feed')
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('''
-        SELECT a.title, a.url, a.image_url, a.summary, a.published_at, s.name as source_name
-        FROM articles a
-        JOIN sources s ON a.source_id = s.id
-        ORDER BY a.published_at DESC, a.id DESC
-        LIMIT 50
-    ''')
-    rows = cur.fetchall()
-    conn.close()
+    FEED_PAGE_SIZE = 20
+    # --- Filters (applied in SQL) ---
+    feed_sources = cached_sources(generation)
+    source_ids_by_name = {s['name']: s['id'] for s in feed_sources}
+    filter_sources = st.sidebar.multiselect('Sources', list(source_ids_by_name), key='feed_source_filter')
+    filter_categories = st.sidebar.multiselect('Categories', cached_source_categories(generation), key='feed_category_filter')
+    filter_dates = st.sidebar.date_input('Published between', value=(), key='feed_date_filter')
+    summary_language = st.sidebar.selectbox('Summary language', list(LANGUAGES), key='feed_language')
+    feed_order = st.sidebar.radio('Order', ['For you', 'Newest first'], key='feed_order',
+                                  help='For you weighs recency, source trust and your selected topics')
+    feed_topics = load_selected_topics()
+    date_from = filter_dates[0].isoformat() if len(filter_dates) > 0 else None
+    # date_to is exclusive, so include the whole end day
+    date_to = (filter_dates[1] + datetime.timedelta(days=1)).isoformat() if len(filter_dates) > 1 else None
+    filters = (feed_order, tuple(feed_topics), tuple(filter_sources), tuple(filter_categories), date_from, date_to)
+    # Cursor stack: the last entry is the cursor of the current page (an offset into the
+    # ranking, or a keyset cursor when newest first)
+    if st.session_state.get('feed_filters') != filters:
+        st.session_state['feed_filters'] = filters
+        st.session_state['feed_cursors'] = [None]
+    cursors = st.session_state['feed_cursors']
+    # Index articles saved before search existed, one batch per rerun
+    if storage.backfill_search_index() > 0:
+        st.caption('Search index is still catching up with older articles.')
+    search_text = st.text_input('Search articles', key='feed_search', placeholder='e.g. malaria vaccine')
+    if search_text.strip():
+        results = storage.search_articles(search_text, limit=FEED_PAGE_SIZE)
+        st.write(f"{len(results)} results for **{search_text}**")
+        for row in results:
+            st.markdown(f"### [{row['title']}]({row['url']})")
+            st.write(f"**Source:** {row['source_name']}  ")
+            st.write(f"**Published:** {row['published_at'] or 'N/A'}  ")
+            st.markdown(f"…{row['snippet']}…")
+            st.markdown('---')
+        st.stop()
+    filter_source_ids = [source_ids_by_name[n] for n in filter_sources]
+    if feed_order == 'For you':
+        ranking = ranked_ids(feed_topics, filter_source_ids, filter_categories, date_from, date_to)
+        offset = cursors[-1] or 0
+        rows = cached_feed_rows(tuple(ranking[offset:offset + FEED_PAGE_SIZE].tolist()), generation)
+        next_cursor = offset + FEED_PAGE_SIZE if offset + FEED_PAGE_SIZE < len(ranking) else None
+    else:
+        rows, next_cursor = cached_feed_page(cursors[-1], FEED_PAGE_SIZE, tuple(filter_source_ids), tuple(filter_categories),
+                                             date_from, date_to, generation)
     if not rows:
         st.info('No news articles saved yet. Fetch and summarize some news first!')
     else:
+        also_covered = cached_cluster_members(tuple(row['id'] for row in rows if row['cluster_id'] == row['id']), generation)
+        # Quick local summaries on this page get an LLM one in the background, shown on a later visit
+        upgrade_in_background([row['id'] for row in rows if row['summary_tier'] == 'local'])
+        # Only this page is translated, and only the first time it is viewed in that language
+        summaries = translate_articles(rows, summary_language)
+        # Thumbnails were cached at ingestion; images that were not show the bundled placeholder
+        thumbnails = load_thumbnails([row['image_url'] for row in rows])
         for row in rows:
-            image_url = row['image_url'] or 'https://placehold.co/120x80?text=No+Image'
             col_img, col_txt = st.columns([1,4])
             with col_img:
-                st.image(image_url, width=120)
+                st.image(thumbnail_for(row['image_url'], thumbnails), width=120)
             with col_txt:
                 st.markdown(f"### [{row['title']}]({row['url']})")
                 st.write(f"**Source:** {row['source_name']}  ")
                 st.write(f"**Published:** {row['published_at'] or 'N/A'}  ")
-                st.write(row['summary'] or '[No summary available]')
+                st.write(summaries.get(row['id']) or '[No summary available]')
+                if row['summary_tier'] == 'local':
+                    st.caption('Quick summary: key sentences from the article')
+                if row['id'] in also_covered:
+                    st.caption('Also covered by: ' + ', '.join(f"[{m['source_name']}]({m['url']})" for m in also_covered[row['id']]))
             st.markdown('---')
+    col_newer, col_page, col_older = st.columns([1, 2, 1])
+    if len(cursors) > 1 and col_newer.button('← Newer', key='feed_newer_btn'):
+        cursors.pop()
+        st.rerun()
+    col_page.write(f"Page {len(cursors)}")
+    if next_cursor and col_older.button('Older →', key='feed_older_btn'):
+        cursors.append(next_cursor)
+        st.rerun()
@@ -0,0 +1,105 @@
+"""
+Streamlit startup and rerun benchmark. Each page of app.py is run headless with
+streamlit's AppTest, against a database seeded with --articles articles:
+
+    python benchmarks/bench_app.py [--articles 2000] [--reruns 10]
+
+For every page it reports the first run in a fresh interpreter (imports included),
+the median rerun (what every click costs) and which heavy client libraries the page
+loaded.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from db import storage  # noqa: E402
+
+APP_PATH = os.path.join(os.path.dirname(__file__), '..', 'app.py')
+PAGES = ('Source Scout', 'News Feed', 'Manage Sources')
+# Libraries only some pages need
+HEAVY_MODULES = ('newspaper', 'openai', 'serpapi', 'googletrans', 'PIL', 'numpy')
+CATEGORIES = ('Health', 'Sports', 'Technology', 'World')
+
+def seed(workdir, articles=2000, sources=20):
+    """
+    A copy of app.py in `workdir` (so its database and data files live there) and a
+    database with `sources` sources and `articles` articles.
+    """
+    os.makedirs(os.path.join(workdir, 'db'))
+    os.makedirs(os.path.join(workdir, 'data'))
+    shutil.copy(APP_PATH, os.path.join(workdir, 'app.py'))
+    shutil.copy(os.path.join(os.path.dirname(APP_PATH), 'data', 'sources.json'), os.path.join(workdir, 'data'))
+    db_path = os.path.join(workdir, 'db', 'clearfeed.db')
+    storage.save_sources([{'name': f'Source {i}', 'url': f'http://source{i}.example/rss',
+                           'category': CATEGORIES[i % len(CATEGORIES)], 'trust_score': 5.0 + i % 5}
+                          for i in range(sources)], db_path=db_path)
+    start = time.time()
+    storage.save_articles([{'title': f'Story {i}', 'url': f'http://source{i % sources}.example/{i}',
+                            'source_name': f'Source {i % sources}', 'summary': f'Summary of story {i}. ' * 5,
+                            'summary_tier': 'llm', 'raw_text': f'Text of story {i}. ' * 50,
+                            'published': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(start - i * 600)),
+                            'tags': ['Malaria'] if i % 7 == 0 else []}
+                           for i in range(articles)], db_path=db_path)
+    storage.backfill_search_index(db_path=db_path)
+    storage.close_connections()
+    return db_path
+
+def measure_page(workdir, page, reruns=10):
+    """
+    Run in a fresh interpreter (see main): first run and reruns of one page.
+    """
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(workdir, 'app.py'), default_timeout=120)
+    at.session_state['page'] = page
+    start = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - start
+    times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - start)
+    return {'page': page, 'first': first, 'rerun': statistics.median(times),
+            'errors': [str(e.value) for e in at.exception],
+            'loaded': [m for m in HEAVY_MODULES if m in sys.modules]}
+
+def report(results):
+    print(f"{'page':<16}{'first run ms':>14}{'rerun ms':>10}  heavy modules loaded")
+    for r in results:
+        print(f"{r['page']:<16}{r['first'] * 1000:>14.0f}{r['rerun'] * 1000:>10.1f}  {', '.join(r['loaded']) or '-'}")
+        for error in r['errors']:
+            print(f"  error: {error}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Streamlit startup and rerun benchmark')
+    parser.add_argument('--articles', type=int, default=2000)
+    parser.add_argument('--reruns', type=int, default=10)
+    parser.add_argument('--page', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.page:
+        print(json.dumps(measure_page(args.workdir, args.page, args.reruns)))
+        return None
+    workdir = tempfile.mkdtemp(prefix='clearfeed-app-bench-')
+    try:
+        seed(workdir, args.articles)
+        env = {k: v for k, v in os.environ.items() if k != 'OPENAI_API_KEY'}
+        results = []
+        for page in PAGES:
+            out = subprocess.run([sys.executable, __file__, '--page', page, '--workdir', workdir,
+                                  '--reruns', str(args.reruns)], capture_output=True, text=True, env=env, check=True)
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    report(results)
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+End-to-end Clearfeed benchmark, fully offline: scout -> fetch -> summarize -> save
+against the local stand-ins in benchmarks/fake_services.py.
+
+    python benchmarks/bench_pipeline.py [--sites 8] [--max-articles 40] [--article-latency 0.05] ...
+
+Reports articles per second, p50/p95 latency per stage and peak RSS. Each run is
+appended to benchmarks/results.jsonl and compared with the previous run that used
+the same settings.
+"""
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import datetime
+import resource
+import tempfile
+import threading
+import contextlib
+import subprocess
+import concurrent.futures
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import openai  # noqa: E402
+from serpapi import serp_api_client  # noqa: E402
+from agents import source_scout, article_fetcher, summarizer, summary_scheduler  # noqa: E402
+from db import storage  # noqa: E402
+from benchmarks.fake_services import FakeWeb  # noqa: E402
+
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), 'results.jsonl')
+SAVE_BATCH = 10
+
+def percentile(values, q):
+    # Nearest-rank percentile
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+class StageTimer:
+    """
+    Collects per-call latencies by stage; wrap() times every call of a function.
+    """
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def summary(self):
+        return {stage: {'count': len(values), 'p50': percentile(values, 50), 'p95': percentile(values, 95),
+                        'total': sum(values)}
+                for stage, values in self.samples.items()}
+
+@contextlib.contextmanager
+def patched(patches):
+    """
+    Temporarily set attributes: patches is a list of (object, name, value).
+    """
+    saved = [(obj, name, getattr(obj, name)) for obj, name, _ in patches]
+    for obj, name, value in patches:
+        setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        for obj, name, value in reversed(saved):
+            setattr(obj, name, value)
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_benchmark(sites=8, max_articles=40, items_per_feed=20, article_latency=0.05, article_bytes=8000,
+                  openai_latency=0.2, topic='Technology', workdir=None):
+    """
+    Run every stage once against a fresh FakeWeb and empty databases in `workdir`.
+    Returns the result record (see main()).
+    """
+    timer = StageTimer()
+    wall = {}
+    db_path = os.path.join(workdir, 'bench.db')
+    with FakeWeb(sites, items_per_feed, article_latency, article_bytes, openai_latency) as web, patched([
+        (serp_api_client.SerpApiClient, 'BACKEND', web.serpapi_base),
+        (source_scout, 'SERPAPI_KEY', 'bench'),
+        (storage, 'DB_PATH', db_path),
+        (source_scout, 'scout_sources_for_topic', timer.wrap('scout.search', source_scout.scout_sources_for_topic)),
+        (source_scout, 'find_site_feeds', timer.wrap('scout.discover', source_scout.find_site_feeds)),
+        (article_fetcher, '_fetch_job', timer.wrap('fetch', article_fetcher._fetch_job)),
+        (openai, 'api_base', web.openai_base),
+    ]):
+        start = time.perf_counter()
+        sources = source_scout.scout_and_vet_sources(topic)
+        wall['scout'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        articles = article_fetcher.fetch_articles(sources, max_articles=max_articles)
+        wall['fetch'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        summarize = timer.wrap('summarize', summarizer.summarize_article)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=summary_scheduler.DEFAULT_WORKERS) as executor:
+            summaries = list(executor.map(lambda art: summarize(art['raw_text'] or '', use_cache=False), articles))
+        for art, summary in zip(articles, summaries):
+            art['summary'] = summary
+        wall['summarize'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        storage.save_sources(sources, db_path=db_path)
+        saved = 0
+        for i in range(0, len(articles), SAVE_BATCH):
+            saved += timer.wrap('save', storage.save_articles)(articles[i:i + SAVE_BATCH], db_path=db_path)
+        wall['save'] = time.perf_counter() - start
+        storage.close_connections()
+        requests_served = dict(web.requests)
+
+    pipeline_time = wall['fetch'] + wall['summarize'] + wall['save']
+    return {
+        'sources': len(sources),
+        'articles': len(articles),
+        'saved': saved,
+        'failed_summaries': sum(1 for s in summaries if not summarizer.is_usable(s)),
+        'articles_per_sec': len(articles) / pipeline_time if pipeline_time else None,
+        'wall': wall,
+        'stages': timer.summary(),
+        'peak_rss_mb': peak_rss_mb(),
+        'requests': requests_served,
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def load_results(path=RESULTS_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _ms(seconds):
+    return f'{seconds * 1000:8.1f}' if seconds is not None else '       -'
+
+def report(record, previous=None):
+    print(f"Sources: {record['sources']}   articles: {record['articles']}   saved: {record['saved']}   "
+          f"failed summaries: {record['failed_summaries']}")
+    print(f"Throughput: {record['articles_per_sec']:.2f} articles/s (fetch + summarize + save)")
+    print(f"Peak RSS: {record['peak_rss_mb']:.1f} MB\n")
+    print('Wall time: ' + ', '.join(f'{stage} {seconds:.2f}s' for stage, seconds in record['wall'].items()) + '\n')
+    print(f"{'stage':<16}{'calls':>6}{'p50 ms':>9}{'p95 ms':>9}")
+    for stage, stats in sorted(record['stages'].items()):
+        print(f"{stage:<16}{stats['count']:>6}{_ms(stats['p50'])} {_ms(stats['p95'])}")
+    if previous:
+        print(f"\nCompared with {previous['timestamp']} ({previous.get('commit') or 'unknown commit'}):")
+        before, after = previous['articles_per_sec'], record['articles_per_sec']
+        if before and after:
+            print(f"  throughput {before:.2f} -> {after:.2f} articles/s ({(after - before) / before:+.0%})")
+        for stage, stats in sorted(record['stages'].items()):
+            old = previous['stages'].get(stage)
+            if old and old['p95'] and stats['p95']:
+                print(f"  {stage:<14} p95 {old['p95'] * 1000:.1f} -> {stats['p95'] * 1000:.1f} ms "
+                      f"({(stats['p95'] - old['p95']) / old['p95']:+.0%})")
+        print(f"  peak RSS {previous['peak_rss_mb']:.1f} -> {record['peak_rss_mb']:.1f} MB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline end-to-end Clearfeed benchmark')
+    parser.add_argument('--sites', type=int, default=8, help='number of fake news sites (at most 10 are scouted)')
+    parser.add_argument('--max-articles', type=int, default=40)
+    parser.add_argument('--items-per-feed', type=int, default=20)
+    parser.add_argument('--article-latency', type=float, default=0.05, help='seconds before each article page is served')
+    parser.add_argument('--article-bytes', type=int, default=8000, help='approximate article text size')
+    parser.add_argument('--openai-latency', type=float, default=0.2, help='seconds per chat completion')
+    parser.add_argument('--topic', default='Technology')
+    parser.add_argument('--results', default=RESULTS_PATH, help='JSONL file the run is appended to')
+    parser.add_argument('--no-record', action='store_true', help='do not append this run to the results file')
+    args = parser.parse_args(argv)
+    params = {'sites': args.sites, 'max_articles': args.max_articles, 'items_per_feed': args.items_per_feed,
+              'article_latency': args.article_latency, 'article_bytes': args.article_bytes,
+              'openai_latency': args.openai_latency, 'topic': args.topic}
+    os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+    workdir = tempfile.mkdtemp(prefix='clearfeed-bench-')
+    try:
+        result = run_benchmark(workdir=workdir, **params)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    record = {'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+              'commit': _git_commit(), 'params': params, **result}
+    previous = next((r for r in reversed(load_results(args.results)) if r.get('params') == params), None)
+    report(record, previous)
+    if not args.no_record:
+        with open(args.results, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+    return record
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare feedparser with the streaming parser in utils/rss_parser on a large synthetic feed.
+
+    python benchmarks/bench_rss_parser.py [--items 5000] [--limit 5]
+
+Reports CPU time and peak traced memory (tracemalloc) for:
+  feedparser        the old path: feedparser on the whole document, then _entry_to_article
+  streaming (all)   iter_entries over the whole document
+  streaming (N)     iter_entries stopped after N entries, as fetch_articles uses it
+"""
+import os
+import sys
+import time
+import argparse
+import itertools
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from utils import rss_parser  # noqa: E402
+
+ITEM = ('<item><title>Story {i}: a headline of typical length for a news feed</title>'
+        '<link>https://news.example.com/2025/01/06/story-{i}</link>'
+        '<guid>https://news.example.com/2025/01/06/story-{i}</guid>'
+        '<description><![CDATA[<p>{body}</p>]]></description>'
+        '<pubDate>Mon, 06 Jan 2025 10:{m:02d}:00 GMT</pubDate></item>')
+
+def make_feed(items):
+    body = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8
+    entries = ''.join(ITEM.format(i=i, m=i % 60, body=body) for i in range(items))
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>Big</title>{entries}</channel></rss>'.encode()
+
+def chunks(data):
+    for i in range(0, len(data), rss_parser.CHUNK_SIZE):
+        yield data[i:i + rss_parser.CHUNK_SIZE]
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.process_time()
+    count = fn()
+    elapsed = time.process_time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=5)
+    args = parser.parse_args(argv)
+    data = make_feed(args.items)
+    print(f'Feed: {args.items} items, {len(data) / 1e6:.1f} MB\n')
+    cases = [
+        ('feedparser', lambda: len([rss_parser._entry_to_article(e) for e in rss_parser.feedparser.parse(data).entries])),
+        ('streaming (all)', lambda: len(list(rss_parser.iter_entries(chunks(data))))),
+        (f'streaming ({args.limit})', lambda: len(list(itertools.islice(rss_parser.iter_entries(chunks(data)), args.limit)))),
+    ]
+    print(f"{'parser':<18}{'entries':>8}{'CPU (s)':>10}{'peak (MB)':>11}")
+    for name, fn in cases:
+        count, elapsed, peak = measure(fn)
+        print(f'{name:<18}{count:>8}{elapsed:>10.3f}{peak / 1e6:>11.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Local stand-ins for everything Clearfeed talks to, for offline benchmarks:
+news sites (home page, RSS feed, article pages), the SerpAPI search endpoint and an
+OpenAI-compatible chat completions endpoint.
+
+Each site runs on its own port, so the scout's per-domain deduplication and the
+fetcher's per-host limits see them as different hosts.
+"""
+import json
+import time
+import random
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WORDS = ('government market research health players season technology climate energy election '
+         'minister company study scientists team league vaccine startup investors policy ocean '
+         'satellite hospital patients report growth prices workers court council record storm').split()
+
+def _serve(handler):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _respond(self):
+            status, headers, body = handler(self)
+            self.send_response(status)
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = _respond
+        do_POST = _respond
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def _paragraphs(seed, size):
+    # Deterministic filler text of roughly `size` bytes, different for every article
+    rng = random.Random(seed)
+    paragraphs = []
+    total = 0
+    while total < size:
+        sentence = ' '.join(rng.choices(WORDS, k=rng.randint(12, 24))).capitalize() + '.'
+        paragraph = ' '.join([sentence] + [' '.join(rng.choices(WORDS, k=15)) + '.' for _ in range(3)])
+        paragraphs.append(f'<p>{paragraph}</p>')
+        total += len(paragraph)
+    return '\n'.join(paragraphs)
+
+class FakeWeb:
+    """
+    Start with `with FakeWeb(...) as web:`; `web.site_urls`, `web.serpapi_base` and
+    `web.openai_base` are the base URLs to point Clearfeed at.
+    """
+    def __init__(self, sites=8, items_per_feed=20, article_latency=0.05, article_bytes=8000, openai_latency=0.2):
+        self.sites = sites
+        self.items_per_feed = items_per_feed
+        self.article_latency = article_latency
+        self.article_bytes = article_bytes
+        self.openai_latency = openai_latency
+        self.servers = []
+        self.site_urls = []
+        self.serpapi_base = None
+        self.openai_base = None
+        self.requests = {'home': 0, 'rss': 0, 'article': 0, 'search': 0, 'chat': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, kind):
+        with self._lock:
+            self.requests[kind] += 1
+
+    def _site_handler(self, site):
+        def handler(req):
+            path = urlparse(req.path).path
+            base = self.site_urls[site]
+            if path == '/':
+                self._count('home')
+                body = (f'<html><head><title>Site {site} News</title>'
+                        f'<link rel="alternate" type="application/rss+xml" title="Site {site}" href="{base}/rss"></head>'
+                        f'<body><h1>Site {site} News</h1></body></html>')
+                return 200, {'Content-Type': 'text/html; charset=utf-8'}, body.encode()
+            if path == '/rss':
+                self._count('rss')
+                items = ''.join(
+                    f'<item><title>Site {site} story {i}</title><link>{base}/article/{i}</link>'
+                    f'<description>Short blurb for story {i} from site {site}.</description>'
+                    f'<pubDate>Mon, 06 Jan 2025 {i % 24:02d}:00:00 GMT</pubDate></item>'
+                    for i in range(self.items_per_feed))
+                body = (f'<?xml version="1.0"?><rss version="2.0"><channel><title>Site {site}</title>'
+                        f'<link>{base}/</link><description>Synthetic feed</description>{items}</channel></rss>')
+                return 200, {'Content-Type': 'application/rss+xml'}, body.encode()
+            if path.startswith('/article/'):
+                self._count('article')
+                time.sleep(self.article_latency)
+                i = path.rsplit('/', 1)[-1]
+                body = (f'<html><head><title>Site {site} story {i}</title>'
+                        f'<meta property="og:image" content="{base}/images/{i}.jpg"></head>'
+                        f'<body><article><h1>Site {site} story {i}</h1>'
+                        f'{_paragraphs(f"{site}/{i}", self.article_bytes)}</article></body></html>')
+                return 200, {'Content-Type': 'text/html; charset=utf-8'}, body.encode()
+            return 404, {'Content-Type': 'text/plain'}, b'not found'
+        return handler
+
+    def _services_handler(self, req):
+        path = urlparse(req.path).path
+        if path == '/search':
+            self._count('search')
+            num = int(parse_qs(urlparse(req.path).query).get('num', ['10'])[0])
+            results = [{'position': i + 1, 'link': url + '/'} for i, url in enumerate(self.site_urls[:num])]
+            body = {'search_information': {'total_results': len(results)}, 'organic_results': results}
+            return 200, {'Content-Type': 'application/json'}, json.dumps(body).encode()
+        if path.endswith('/chat/completions'):
+            self._count('chat')
+            request = json.loads(req.rfile.read(int(req.headers['Content-Length'])))
+            time.sleep(self.openai_latency)
+            words = request['messages'][0]['content'].split()[-40:]
+            payload = {'id': 'bench', 'object': 'chat.completion', 'model': request.get('model'),
+                       'choices': [{'index': 0, 'finish_reason': 'stop',
+                                    'message': {'role': 'assistant', 'content': 'Summary: ' + ' '.join(words[:30])}}],
+                       'usage': {'prompt_tokens': len(words), 'completion_tokens': 30, 'total_tokens': len(words) + 30}}
+            return 200, {'Content-Type': 'application/json'}, json.dumps(payload).encode()
+        return 404, {'Content-Type': 'text/plain'}, b'not found'
+
+    def start(self):
+        self.site_urls = [None] * self.sites
+        for site in range(self.sites):
+            server, url = _serve(self._site_handler(site))
+            self.servers.append(server)
+            self.site_urls[site] = url
+        server, url = _serve(self._services_handler)
+        self.servers.append(server)
+        self.serpapi_base = url
+        self.openai_base = url + '/v1'
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,121 @@
+"""
+Tiered retention for article bodies. Articles older than RETENTION_DAYS move their
+extracted text out of SQLite into gzip-compressed JSONL segments in an archive/
+directory next to the database;
+title, summary and the rest of the row stay in the database, and the freed pages are
+handed back with an incremental vacuum. The hot database then stays small enough to
+live in the page cache as ingest volume grows.
+"""
+import os
+import gzip
+import json
+import time
+import logging
+import datetime
+from typing import Dict, List
+
+from db import storage
+from utils.logger import log_event, span
+
+RETENTION_DAYS = 30
+# Articles per segment file
+SEGMENT_SIZE = 1000
+
+def archive_dir_for(db_path=None):
+    # Segments live next to the database they were archived from
+    return os.path.join(os.path.dirname(os.path.abspath(db_path or storage.DB_PATH)), 'archive')
+
+def _cutoff(retention_days, now=None):
+    # published_at is stored as 'YYYY-MM-DDTHH:MM:SSZ', so ISO strings compare in time order
+    moment = datetime.datetime.fromtimestamp((now or time.time()) - retention_days * 86400, datetime.timezone.utc)
+    return moment.replace(microsecond=0, tzinfo=None).isoformat() + 'Z'
+
+def _write_segment(path, rows):
+    tmp_path = f'{path}.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps({'id': row['id'], 'url': row['url'], 'title': row['title'],
+                                'published_at': row['published_at'], 'raw_text': row['raw_text']}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    # The rows are only cleared once the segment is safely on disk
+    os.replace(tmp_path, path)
+
+@span('db.archive')
+def archive_articles(retention_days=RETENTION_DAYS, db_path=None, archive_dir=None, segment_size=SEGMENT_SIZE,
+                     now=None) -> int:
+    """
+    Move the text of articles published more than `retention_days` ago to archive
+    segments, SEGMENT_SIZE articles per file, and clear it from the database.
+    Returns the number of articles archived.
+    """
+    archive_dir = archive_dir or archive_dir_for(db_path)
+    conn = storage.get_connection(db_path)
+    cutoff = _cutoff(retention_days, now)
+    archived = 0
+    while True:
+        rows = conn.execute('''
+            SELECT id, url, title, published_at, unpack_text(raw_text) AS raw_text FROM articles
+            WHERE published_at < ? AND raw_text IS NOT NULL
+            ORDER BY published_at, id
+            LIMIT ?
+        ''', (cutoff, segment_size)).fetchall()
+        if not rows:
+            break
+        os.makedirs(archive_dir, exist_ok=True)
+        name = f"articles-{time.strftime('%Y%m%d-%H%M%S', time.gmtime(now))}-{rows[0]['id']}.jsonl.gz"
+        _write_segment(os.path.join(archive_dir, name), rows)
+        with conn:
+            conn.executemany('UPDATE articles SET raw_text = NULL, archived_in = ? WHERE id = ?',
+                             [(name, row['id']) for row in rows])
+        archived += len(rows)
+    if archived:
+        log_event(f"Archived the text of {archived} articles published before {cutoff}")
+    return archived
+
+def archived_text(article_ids: List[int], db_path=None, archive_dir=None) -> Dict[int, str]:
+    """
+    The archived text of the given articles, keyed by id. Reads each segment involved once.
+    """
+    ids = list(dict.fromkeys(article_ids))
+    if not ids:
+        return {}
+    conn = storage.get_connection(db_path)
+    wanted = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        rows = conn.execute(f"SELECT id, archived_in FROM articles WHERE archived_in IS NOT NULL "
+                            f"AND id IN ({','.join('?' * len(chunk))})", chunk)
+        for row in rows:
+            wanted.setdefault(row['archived_in'], set()).add(row['id'])
+    found = {}
+    for name, segment_ids in wanted.items():
+        try:
+            with gzip.open(os.path.join(archive_dir or archive_dir_for(db_path), name), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record['id'] in segment_ids:
+                        found[record['id']] = record['raw_text']
+        except FileNotFoundError:
+            log_event(f"Archive segment {name} is missing", logging.WARNING)
+    return found
+
+def remove_segments(db_path=None, archive_dir=None) -> int:
+    # For "Reset Feed": once the articles are gone their archived text is too
+    archive_dir = archive_dir or archive_dir_for(db_path)
+    if not os.path.isdir(archive_dir):
+        return 0
+    names = [n for n in os.listdir(archive_dir) if n.endswith('.jsonl.gz')]
+    for name in names:
+        os.remove(os.path.join(archive_dir, name))
+    return len(names)
+
+def compact(retention_days=RETENTION_DAYS, db_path=None, archive_dir=None, now=None) -> Dict[str, int]:
+    """
+    One maintenance pass: archive old article text, compress a batch of text stored
+    before compression was introduced, and reclaim free pages.
+    """
+    archived = archive_articles(retention_days, db_path, archive_dir, now=now) if retention_days else 0
+    uncompressed = storage.compress_stored_text(db_path=db_path)
+    freed = storage.reclaim_space(db_path=db_path)
+    return {'archived': archived, 'uncompressed': uncompressed, 'pages_freed': freed}
@@ -2,10 +2,15 @@ import sqlite3
 import os
 
 SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'schema.sql')
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), 'clearfeed.db')
 
-def init_db(db_path):
-    conn = sqlite3.connect(db_path)
+def apply_schema(conn):
+    # Every statement is CREATE ... IF NOT EXISTS, so this is safe on existing databases
     with open(SCHEMA_PATH, 'r') as f:
         conn.executescript(f.read())
+
+def init_db(db_path):
+    conn = sqlite3.connect(db_path)
+    apply_schema(conn)
     conn.commit()
     conn.close()
@@ -1,3 +1,5 @@
+-- Tables only. Indexes and changes to existing tables are migrations in db/storage.py.
+
 -- Users table
 CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -37,3 +39,117 @@ CREATE TABLE IF NOT EXISTS articles (
     tags TEXT,
     FOREIGN KEY(source_id) REFERENCES sources(id)
 );
+
+-- Feeds as last read: conditional GET validators and the entries seen, to report new ones
+CREATE TABLE IF NOT EXISTS feed_cache (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    modified TEXT,
+    entries TEXT,
+    fetched_at REAL
+);
+
+-- Summary cache (content-addressed by input text, prompt and model)
+CREATE TABLE IF NOT EXISTS summary_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    summary TEXT,
+    created_at REAL,
+    last_used_at REAL,
+    hits INTEGER DEFAULT 0
+);
+
+-- Extracted article text and top image by URL (zlib-compressed JSON), so pages are downloaded and parsed once
+CREATE TABLE IF NOT EXISTS extraction_cache (
+    url TEXT PRIMARY KEY,
+    data BLOB,
+    fetched_at REAL
+);
+
+-- Summaries translated on demand, one row per article and language
+CREATE TABLE IF NOT EXISTS article_translations (
+    article_id INTEGER,
+    language TEXT,
+    summary TEXT,
+    created_at REAL,
+    PRIMARY KEY (article_id, language)
+);
+
+-- What fetching each source (by feed or page URL) has been like, as moving averages,
+-- and the circuit breaker that skips it while it keeps failing
+CREATE TABLE IF NOT EXISTS source_health (
+    url TEXT PRIMARY KEY,
+    polls INTEGER DEFAULT 0,
+    failures INTEGER DEFAULT 0,
+    timeouts INTEGER DEFAULT 0,
+    consecutive_failures INTEGER DEFAULT 0,
+    error_rate REAL,
+    timeout_rate REAL,
+    latency REAL,
+    entries REAL,
+    articles INTEGER DEFAULT 0,
+    extracted INTEGER DEFAULT 0,
+    extract_rate REAL,
+    article_latency REAL,
+    open_until REAL,
+    updated_at REAL
+);
+
+-- Article thumbnails: files named by the SHA-256 of their bytes, and which image URL produced which file.
+-- A NULL digest records a failed download so it is not retried on every poll
+CREATE TABLE IF NOT EXISTS thumbnails (
+    digest TEXT PRIMARY KEY,
+    size INTEGER,
+    last_used_at REAL
+);
+CREATE TABLE IF NOT EXISTS thumbnail_urls (
+    image_url TEXT PRIMARY KEY,
+    digest TEXT,
+    fetched_at REAL
+);
+
+-- Hit/miss counters for the caches
+CREATE TABLE IF NOT EXISTS cache_stats (
+    name TEXT PRIMARY KEY,
+    hits INTEGER DEFAULT 0,
+    misses INTEGER DEFAULT 0
+);
+
+-- Scouting cache: SerpAPI results ('search') and discovered feeds ('feeds'), including failures
+CREATE TABLE IF NOT EXISTS scout_cache (
+    kind TEXT,
+    key TEXT,
+    value TEXT,
+    ok INTEGER,
+    expires_at REAL,
+    PRIMARY KEY (kind, key)
+);
+
+-- Key/value bookkeeping for the storage layer (backfill progress, counters)
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+
+-- Polling schedule for the ingest daemon (one row per source)
+CREATE TABLE IF NOT EXISTS source_schedule (
+    source_id INTEGER PRIMARY KEY,
+    interval REAL,
+    next_poll_at REAL,
+    last_polled_at REAL,
+    last_new_count INTEGER DEFAULT 0,
+    FOREIGN KEY(source_id) REFERENCES sources(id)
+);
+
+-- MinHash signatures for near-duplicate detection, and their LSH band buckets
+CREATE TABLE IF NOT EXISTS article_fingerprints (
+    article_id INTEGER PRIMARY KEY,
+    signature BLOB,
+    FOREIGN KEY(article_id) REFERENCES articles(id)
+);
+CREATE TABLE IF NOT EXISTS article_lsh (
+    band INTEGER,
+    bucket INTEGER,
+    article_id INTEGER,
+    FOREIGN KEY(article_id) REFERENCES articles(id)
+);
@@ -0,0 +1,752 @@
+"""
+Data access for Clearfeed: reused connections, schema migrations and bulk writes.
+"""
+import time
+import zlib
+import logging
+import sqlite3
+import datetime
+import threading
+from typing import List, Dict
+
+from db import schema
+from utils import minhash, extractive
+from utils.logger import log_event, span
+
+DB_PATH = schema.DEFAULT_DB_PATH
+# Article text at least this long is stored zlib-compressed (a BLOB); shorter text stays TEXT
+COMPRESS_MIN_CHARS = 256
+COMPRESSION_LEVEL = 6
+# Free pages handed back to the filesystem per reclaim_space() call (4 KiB each by default)
+VACUUM_PAGES = 5000
+# What summarizers store when a summary could not be made
+FAILED_SUMMARY = '[Summary unavailable'
+
+_local = threading.local()
+_migrate_lock = threading.Lock()
+_migrated = set()
+
+def pack_text(text):
+    """
+    How article text is stored: zlib-compressed bytes, or the text itself when it is
+    too short for compression to pay off.
+    """
+    if not text or len(text) < COMPRESS_MIN_CHARS:
+        return text
+    return zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL)
+
+def unpack_text(value):
+    # Also registered as an SQL function, so queries and triggers see plain text
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+def _migration_1(conn):
+    # Collapse duplicate article URLs (keep the newest row) so the unique index can be built
+    conn.execute('''
+        DELETE FROM articles
+        WHERE url IS NOT NULL AND id NOT IN (SELECT MAX(id) FROM articles WHERE url IS NOT NULL GROUP BY url)
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_articles_url ON articles(url)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_articles_published_at ON articles(published_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_articles_source_id ON articles(source_id)')
+
+def _migration_2(conn):
+    # Feed pages walk (published_at, id) backwards and filter on source_id without touching the table
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_articles_feed ON articles(published_at, id, source_id)')
+    conn.execute('DROP INDEX IF EXISTS idx_articles_published_at')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sources_category ON sources(category)')
+
+# An article row is in the search index if it was written after the FTS migration
+# (id > fts_backfill_end) or the backfill has reached it (id <= fts_backfill_upto).
+FTS_INDEXED = '''
+    ({row}.id > (SELECT value FROM meta WHERE key = 'fts_backfill_end')
+     OR {row}.id <= (SELECT value FROM meta WHERE key = 'fts_backfill_upto'))
+'''
+
+def _migration_3(conn):
+    # Full-text search over title, summary and raw_text, kept in sync by triggers.
+    # Rows that already exist are indexed later by backfill_search_index().
+    end = conn.execute('SELECT COALESCE(MAX(id), 0) FROM articles').fetchone()[0]
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fts_backfill_end', ?)", (end,))
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fts_backfill_upto', 0)")
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+            title, summary, raw_text, content='articles', content_rowid='id', tokenize='porter unicode61'
+        )''')
+    # Title matches weigh most; lets queries use FTS5's optimised ORDER BY rank
+    conn.execute("INSERT INTO articles_fts (articles_fts, rank) VALUES ('rank', 'bm25(10.0, 4.0, 1.0)')")
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS articles_fts_ai AFTER INSERT ON articles BEGIN
+            INSERT INTO articles_fts (rowid, title, summary, raw_text) VALUES (new.id, new.title, new.summary, new.raw_text);
+        END''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS articles_fts_ad AFTER DELETE ON articles WHEN {FTS_INDEXED.format(row='old')} BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, summary, raw_text) VALUES ('delete', old.id, old.title, old.summary, old.raw_text);
+        END''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS articles_fts_au AFTER UPDATE ON articles WHEN {FTS_INDEXED.format(row='old')} BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, summary, raw_text) VALUES ('delete', old.id, old.title, old.summary, old.raw_text);
+            INSERT INTO articles_fts (rowid, title, summary, raw_text) VALUES (new.id, new.title, new.summary, new.raw_text);
+        END''')
+
+def _migration_4(conn):
+    # Story clusters: near-duplicate articles point at their representative (cluster_id = its id)
+    conn.execute('ALTER TABLE articles ADD COLUMN cluster_id INTEGER')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_articles_cluster ON articles(cluster_id)')
+    conn.execute('DROP INDEX IF EXISTS idx_articles_feed')
+    conn.execute('CREATE INDEX idx_articles_feed ON articles(published_at, id, source_id, cluster_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_article_lsh_bucket ON article_lsh(band, bucket)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_article_lsh_article ON article_lsh(article_id)')
+    # Assigning clusters must not re-index the article text
+    conn.execute('DROP TRIGGER IF EXISTS articles_fts_au')
+    conn.execute(f'''
+        CREATE TRIGGER articles_fts_au AFTER UPDATE OF title, summary, raw_text ON articles WHEN {FTS_INDEXED.format(row='old')} BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, summary, raw_text) VALUES ('delete', old.id, old.title, old.summary, old.raw_text);
+            INSERT INTO articles_fts (rowid, title, summary, raw_text) VALUES (new.id, new.title, new.summary, new.raw_text);
+        END''')
+
+def _migration_5(conn):
+    # Hybrid sources (a general feed filtered down to one topic) keep their topic once saved
+    conn.execute('ALTER TABLE sources ADD COLUMN filter_topic TEXT')
+
+def _migration_6(conn):
+    # Translations follow their article's summary
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS article_translations_au AFTER UPDATE OF summary ON articles
+        WHEN old.summary IS NOT new.summary BEGIN
+            DELETE FROM article_translations WHERE article_id = old.id;
+        END''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS article_translations_ad AFTER DELETE ON articles BEGIN
+            DELETE FROM article_translations WHERE article_id = old.id;
+        END''')
+
+def _migration_7(conn):
+    # raw_text is stored compressed (pack_text), and NULL once archived to the segment named
+    # in archived_in. The search index reads plain text through a view, so it is rebuilt
+    # and existing rows are indexed again by backfill_search_index().
+    conn.execute('ALTER TABLE articles ADD COLUMN archived_in TEXT')
+    for trigger in ('articles_fts_ai', 'articles_fts_ad', 'articles_fts_au'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    conn.execute('DROP TABLE IF EXISTS articles_fts')
+    conn.execute('''
+        CREATE VIEW IF NOT EXISTS articles_text AS
+        SELECT id, title, summary, unpack_text(raw_text) AS raw_text FROM articles''')
+    end = conn.execute('SELECT COALESCE(MAX(id), 0) FROM articles').fetchone()[0]
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fts_backfill_end', ?)", (end,))
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fts_backfill_upto', 0)")
+    conn.execute('''
+        CREATE VIRTUAL TABLE articles_fts USING fts5(
+            title, summary, raw_text, content='articles_text', content_rowid='id', tokenize='porter unicode61'
+        )''')
+    conn.execute("INSERT INTO articles_fts (articles_fts, rank) VALUES ('rank', 'bm25(10.0, 4.0, 1.0)')")
+    conn.execute('''
+        CREATE TRIGGER articles_fts_ai AFTER INSERT ON articles BEGIN
+            INSERT INTO articles_fts (rowid, title, summary, raw_text) VALUES (new.id, new.title, new.summary, unpack_text(new.raw_text));
+        END''')
+    conn.execute(f'''
+        CREATE TRIGGER articles_fts_ad AFTER DELETE ON articles WHEN {FTS_INDEXED.format(row='old')} BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, summary, raw_text) VALUES ('delete', old.id, old.title, old.summary, unpack_text(old.raw_text));
+        END''')
+    # Compressing stored text changes raw_text but not what is indexed
+    conn.execute(f'''
+        CREATE TRIGGER articles_fts_au AFTER UPDATE OF title, summary, raw_text ON articles
+        WHEN {FTS_INDEXED.format(row='old')} AND (old.title IS NOT new.title OR old.summary IS NOT new.summary
+                                                 OR unpack_text(old.raw_text) IS NOT unpack_text(new.raw_text)) BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, summary, raw_text) VALUES ('delete', old.id, old.title, old.summary, unpack_text(old.raw_text));
+            INSERT INTO articles_fts (rowid, title, summary, raw_text) VALUES (new.id, new.title, new.summary, unpack_text(new.raw_text));
+        END''')
+
+def _migration_8(conn):
+    # How each summary was made: 'llm', or 'local' (extractive) until it is upgraded
+    conn.execute('ALTER TABLE articles ADD COLUMN summary_tier TEXT')
+    conn.execute(f"UPDATE articles SET summary_tier = 'llm' WHERE summary IS NOT NULL AND summary NOT LIKE '{FAILED_SUMMARY}%'")
+    # Error messages stored as summaries by older versions become local summaries, which
+    # are upgraded like any other; without text to summarize they are cleared
+    failed = conn.execute(f"SELECT id, raw_text FROM articles WHERE summary LIKE '{FAILED_SUMMARY}%'").fetchall()
+    conn.executemany("UPDATE articles SET summary = ?, summary_tier = 'local' WHERE id = ?",
+                     [(extractive.summarize(unpack_text(text)) or None, article_id) for article_id, text in failed])
+
+def _migration_9(conn):
+    # Fingerprints go with their article, so near-duplicate lookups only find stored stories
+    conn.execute('DELETE FROM article_fingerprints WHERE article_id NOT IN (SELECT id FROM articles)')
+    conn.execute('DELETE FROM article_lsh WHERE article_id NOT IN (SELECT id FROM articles)')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS article_fingerprints_ad AFTER DELETE ON articles BEGIN
+            DELETE FROM article_fingerprints WHERE article_id = old.id;
+            DELETE FROM article_lsh WHERE article_id = old.id;
+        END''')
+
+def _migration_10(conn):
+    # Cache pruning keeps the most recently used (or fetched) rows and deletes the rest
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_summary_cache_last_used ON summary_cache(last_used_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_extraction_cache_fetched ON extraction_cache(fetched_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_thumbnails_last_used ON thumbnails(last_used_at)')
+
+# Applied in order on top of schema.sql; PRAGMA user_version records the last one applied
+MIGRATIONS = [
+    _migration_1,
+    _migration_2,
+    _migration_3,
+    _migration_4,
+    _migration_5,
+    _migration_6,
+    _migration_7,
+    _migration_8,
+    _migration_9,
+    _migration_10,
+]
+
+def migrate(conn):
+    """
+    Bring a database up to date: create missing tables from schema.sql, then run the
+    migrations newer than its user_version, each in its own transaction.
+    """
+    schema.apply_schema(conn)
+    for number, migration in enumerate(MIGRATIONS, start=1):
+        if number <= conn.execute('PRAGMA user_version').fetchone()[0]:
+            continue
+        # sqlite3 does not open a transaction before DDL, so take the write lock explicitly:
+        # a failed migration then rolls back whole, and another process migrating the same
+        # file waits here and finds the version already bumped
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if number > conn.execute('PRAGMA user_version').fetchone()[0]:
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+def get_connection(db_path=None):
+    """
+    Return this thread's connection to `db_path`, opening it on first use.
+    Connections are reused across calls; callers must not close them.
+    """
+    db_path = db_path or DB_PATH
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.create_function('unpack_text', 1, unpack_text, deterministic=True)
+        # Only takes effect on a new database; reclaim_space() converts older ones
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        with _migrate_lock:
+            if db_path not in _migrated:
+                try:
+                    migrate(conn)
+                except BaseException:
+                    conn.close()
+                    raise
+                _migrated.add(db_path)
+        conns[db_path] = conn
+    return conn
+
+def close_connections():
+    for conn in getattr(_local, 'conns', {}).values():
+        conn.close()
+    _local.conns = {}
+
+def normalize_timestamp(ts):
+    if not ts:
+        return datetime.datetime.utcnow().replace(microsecond=0).isoformat() + 'Z'
+    try:
+        # Try parsing common formats
+        dt = None
+        for fmt in ("%a, %d %b %Y %H:%M:%S %Z", "%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):  # RSS, ISO, fallback
+            try:
+                dt = datetime.datetime.strptime(ts, fmt)
+                break
+            except Exception:
+                continue
+        if dt is None:
+            # Try fromisoformat (Python 3.7+)
+            try:
+                dt = datetime.datetime.fromisoformat(ts.replace('Z', '+00:00'))
+            except Exception:
+                pass
+        if dt is None:
+            return datetime.datetime.utcnow().replace(microsecond=0).isoformat() + 'Z'
+        return dt.replace(microsecond=0, tzinfo=datetime.timezone.utc).isoformat().replace('+00:00', 'Z')
+    except Exception:
+        return datetime.datetime.utcnow().replace(microsecond=0).isoformat() + 'Z'
+
+def _bump_generation(conn):
+    # Inside the caller's transaction: anything that changes what the feed shows or how it ranks
+    conn.execute("INSERT INTO meta (key, value) VALUES ('generation', 1) ON CONFLICT(key) DO UPDATE SET value = value + 1")
+
+def data_generation(db_path=None) -> int:
+    """
+    Counter bumped by every write to articles or sources, for caches of derived data
+    (e.g. the feed ranking) to key on.
+    """
+    row = get_connection(db_path).execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+    return row[0] if row else 0
+
+# --- Sources ---
+
+def list_sources(db_path=None) -> List[Dict]:
+    conn = get_connection(db_path)
+    rows = conn.execute('SELECT id, name, url, category, trust_score, filter_topic FROM sources ORDER BY name').fetchall()
+    return [dict(row) for row in rows]
+
+def save_sources(sources: List[Dict], user_added=True, db_path=None) -> int:
+    """
+    Insert new sources in one transaction; sources whose URL is already stored are skipped.
+    Returns the number of sources added.
+    """
+    conn = get_connection(db_path)
+    before = conn.total_changes
+    with conn:
+        conn.executemany('INSERT OR IGNORE INTO sources (name, url, category, trust_score, user_added, filter_topic) VALUES (?, ?, ?, ?, ?, ?)',
+                         [(s['name'], s['url'], s['category'], s['trust_score'], int(user_added), s.get('filter_topic'))
+                          for s in sources])
+        added = conn.total_changes - before
+        if added:
+            _bump_generation(conn)
+    return added
+
+def delete_source(source_id, db_path=None):
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute('DELETE FROM sources WHERE id = ?', (source_id,))
+        _bump_generation(conn)
+
+HEALTH_FIELDS = ('url', 'polls', 'failures', 'timeouts', 'consecutive_failures', 'error_rate', 'timeout_rate', 'latency',
+                 'entries', 'articles', 'extracted', 'extract_rate', 'article_latency', 'open_until', 'updated_at')
+
+def get_source_health(urls, db_path=None) -> Dict[str, Dict]:
+    """
+    source_health rows for `urls`, looked up in bulk and keyed by URL.
+    """
+    conn = get_connection(db_path)
+    urls = list(dict.fromkeys(u for u in urls if u))
+    found = {}
+    for i in range(0, len(urls), 500):
+        chunk = urls[i:i + 500]
+        for row in conn.execute(f"SELECT * FROM source_health WHERE url IN ({','.join('?' * len(chunk))})", chunk):
+            found[row['url']] = dict(row)
+    return found
+
+def save_source_health(rows: List[Dict], trust_scores: Dict[str, float] = None, db_path=None):
+    """
+    Replace the health rows of their sources, and set the computed trust_score of the
+    stored sources in `trust_scores` (URL -> score), in one transaction.
+    """
+    conn = get_connection(db_path)
+    with conn:
+        conn.executemany(f"INSERT OR REPLACE INTO source_health ({', '.join(HEALTH_FIELDS)}) "
+                         f"VALUES ({', '.join(':' + f for f in HEALTH_FIELDS)})", rows)
+        conn.executemany('UPDATE sources SET trust_score = ? WHERE url = ?',
+                         [(score, url) for url, score in (trust_scores or {}).items()])
+        _bump_generation(conn)
+
+# --- Articles ---
+
+ARTICLE_UPSERT = '''
+    INSERT INTO articles (source_id, title, url, image_url, published_at, raw_text, summary, summary_tier, language, tags)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET
+        source_id = excluded.source_id,
+        title = excluded.title,
+        image_url = excluded.image_url,
+        raw_text = excluded.raw_text,
+        -- New text replaces an archived copy; without any, the archived copy still counts
+        archived_in = CASE WHEN excluded.raw_text IS NULL THEN archived_in END,
+        summary = excluded.summary,
+        summary_tier = excluded.summary_tier,
+        language = excluded.language,
+        tags = excluded.tags
+'''
+
+@span('db.write')
+def save_articles(articles: List[Dict], db_path=None) -> int:
+    """
+    Upsert fetched articles (dicts with 'source_name', a 'summary' and its 'summary_tier') in a single
+    transaction, deduplicated on URL. The original published_at of a stored article
+    is kept, and raw_text is stored compressed. Articles whose source is not in the
+    database are skipped.
+    Returns the number of articles written.
+    """
+    if not articles:
+        return 0
+    conn = get_connection(db_path)
+    source_ids = {}
+    for row in conn.execute('SELECT id, name FROM sources ORDER BY id'):
+        source_ids.setdefault(row['name'], row['id'])
+    rows = []
+    for art in articles:
+        source_id = source_ids.get(art.get('source_name'))
+        if not source_id:
+            log_event(f"Source not found for article: {art.get('title')} (source: {art.get('source_name')})", logging.WARNING)
+            continue
+        tags = art.get('tags') or []
+        rows.append((source_id, art['title'], art['url'], art.get('image_url') or '', normalize_timestamp(art.get('published')),
+                     pack_text(art.get('raw_text')), art.get('summary'), art.get('summary_tier'), art.get('language', 'en'),
+                     tags if isinstance(tags, str) else ','.join(tags)))
+    with conn:
+        conn.executemany(ARTICLE_UPSERT, rows)
+        _save_clusters(conn, [art for art in articles if source_ids.get(art.get('source_name'))])
+        _bump_generation(conn)
+    return len(rows)
+
+def known_articles(urls, db_path=None) -> Dict[str, sqlite3.Row]:
+    """
+    Stored articles among `urls`, looked up in bulk and keyed by URL.
+    """
+    conn = get_connection(db_path)
+    urls = list(dict.fromkeys(u for u in urls if u))
+    known = {}
+    for i in range(0, len(urls), 500):
+        chunk = urls[i:i + 500]
+        for row in conn.execute(f"SELECT url, title, image_url, unpack_text(raw_text) AS raw_text, summary, summary_tier "
+                                f"FROM articles WHERE url IN ({','.join('?' * len(chunk))})", chunk):
+            known[row['url']] = row
+    return known
+
+def _save_clusters(conn, articles):
+    # Signatures and story clusters for articles that went through the deduplicator
+    # ('minhash' and 'cluster_url', the URL of the story's representative article)
+    clustered = [art for art in articles if art.get('cluster_url')]
+    if not clustered:
+        return
+    urls = list({u for art in clustered for u in (art['url'], art['cluster_url'])})
+    ids = {}
+    for i in range(0, len(urls), 500):
+        chunk = urls[i:i + 500]
+        for row in conn.execute(f"SELECT id, url FROM articles WHERE url IN ({','.join('?' * len(chunk))})", chunk):
+            ids[row['url']] = row['id']
+    updates = []
+    signatures = []
+    buckets = []
+    for art in clustered:
+        article_id = ids.get(art['url'])
+        if article_id is None:
+            continue
+        updates.append((ids.get(art['cluster_url'], article_id), article_id))
+        if art.get('minhash'):
+            signatures.append((article_id, minhash.pack(art['minhash'])))
+            buckets.extend((band, bucket, article_id) for band, bucket in minhash.band_buckets(art['minhash']))
+    conn.executemany('UPDATE articles SET cluster_id = ? WHERE id = ?', updates)
+    conn.executemany('DELETE FROM article_lsh WHERE article_id = ?', [(s[0],) for s in signatures])
+    conn.executemany('INSERT OR REPLACE INTO article_fingerprints (article_id, signature) VALUES (?, ?)', signatures)
+    conn.executemany('INSERT INTO article_lsh (band, bucket, article_id) VALUES (?, ?, ?)', buckets)
+
+def find_near_duplicate(signature, threshold=minhash.THRESHOLD, db_path=None):
+    """
+    The stored article most similar to `signature` (estimated Jaccard >= `threshold`),
+    found through the LSH bucket index. Returns a row with the story representative's
+    id, url, summary and summary_tier, or None.
+    """
+    conn = get_connection(db_path)
+    buckets = minhash.band_buckets(signature)
+    candidates = conn.execute(f'''
+        SELECT f.article_id, f.signature FROM article_fingerprints f JOIN articles a ON a.id = f.article_id
+        WHERE f.article_id IN (
+            SELECT article_id FROM article_lsh WHERE (band, bucket) IN (VALUES {','.join(['(?, ?)'] * len(buckets))})
+        )
+    ''', [v for pair in buckets for v in pair]).fetchall()
+    best = None
+    for row in candidates:
+        score = minhash.similarity(signature, minhash.unpack(row['signature']))
+        if score >= threshold and (best is None or score > best[0]):
+            best = (score, row['article_id'])
+    if best is None:
+        return None
+    return conn.execute('''
+        SELECT rep.id, rep.url, rep.summary, rep.summary_tier
+        -- An article whose representative is gone stands for the story itself
+        FROM articles a JOIN articles rep ON rep.id = COALESCE((SELECT id FROM articles WHERE id = a.cluster_id), a.id)
+        WHERE a.id = ?
+    ''', (best[1],)).fetchone()
+
+def cluster_members(cluster_ids, db_path=None):
+    """
+    Other articles in each story cluster: {cluster_id: [rows with source_name, title, url]}.
+    """
+    if not cluster_ids:
+        return {}
+    conn = get_connection(db_path)
+    rows = conn.execute(f'''
+        SELECT a.cluster_id, a.title, a.url, s.name as source_name
+        FROM articles a JOIN sources s ON a.source_id = s.id
+        WHERE a.cluster_id IN ({','.join('?' * len(cluster_ids))}) AND a.id != a.cluster_id
+        ORDER BY a.published_at
+    ''', list(cluster_ids)).fetchall()
+    members = {}
+    for row in rows:
+        members.setdefault(row['cluster_id'], []).append(row)
+    return members
+
+def local_summaries(article_ids, db_path=None) -> List[sqlite3.Row]:
+    """
+    Those of `article_ids` whose summary is a local extractive one, with the text to
+    summarize again, their source's trust score and published_at.
+    """
+    conn = get_connection(db_path)
+    ids = list(dict.fromkeys(article_ids))
+    found = []
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        found.extend(conn.execute(f'''
+            SELECT a.id, unpack_text(a.raw_text) AS raw_text, a.published_at AS published, s.trust_score
+            FROM articles a LEFT JOIN sources s ON a.source_id = s.id
+            WHERE a.summary_tier = 'local' AND a.raw_text IS NOT NULL AND a.id IN ({','.join('?' * len(chunk))})
+        ''', chunk))
+    return found
+
+def save_summaries(summaries: Dict[int, str], tier, db_path=None):
+    """
+    Replace the summaries of stored articles (and of the copies of their stories).
+    """
+    if not summaries:
+        return
+    conn = get_connection(db_path)
+    rows = [(summary, tier, article_id, article_id) for article_id, summary in summaries.items()]
+    with conn:
+        conn.executemany('UPDATE articles SET summary = ?, summary_tier = ? WHERE id = ? OR cluster_id = ?', rows)
+        _bump_generation(conn)
+
+def delete_all_articles(db_path=None):
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute('DELETE FROM articles')
+        _bump_generation(conn)
+
+def get_translations(article_ids, language, db_path=None) -> Dict[int, str]:
+    conn = get_connection(db_path)
+    ids = list(article_ids)
+    translations = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        rows = conn.execute(f"SELECT article_id, summary FROM article_translations WHERE language = ? AND article_id IN ({','.join('?' * len(chunk))})",
+                            [language, *chunk])
+        translations.update((row['article_id'], row['summary']) for row in rows)
+    return translations
+
+def save_translations(translations: Dict[int, str], language, db_path=None):
+    conn = get_connection(db_path)
+    now = time.time()
+    with conn:
+        conn.executemany('INSERT OR REPLACE INTO article_translations (article_id, language, summary, created_at) VALUES (?, ?, ?, ?)',
+                         [(article_id, language, summary, now) for article_id, summary in translations.items()])
+
+def _feed_filters(source_ids=None, categories=None, date_from=None, date_to=None):
+    # WHERE clauses and parameters shared by the chronological and the ranked feed
+    where = []
+    params = []
+    if not source_ids:
+        # One card per story; with a source filter every matching article is shown
+        where.append('(a.cluster_id IS NULL OR a.cluster_id = a.id)')
+    if source_ids:
+        where.append(f"a.source_id IN ({','.join('?' * len(source_ids))})")
+        params.extend(source_ids)
+    if categories:
+        where.append(f"a.source_id IN (SELECT id FROM sources WHERE category IN ({','.join('?' * len(categories))}))")
+        params.extend(categories)
+    if date_from:
+        where.append('a.published_at >= ?')
+        params.append(date_from)
+    if date_to:
+        where.append('a.published_at < ?')
+        params.append(date_to)
+    return where, params
+
+FEED_COLUMNS = ('a.id, a.title, a.url, a.image_url, a.summary, a.summary_tier, a.published_at, a.cluster_id, '
+                's.name as source_name')
+
+def feed_page(cursor=None, limit=20, source_ids=None, categories=None, date_from=None, date_to=None, db_path=None):
+    """
+    One page of the news feed, newest first, using keyset pagination on (published_at, id).
+    `cursor` is the (published_at, id) of the last row of the previous page. Filters
+    on source, source category and published_at range (ISO strings, `date_to`
+    exclusive) are applied in SQL. Near-duplicate stories are collapsed to their
+    representative unless filtering by source.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    where, params = _feed_filters(source_ids, categories, date_from, date_to)
+    if cursor:
+        where.append('(a.published_at, a.id) < (?, ?)')
+        params.extend(cursor)
+    sql = f'''
+        SELECT {FEED_COLUMNS}
+        FROM articles a
+        JOIN sources s ON a.source_id = s.id
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY a.published_at DESC, a.id DESC
+        LIMIT ?
+    '''
+    conn = get_connection(db_path)
+    rows = conn.execute(sql, params + [limit + 1]).fetchall()
+    next_cursor = (rows[limit - 1]['published_at'], rows[limit - 1]['id']) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def ranking_candidates(window, source_ids=None, categories=None, date_from=None, date_to=None, db_path=None) -> List[tuple]:
+    """
+    The newest `window` feed articles matching the filters, as plain tuples of what the
+    ranker scores: (id, published_at in epoch seconds, source trust_score, story id,
+    source_id, source category, tags).
+    """
+    where, params = _feed_filters(source_ids, categories, date_from, date_to)
+    sql = f'''
+        SELECT a.id, CAST(strftime('%s', a.published_at) AS REAL), s.trust_score, COALESCE(a.cluster_id, a.id),
+               a.source_id, COALESCE(s.category, ''), COALESCE(a.tags, '')
+        FROM articles a
+        JOIN sources s ON a.source_id = s.id
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY a.published_at DESC, a.id DESC
+        LIMIT ?
+    '''
+    conn = get_connection(db_path)
+    # Tuples rather than Rows: the ranker only needs the columns, and they are faster to build
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor.execute(sql, params + [window]).fetchall()
+
+def feed_rows(article_ids, db_path=None) -> List[sqlite3.Row]:
+    """
+    Feed rows (the columns feed_page returns) for `article_ids`, in that order.
+    """
+    ids = list(article_ids)
+    if not ids:
+        return []
+    conn = get_connection(db_path)
+    rows = conn.execute(f'''
+        SELECT {FEED_COLUMNS}
+        FROM articles a
+        JOIN sources s ON a.source_id = s.id
+        WHERE a.id IN ({','.join('?' * len(ids))})
+    ''', ids).fetchall()
+    by_id = {row['id']: row for row in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+def source_categories(db_path=None) -> List[str]:
+    conn = get_connection(db_path)
+    return [row[0] for row in conn.execute('SELECT DISTINCT category FROM sources WHERE category IS NOT NULL ORDER BY category')]
+
+def compress_stored_text(batch_size=1000, db_path=None) -> int:
+    """
+    Compress the next batch of article texts stored before compression was introduced.
+    Returns the number still waiting (0 once every long text is compressed).
+    """
+    conn = get_connection(db_path)
+    waiting = "typeof(raw_text) = 'text' AND length(raw_text) >= ?"
+    rows = conn.execute(f'SELECT id, raw_text FROM articles WHERE {waiting} LIMIT ?',
+                        (COMPRESS_MIN_CHARS, batch_size)).fetchall()
+    with conn:
+        conn.executemany('UPDATE articles SET raw_text = ? WHERE id = ?', [(pack_text(row['raw_text']), row['id']) for row in rows])
+    return conn.execute(f'SELECT COUNT(*) FROM articles WHERE {waiting}', (COMPRESS_MIN_CHARS,)).fetchone()[0]
+
+def reclaim_space(max_pages=VACUUM_PAGES, db_path=None) -> int:
+    """
+    Return up to `max_pages` free pages to the filesystem with an incremental vacuum.
+    A database created before auto_vacuum was enabled is converted by one full VACUUM
+    first. Returns the number of pages freed.
+    """
+    conn = get_connection(db_path)
+    before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        log_event('Converting the database to incremental auto-vacuum (one full VACUUM)')
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+    else:
+        conn.execute(f'PRAGMA incremental_vacuum({int(max_pages)})').fetchall()
+    return before - conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+# --- Full-text search ---
+
+def backfill_search_index(batch_size=5000, db_path=None) -> int:
+    """
+    Index the next batch of articles that predate the search index.
+    Returns the number of articles still waiting (0 once the backfill is complete).
+    """
+    conn = get_connection(db_path)
+    end = conn.execute("SELECT value FROM meta WHERE key = 'fts_backfill_end'").fetchone()[0]
+    upto = conn.execute("SELECT value FROM meta WHERE key = 'fts_backfill_upto'").fetchone()[0]
+    if upto >= end:
+        return 0
+    with conn:
+        last = conn.execute('''
+            SELECT MAX(id) FROM (SELECT id FROM articles WHERE id > ? AND id <= ? ORDER BY id LIMIT ?)
+        ''', (upto, end, batch_size)).fetchone()[0] or end
+        conn.execute('''
+            INSERT INTO articles_fts (rowid, title, summary, raw_text)
+            SELECT id, title, summary, raw_text FROM articles_text WHERE id > ? AND id <= ?
+        ''', (upto, last))
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'fts_backfill_upto'", (last,))
+    return conn.execute('SELECT COUNT(*) FROM articles WHERE id > ? AND id <= ?', (last, end)).fetchone()[0]
+
+def _fts_query(text):
+    # Quote every term so user input can't inject FTS syntax. A trailing * on a term of
+    # three or more characters is kept as a prefix search; prefixes are never implied
+    # because expanding short prefixes is what makes FTS queries slow.
+    terms = []
+    for raw in text.split():
+        prefix = raw.endswith('*')
+        term = raw.replace('"', '').rstrip('*')
+        if term:
+            terms.append(f'"{term}"*' if prefix and len(term) >= 3 else f'"{term}"')
+    return ' '.join(terms) or None
+
+def search_articles(text, limit=20, db_path=None) -> List[sqlite3.Row]:
+    """
+    Ranked full-text search (bm25, title weighted highest) with a highlighted snippet.
+    """
+    query = _fts_query(text)
+    if not query:
+        return []
+    conn = get_connection(db_path)
+    return conn.execute('''
+        SELECT a.id, a.title, a.url, a.image_url, a.summary, a.published_at, s.name as source_name,
+               snippet(articles_fts, -1, '**', '**', '…', 16) AS snippet
+        FROM articles_fts
+        JOIN articles a ON a.id = articles_fts.rowid
+        JOIN sources s ON a.source_id = s.id
+        WHERE articles_fts MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    ''', (query, limit)).fetchall()
+
+# --- Ingest schedule ---
+
+def due_sources(now, default_interval, db_path=None) -> List[Dict]:
+    """
+    Sources whose next poll is due (sources never polled are always due), with their
+    current polling interval.
+    """
+    conn = get_connection(db_path)
+    rows = conn.execute('''
+        SELECT s.id, s.name, s.url, s.category, s.trust_score, s.filter_topic, COALESCE(sc.interval, ?) AS interval
+        FROM sources s
+        LEFT JOIN source_schedule sc ON sc.source_id = s.id
+        WHERE sc.next_poll_at IS NULL OR sc.next_poll_at <= ?
+        ORDER BY COALESCE(sc.next_poll_at, 0), s.id
+    ''', (default_interval, now)).fetchall()
+    return [dict(row) for row in rows]
+
+def next_poll_time(db_path=None):
+    conn = get_connection(db_path)
+    return conn.execute('SELECT MIN(next_poll_at) FROM source_schedule').fetchone()[0]
+
+def record_polls(polls: List[Dict], db_path=None):
+    """
+    Store the outcome of a polling round: dicts with source_id, interval, polled_at and new_count.
+    """
+    conn = get_connection(db_path)
+    with conn:
+        conn.executemany('''
+            INSERT INTO source_schedule (source_id, interval, next_poll_at, last_polled_at, last_new_count)
+            VALUES (:source_id, :interval, :polled_at + :interval, :polled_at, :new_count)
+            ON CONFLICT(source_id) DO UPDATE SET
+                interval = excluded.interval,
+                next_poll_at = excluded.next_poll_at,
+                last_polled_at = excluded.last_polled_at,
+                last_new_count = excluded.last_new_count
+        ''', polls)
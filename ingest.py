@@ -0,0 +1,154 @@
+"""
+Headless ingestion daemon for Clearfeed.
+
+Polls the sources stored in the database on a per-source schedule that adapts to how
+often each feed publishes, and runs fetch -> summarize -> store through the same
+pipeline as the app. The Streamlit UI then only has to read the database.
+
+    python ingest.py            # run until SIGINT/SIGTERM
+    python ingest.py --once     # poll the sources that are due, then exit (for cron)
+
+After every round, article text older than --retention-days is moved to the archive
+(db/archive.py) and free database pages are reclaimed.
+"""
+import os
+import sys
+import json
+import time
+import fcntl
+import signal
+import argparse
+import logging
+import threading
+from collections import Counter
+
+from agents.article_fetcher import MAX_PER_SOURCE
+from agents.pipeline import ingest_sources
+from db import storage, archive
+from utils.logger import log_event, record_error, write_metrics
+
+LOCK_PATH = os.path.join(os.path.dirname(__file__), 'db', 'ingest.lock')
+SELECTED_TOPICS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'selected_topics.json')
+MIN_INTERVAL = 5 * 60
+MAX_INTERVAL = 6 * 3600
+DEFAULT_INTERVAL = 30 * 60
+
+def acquire_lock(path=LOCK_PATH):
+    """
+    Take an exclusive, non-blocking lock so two daemons never ingest the same database.
+    Returns the open lock file (keep it open to hold the lock), or None if another
+    daemon holds it.
+    """
+    lock_file = open(path, 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
+def next_interval(interval, new_count, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+    """
+    Poll busy feeds more often and quiet feeds less often, aiming for a couple of new
+    entries per poll.
+    """
+    if new_count == 0:
+        interval *= 1.5
+    elif new_count > 2:
+        interval /= 2
+    return max(min_interval, min(max_interval, interval))
+
+def load_selected_topics(path=SELECTED_TOPICS_PATH):
+    # Topics picked on the Source Scout page; articles are tagged with the ones they mention
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+def run_once(db_path=None, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, now=None):
+    """
+    Ingest every source that is due and reschedule it. Returns the number of sources polled.
+    """
+    now = now or time.time()
+    due = storage.due_sources(now, DEFAULT_INTERVAL, db_path=db_path)
+    if not due:
+        return 0
+    log_event(f"Polling {len(due)} sources")
+    # Only entries that are new since the previous poll of each feed are fetched
+    articles = ingest_sources(due, max_articles=len(due) * MAX_PER_SOURCE, new_only=True, db_path=db_path,
+                              topics=load_selected_topics())
+    new_counts = Counter(art['source_name'] for art in articles)
+    polls = []
+    for src in due:
+        new_count = new_counts.get(src['name'], 0)
+        polls.append({'source_id': src['id'], 'polled_at': now, 'new_count': new_count,
+                      'interval': next_interval(src['interval'], new_count, min_interval, max_interval)})
+    storage.record_polls(polls, db_path=db_path)
+    storage.backfill_search_index(db_path=db_path)
+    log_event(f"Stored {len(articles)} new articles")
+    return len(due)
+
+def run(stop, db_path=None, once=False, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, metrics_path=None,
+        retention_days=archive.RETENTION_DAYS):
+    while not stop.is_set():
+        try:
+            run_once(db_path, min_interval, max_interval)
+        except Exception as e:
+            record_error('ingest', e)
+            log_event(f"Ingestion round failed: {e}", logging.ERROR, exc_info=True)
+        try:
+            compacted = archive.compact(retention_days, db_path=db_path)
+            if compacted['archived'] or compacted['pages_freed']:
+                log_event(f"Archived {compacted['archived']} articles, freed {compacted['pages_freed']} pages")
+        except Exception as e:
+            record_error('compact', e)
+            log_event(f"Compaction failed: {e}", logging.ERROR, exc_info=True)
+        if metrics_path:
+            try:
+                write_metrics(metrics_path)
+            except OSError as e:
+                log_event(f"Could not write metrics to {metrics_path}: {e}", logging.ERROR, exc_info=True)
+        if once:
+            return
+        wake_at = storage.next_poll_time(db_path=db_path) or time.time() + min_interval
+        stop.wait(max(1.0, min(wake_at - time.time(), max_interval)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Clearfeed background ingestion')
+    parser.add_argument('--once', action='store_true', help='poll due sources once and exit')
+    parser.add_argument('--db', default=storage.DB_PATH, help='path to clearfeed.db')
+    parser.add_argument('--min-interval', type=float, default=MIN_INTERVAL, help='shortest polling interval (seconds)')
+    parser.add_argument('--max-interval', type=float, default=MAX_INTERVAL, help='longest polling interval (seconds)')
+    parser.add_argument('--retention-days', type=float, default=archive.RETENTION_DAYS,
+                        help='archive the text of articles older than this (0 keeps it in the database)')
+    parser.add_argument('--metrics', help='write stage timings and counters here after every round '
+                                          '(Prometheus text format, or a JSON snapshot if the name ends in .json)')
+    args = parser.parse_args(argv)
+
+    lock = acquire_lock(os.path.join(os.path.dirname(os.path.abspath(args.db)), 'ingest.lock'))
+    if lock is None:
+        print('[INGEST] Another ingest process is already running; exiting.')
+        return 1
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print('[INGEST] Shutting down after the current round...')
+        stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    try:
+        run(stop, db_path=args.db, once=args.once, min_interval=args.min_interval, max_interval=args.max_interval,
+            metrics_path=args.metrics, retention_days=args.retention_days)
+    finally:
+        storage.close_connections()
+        lock.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,3 +5,47 @@ import os
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
+
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+
+@pytest.fixture
+def http_server():
+    """
+    Start a local HTTP server driven by a handler function.
+    Usage: base_url = http_server(handler) where handler(request) returns
+    (status, headers_dict, body_bytes) and `request` is the BaseHTTPRequestHandler.
+    """
+    servers = []
+
+    def start(handler):
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like real servers, so connection reuse can be observed
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self):
+                status, headers, body = handler(self)
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -4,6 +4,7 @@ import tempfile
 import pytest
 from agents.source_scout import scout_and_vet_sources
 from agents.article_fetcher import fetch_articles
+from db import storage
 
 DB_SCHEMA = os.path.join(os.path.dirname(__file__), '../db/schema.sql')
 
@@ -46,15 +47,16 @@ def test_scout_and_save_source():
     assert 'name' in sources[0]
     assert 'url' in sources[0]
 
-def test_fetch_articles_from_source():
-    # Uses a known RSS feed for testing
+def test_fetch_articles_from_source(monkeypatch, tmp_path):
+    # Uses a known RSS feed for testing; the caches and source health go to a scratch database
+    monkeypatch.setattr(storage, 'DB_PATH', str(tmp_path / 'fetch.db'))
     sources = [{
         'name': 'Reuters Technology',
         'url': 'http://feeds.reuters.com/reuters/technologyNews',
         'category': 'Technology',
         'trust_score': 7.0
     }]
-    articles = fetch_articles(sources, max_articles=2)
+    articles = fetch_articles(sources, max_articles=2, db_path=str(tmp_path / 'fetch.db'))
     assert isinstance(articles, list)
     assert len(articles) <= 2
     if articles:
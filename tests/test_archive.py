@@ -0,0 +1,69 @@
+import random
+import sqlite3
+from db import storage, archive
+
+def body(seed, words=400):
+    rng = random.Random(seed)
+    return ' '.join(''.join(rng.choice('abcdefghij') for _ in range(6)) for _ in range(words))
+
+def add_articles(path, articles):
+    storage.save_sources([{'name': 'Src', 'url': 'http://src.example/rss', 'category': 'Health', 'trust_score': 8.0}], db_path=path)
+    storage.save_articles([{'source_name': 'Src', 'summary': f"Summary of {a['title']}", **a} for a in articles], db_path=path)
+
+def test_text_is_compressed_transparently(tmp_path):
+    path = str(tmp_path / 'text.db')
+    text = 'Dengue cases rose sharply this season. ' * 50
+    add_articles(path, [{'title': 'Outbreak', 'url': 'http://src.example/1', 'raw_text': text}])
+    conn = storage.get_connection(path)
+    stored = conn.execute('SELECT raw_text FROM articles').fetchone()[0]
+    assert isinstance(stored, bytes) and len(stored) < len(text) / 5
+    assert storage.known_articles(['http://src.example/1'], db_path=path)['http://src.example/1']['raw_text'] == text
+    [row] = storage.search_articles('sharply', db_path=path)
+    assert '**sharply**' in row['snippet']
+    conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('integrity-check')")
+
+def test_old_text_moves_to_archive_and_pages_are_reclaimed(tmp_path):
+    path = str(tmp_path / 'archive.db')
+    old = [{'title': f'Old story {i}', 'url': f'http://src.example/old/{i}', 'raw_text': f'malaria {body(i)}',
+            'published': '2025-01-01T00:00:00Z'} for i in range(60)]
+    new = [{'title': 'New story', 'url': 'http://src.example/new', 'raw_text': f'malaria {body(99)}',
+            'published': '2025-03-01T00:00:00Z'}]
+    add_articles(path, old + new)
+    conn = storage.get_connection(path)
+    assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    now = 1740787200  # 2025-03-01
+    result = archive.compact(retention_days=30, db_path=path, archive_dir=str(tmp_path / 'segments'), now=now)
+    assert result['archived'] == 60 and result['pages_freed'] > 0
+
+    rows = conn.execute('SELECT url, raw_text, archived_in, summary FROM articles ORDER BY id').fetchall()
+    assert all(r['raw_text'] is None and r['archived_in'] and r['summary'] for r in rows[:60])
+    assert rows[60]['raw_text'] is not None and rows[60]['archived_in'] is None
+    ids = [r[0] for r in conn.execute('SELECT id FROM articles ORDER BY id LIMIT 2')]
+    assert archive.archived_text(ids, db_path=path, archive_dir=str(tmp_path / 'segments')) == {
+        ids[0]: old[0]['raw_text'], ids[1]: old[1]['raw_text']}
+    # Archived articles are still found by title and summary, no longer by their text
+    assert [r['title'] for r in storage.search_articles('malaria', db_path=path)] == ['New story']
+    assert [r['title'] for r in storage.search_articles('"Old story 3"', db_path=path)] == ['Old story 3']
+    conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('integrity-check')")
+    assert archive.compact(retention_days=30, db_path=path, archive_dir=str(tmp_path / 'segments'), now=now)['archived'] == 0
+
+def test_legacy_text_is_compressed_and_database_converted(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(open(storage.schema.SCHEMA_PATH).read())
+    conn.execute("INSERT INTO sources (name, url, category, trust_score) VALUES ('Src', 'http://src.example/rss', 'Health', 8.0)")
+    for i in range(5):
+        conn.execute('INSERT INTO articles (source_id, title, url, raw_text) VALUES (1, ?, ?, ?)',
+                     (f'Legacy {i}', f'http://src.example/{i}', body(i)))
+    conn.commit()
+    conn.close()
+
+    conn = storage.get_connection(path)
+    assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 0
+    assert storage.compress_stored_text(batch_size=3, db_path=path) == 2
+    assert storage.compress_stored_text(batch_size=3, db_path=path) == 0
+    assert {r[0] for r in conn.execute('SELECT typeof(raw_text) FROM articles')} == {'blob'}
+    storage.reclaim_space(db_path=path)
+    assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    assert storage.backfill_search_index(db_path=path) == 0
+    assert len(storage.search_articles(body(0).split()[0], db_path=path)) == 1
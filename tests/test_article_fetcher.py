@@ -0,0 +1,142 @@
+import threading
+import time
+from agents import article_fetcher
+from db import storage
+
+class FakeArticle:
+    active = {}
+    peak = {}
+    lock = threading.Lock()
+
+    def __init__(self, url, **kwargs):
+        self.url = url
+        self.title = f"Title for {url}"
+        self.text = f"Text for {url}"
+        self.top_image = ''
+
+    def download(self, input_html=None):
+        self.html = input_html
+
+    def parse(self):
+        if 'broken' in self.url:
+            raise ValueError('parse failed')
+
+def fake_fetch_html(url, timeout):
+    host = url.split('/')[2]
+    with FakeArticle.lock:
+        FakeArticle.active[host] = FakeArticle.active.get(host, 0) + 1
+        FakeArticle.peak[host] = max(FakeArticle.peak.get(host, 0), FakeArticle.active[host])
+    # Later entries finish first, so ordering has to come from the scheduler
+    time.sleep(0.02 if url.endswith('/0') else 0.005)
+    with FakeArticle.lock:
+        FakeArticle.active[host] -= 1
+    return f'<html>{url}</html>'
+
+def fake_parse_rss(url, **kwargs):
+    host = url.split('/')[2]
+    return [{'title': f'{host} {i}', 'link': f'http://{host}/a/{i}', 'summary': f'summary {i}'} for i in range(8)]
+
+def setup_fakes(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, 'DB_PATH', str(tmp_path / 'fetch.db'))
+    FakeArticle.active.clear()
+    FakeArticle.peak.clear()
+    monkeypatch.setattr(article_fetcher, 'Article', FakeArticle)
+    monkeypatch.setattr(article_fetcher, '_fetch_html', fake_fetch_html)
+    monkeypatch.setattr(article_fetcher, 'parse_rss', fake_parse_rss)
+
+def test_concurrent_fetch_keeps_order_and_caps(monkeypatch, tmp_path):
+    setup_fakes(monkeypatch, tmp_path)
+    sources = [{'name': f'S{i}', 'url': f'http://host{i}.example/rss'} for i in range(3)]
+    articles = article_fetcher.fetch_articles(sources, max_articles=12, max_workers=8, per_host=2)
+    assert len(articles) == 12
+    # Five per source, in source and feed order, exactly like the sequential fetcher
+    expected = [f'http://host{s}.example/a/{i}' for s in range(3) for i in range(5)][:12]
+    assert [a['url'] for a in articles] == expected
+    assert all(peak <= 2 for peak in FakeArticle.peak.values())
+
+def test_direct_url_failures_do_not_count_towards_cap(monkeypatch, tmp_path):
+    setup_fakes(monkeypatch, tmp_path)
+    sources = [
+        {'name': 'Broken', 'url': 'http://broken.example/page'},
+        {'name': 'Direct', 'url': 'http://direct.example/page'},
+        {'name': 'Feed', 'url': 'http://feed.example/rss'},
+    ]
+    articles = article_fetcher.fetch_articles(sources, max_articles=3, max_workers=4)
+    assert [a['source_name'] for a in articles] == ['Direct', 'Feed', 'Feed']
+
+def test_feeds_are_polled_concurrently_within_the_deadline(monkeypatch, tmp_path):
+    setup_fakes(monkeypatch, tmp_path)
+    release = threading.Event()
+    polling = []
+    peak = []
+
+    def slow_parse_rss(url, **kwargs):
+        with FakeArticle.lock:
+            polling.append(url)
+            peak.append(len(polling))
+        try:
+            if 'slow' in url:
+                release.wait(5)
+            else:
+                time.sleep(0.05)
+            return fake_parse_rss(url, **kwargs)
+        finally:
+            with FakeArticle.lock:
+                polling.remove(url)
+
+    monkeypatch.setattr(article_fetcher, 'parse_rss', slow_parse_rss)
+    running = [0]
+    idle = threading.Condition()
+    fetch_job = article_fetcher._fetch_job
+
+    def tracked_fetch_job(*args):
+        with idle:
+            running[0] += 1
+        try:
+            return fetch_job(*args)
+        finally:
+            with idle:
+                running[0] -= 1
+                idle.notify_all()
+
+    monkeypatch.setattr(article_fetcher, '_fetch_job', tracked_fetch_job)
+    sources = [{'name': 'Slow', 'url': 'http://slow.example/rss'},
+               *({'name': f'F{i}', 'url': f'http://fast{i}.example/rss'} for i in range(2))]
+    started = time.monotonic()
+    try:
+        articles = article_fetcher.fetch_articles(sources, max_articles=15, max_workers=8, deadline=0.5)
+    finally:
+        release.set()
+        # Downloads still running past the deadline must not outlive this test's fakes
+        with idle:
+            idle.wait_for(lambda: running[0] == 0, timeout=5)
+    # The slow feed costs the deadline, not the round; the feeds read meanwhile still count
+    assert time.monotonic() - started < 2
+    assert max(peak) == 3
+    assert {a['source_name'] for a in articles} == {'F0', 'F1'}
+    assert len(articles) == 10
+
+def test_known_urls_skip_the_network(monkeypatch, tmp_path):
+    setup_fakes(monkeypatch, tmp_path)
+    downloads = []
+    monkeypatch.setattr(FakeArticle, 'parse', lambda self: downloads.append(self.url))
+    path = storage.DB_PATH
+    storage.save_sources([{'name': 'S0', 'url': 'http://host0.example/rss', 'category': 'World', 'trust_score': 8.0}], db_path=path)
+    storage.save_articles([{'title': 'Stored', 'url': 'http://host0.example/a/0', 'source_name': 'S0',
+                            'raw_text': 'Stored text', 'summary': 'Stored summary'}], db_path=path)
+    sources = [{'name': 'S0', 'url': 'http://host0.example/rss'}]
+
+    first = article_fetcher.fetch_articles(sources, max_articles=5)
+    # The stored article comes back from the database with its summary
+    assert first[0]['raw_text'] == 'Stored text' and first[0]['summary'] == 'Stored summary' and first[0]['stored']
+    assert sorted(downloads) == [f'http://host0.example/a/{i}' for i in range(1, 5)]
+
+    # Everything else was put in the extraction cache on the first pass
+    downloads.clear()
+    second = article_fetcher.fetch_articles(sources, max_articles=5)
+    assert downloads == []
+    assert [a['raw_text'] for a in second[1:]] == [f'Text for http://host0.example/a/{i}' for i in range(1, 5)]
+
+    # The daemon skips entries that are already stored
+    third = article_fetcher.fetch_articles(sources, max_articles=5, new_only=True)
+    assert [a['url'] for a in third] == [f'http://host0.example/a/{i}' for i in range(1, 5)]
@@ -0,0 +1,33 @@
+import json
+from benchmarks import bench_pipeline, bench_app
+
+def test_offline_benchmark_runs_every_stage(tmp_path, monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-test')
+    result = bench_pipeline.run_benchmark(sites=2, max_articles=6, article_latency=0, article_bytes=2000,
+                                          openai_latency=0, workdir=str(tmp_path))
+    assert result['sources'] == 2
+    assert result['articles'] == result['saved'] == 6
+    assert result['failed_summaries'] == 0
+    assert {'scout.search', 'scout.discover', 'fetch', 'summarize', 'save'} <= set(result['stages'])
+    assert result['requests']['article'] == 6 and result['requests']['chat'] == 6
+
+def test_runs_are_recorded_and_compared(tmp_path, monkeypatch, capsys):
+    results = tmp_path / 'results.jsonl'
+    fake = {'sources': 1, 'articles': 2, 'saved': 2, 'failed_summaries': 0, 'articles_per_sec': 4.0,
+            'wall': {'fetch': 0.5}, 'stages': {'fetch': {'count': 2, 'p50': 0.1, 'p95': 0.2, 'total': 0.3}},
+            'peak_rss_mb': 50.0, 'requests': {}}
+    monkeypatch.setattr(bench_pipeline, 'run_benchmark', lambda **kwargs: dict(fake))
+    bench_pipeline.main(['--results', str(results)])
+    fake['articles_per_sec'] = 5.0
+    bench_pipeline.main(['--results', str(results)])
+    assert len(results.read_text().splitlines()) == 2
+    assert json.loads(results.read_text().splitlines()[1])['articles_per_sec'] == 5.0
+    assert 'throughput 4.00 -> 5.00 articles/s (+25%)' in capsys.readouterr().out
+
+def test_reader_pages_load_without_ingestion_clients():
+    results = {r['page']: r for r in bench_app.main(['--articles', '50', '--reruns', '2'])}
+    assert set(results) == set(bench_app.PAGES)
+    assert not any(r['errors'] for r in results.values())
+    for page in ('News Feed', 'Manage Sources'):
+        assert not {'newspaper', 'openai', 'serpapi', 'googletrans'} & set(results[page]['loaded'])
+    assert 'serpapi' in results['Source Scout']['loaded']
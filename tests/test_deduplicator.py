@@ -0,0 +1,79 @@
+import random
+from agents import deduplicator
+from agents import pipeline
+from db import storage
+from utils import minhash
+
+random.seed(7)
+VOCAB = [f'word{i}' for i in range(2000)]
+
+def story(n=300):
+    return random.choices(VOCAB, k=n)
+
+def copy_of(words, outlet):
+    edited = list(words)
+    for _ in range(3):
+        edited[random.randrange(len(edited))] = random.choice(VOCAB)
+    return f'{outlet} reports: ' + ' '.join(edited) + f' Additional reporting by {outlet} staff.'
+
+def test_signatures_separate_copies_from_other_stories():
+    words = story()
+    original = ' '.join(words)
+    assert minhash.similarity(minhash.signature(original), minhash.signature(copy_of(words, 'Reuters'))) >= minhash.THRESHOLD
+    assert minhash.similarity(minhash.signature(original), minhash.signature(' '.join(story()))) < 0.2
+    assert minhash.signature('too short to compare') is None
+
+def test_pipeline_summarizes_one_article_per_story(monkeypatch, tmp_path):
+    path = str(tmp_path / 'dedup.db')
+    storage.save_sources([{'name': n, 'url': f'http://{n}.example/rss', 'category': 'World', 'trust_score': 8.0}
+                          for n in ('reuters', 'guardian', 'aljazeera')], db_path=path)
+    wire, other = story(), story()
+    articles = [
+        {'title': 'Wire story', 'url': 'http://reuters.example/1', 'source_name': 'reuters', 'raw_text': copy_of(wire, 'Reuters')},
+        {'title': 'Unrelated', 'url': 'http://guardian.example/2', 'source_name': 'guardian', 'raw_text': ' '.join(other)},
+        {'title': 'Wire story (copy)', 'url': 'http://aljazeera.example/3', 'source_name': 'aljazeera', 'raw_text': copy_of(wire, 'Al Jazeera')},
+    ]
+    summarized = []
+
+    def fake_summarize(batch, db_path=None):
+        summarized.extend(a['title'] for a in batch)
+        return [(f"Summary of {a['title']}", 'llm') for a in batch]
+
+    monkeypatch.setattr(pipeline, 'fetch_articles', lambda *a, **k: [dict(art) for art in articles])
+    monkeypatch.setattr(pipeline, 'summarize_tiered_batch', fake_summarize)
+    result = pipeline.ingest_sources([], db_path=path)
+    assert summarized == ['Wire story', 'Unrelated']
+    assert result[2]['summary'] == 'Summary of Wire story'
+
+    # The feed shows one card per story, with the copy listed under "also covered by"
+    rows, _ = storage.feed_page(db_path=path)
+    assert sorted(r['title'] for r in rows) == ['Unrelated', 'Wire story']
+    wire_row = next(r for r in rows if r['title'] == 'Wire story')
+    members = storage.cluster_members([wire_row['id']], db_path=path)
+    assert [m['source_name'] for m in members[wire_row['id']]] == ['aljazeera']
+
+    # A later copy from another outlet matches the stored story and needs no LLM call
+    later = [{'title': 'Wire story (late copy)', 'url': 'http://guardian.example/4', 'source_name': 'guardian',
+              'raw_text': copy_of(wire, 'Guardian')}]
+    assert deduplicator.cluster_articles(later, db_path=path) == []
+    assert later[0]['summary'] == 'Summary of Wire story'
+    assert later[0]['cluster_url'] == 'http://reuters.example/1'
+
+def test_deleted_articles_leave_no_fingerprints(tmp_path):
+    path = str(tmp_path / 'fingerprints.db')
+    storage.save_sources([{'name': 'reuters', 'url': 'http://reuters.example/rss', 'category': 'World', 'trust_score': 8.0}], db_path=path)
+    wire = story()
+    original, copy = ' '.join(wire), copy_of(wire, 'Reuters')
+    storage.save_articles([{'title': title, 'url': url, 'source_name': 'reuters', 'summary': f'Summary of {title}',
+                            'raw_text': text, 'minhash': minhash.signature(text), 'cluster_url': url}
+                           for title, url, text in (('Original', 'http://reuters.example/1', original),
+                                                    ('Copy', 'http://reuters.example/2', copy))], db_path=path)
+    conn = storage.get_connection(path)
+    with conn:
+        conn.execute("DELETE FROM articles WHERE title = 'Original'")
+    # The exact match is gone; the live copy is found instead
+    assert storage.find_near_duplicate(minhash.signature(original), db_path=path)['summary'] == 'Summary of Copy'
+    storage.delete_all_articles(db_path=path)
+    assert conn.execute('SELECT COUNT(*) FROM article_fingerprints').fetchone()[0] == 0
+    assert conn.execute('SELECT COUNT(*) FROM article_lsh').fetchone()[0] == 0
+    assert storage.find_near_duplicate(minhash.signature(original), db_path=path) is None
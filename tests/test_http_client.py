@@ -0,0 +1,51 @@
+import gzip
+import pytest
+from utils import http_client
+
+@pytest.fixture(autouse=True)
+def fresh_session():
+    http_client.reset_session()
+    yield
+    http_client.reset_session()
+
+def test_connections_are_kept_alive_and_gzip_is_negotiated(http_server):
+    seen = []
+
+    def handler(req):
+        seen.append(req.headers.get('Accept-Encoding', ''))
+        return 200, {'Content-Type': 'text/html', 'Content-Encoding': 'gzip'}, gzip.compress(b'<html>hello</html>')
+
+    base = http_server(handler)
+    for i in range(5):
+        assert http_client.fetch(f'{base}/page/{i}').text == '<html>hello</html>'
+    assert all('gzip' in s for s in seen)
+    [pool] = [p for p in http_client.pool_stats() if p['host'].endswith(base.rsplit(':', 1)[1])]
+    assert pool['connections'] == 1 and pool['requests'] == 5 and pool['reused'] == 4 and pool['idle'] == 1
+
+def test_bodies_are_capped_even_when_compressed(http_server):
+    body = b'x' * 200_000
+    routes = {'/plain': (200, {}, body), '/gzip': (200, {'Content-Encoding': 'gzip'}, gzip.compress(body))}
+    base = http_server(lambda req: routes[req.path])
+    with pytest.raises(http_client.ResponseTooLarge):
+        http_client.fetch(base + '/plain', max_bytes=100_000)
+    # Tiny on the wire, large once decompressed
+    with pytest.raises(http_client.ResponseTooLarge):
+        http_client.fetch(base + '/gzip', max_bytes=100_000)
+    assert len(http_client.fetch(base + '/gzip', max_bytes=300_000).content) == 200_000
+
+def test_idempotent_gets_are_retried_on_server_errors(http_server):
+    calls = []
+
+    def handler(req):
+        calls.append(req.path)
+        if req.path == '/missing':
+            return 404, {}, b'not found'
+        return (503, {}, b'busy') if len(calls) == 1 else (200, {}, b'ok')
+
+    base = http_server(handler)
+    assert http_client.fetch(base + '/feed').text == 'ok'
+    assert calls == ['/feed', '/feed']
+    # Client errors are not retried
+    with pytest.raises(http_client.requests.HTTPError):
+        http_client.fetch(base + '/missing')
+    assert calls.count('/missing') == 1
@@ -0,0 +1,102 @@
+import io
+import subprocess
+import logging
+import threading
+import sys
+import os
+import ingest
+from PIL import Image
+from db import storage
+from utils import logger
+
+def add_sources(path):
+    storage.save_sources([
+        {'name': 'Busy', 'url': 'http://busy.example/rss', 'category': 'World', 'trust_score': 8.0},
+        {'name': 'Quiet', 'url': 'http://quiet.example/rss', 'category': 'World', 'trust_score': 8.0},
+    ], db_path=path)
+
+def test_run_once_adapts_intervals_per_source(monkeypatch, tmp_path):
+    path = str(tmp_path / 'ingest.db')
+    add_sources(path)
+    calls = []
+
+    def fake_ingest(sources, max_articles, new_only, db_path, topics=None):
+        calls.append(sorted(s['name'] for s in sources))
+        assert new_only
+        return [{'source_name': 'Busy'}] * 4
+
+    monkeypatch.setattr(ingest, 'ingest_sources', fake_ingest)
+    assert ingest.run_once(db_path=path, now=1000.0) == 2
+    by_id = {s['id']: s['name'] for s in storage.list_sources(path)}
+    rows = storage.get_connection(path).execute('SELECT source_id, interval, next_poll_at FROM source_schedule').fetchall()
+    schedule = {by_id[r['source_id']]: (r['interval'], r['next_poll_at']) for r in rows}
+    assert schedule['Busy'] == (ingest.DEFAULT_INTERVAL / 2, 1000.0 + ingest.DEFAULT_INTERVAL / 2)
+    assert schedule['Quiet'] == (ingest.DEFAULT_INTERVAL * 1.5, 1000.0 + ingest.DEFAULT_INTERVAL * 1.5)
+    # Nothing is due until the busy source's shorter interval has passed
+    assert ingest.run_once(db_path=path, now=1001.0) == 0
+    assert ingest.run_once(db_path=path, now=1000.0 + ingest.DEFAULT_INTERVAL) == 1
+    assert calls == [['Busy', 'Quiet'], ['Busy']]
+
+def test_databases_do_not_share_feed_or_thumbnail_caches(http_server, tmp_path, monkeypatch):
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    monkeypatch.setattr(ingest, 'load_selected_topics', lambda: [])
+    image = io.BytesIO()
+    Image.new('RGB', (400, 300), (200, 30, 30)).save(image, 'JPEG')
+
+    def handler(req):
+        if req.path == '/rss':
+            items = ''.join(f'<item><title>Story {i}</title><link>{base}/story/{i}</link></item>' for i in (1, 2))
+            return 200, {'Content-Type': 'application/rss+xml'}, \
+                f'<?xml version="1.0"?><rss version="2.0"><channel><title>T</title>{items}</channel></rss>'.encode()
+        if req.path == '/image.jpg':
+            return 200, {'Content-Type': 'image/jpeg'}, image.getvalue()
+        text = ' '.join(['Officials confirmed the report on Tuesday after a long review.'] * 20)
+        return 200, {'Content-Type': 'text/html'}, (f'<html><head><title>Story</title><meta property="og:image" '
+                                                    f'content="{base}/image.jpg"></head><body><p>{text}</p></body></html>').encode()
+
+    base = http_server(handler)
+    for name in ('first', 'second'):
+        path = str(tmp_path / name / 'clearfeed.db')
+        os.makedirs(os.path.dirname(path))
+        storage.save_sources([{'name': 'Feed', 'url': f'{base}/rss', 'category': 'World', 'trust_score': 8.0}], db_path=path)
+        assert ingest.run_once(db_path=path, now=1000.0) == 1
+        # Entries the other database has already seen are still new here
+        stored = storage.get_connection(path).execute('SELECT url FROM articles ORDER BY url').fetchall()
+        assert [r['url'] for r in stored] == [f'{base}/story/1', f'{base}/story/2']
+        assert os.listdir(tmp_path / name / 'thumbnails')
+
+def test_next_interval_is_clamped():
+    assert ingest.next_interval(400, 10, min_interval=300) == 300
+    assert ingest.next_interval(20000, 0, max_interval=21600) == 21600
+
+def test_failed_rounds_are_logged_with_tracebacks(monkeypatch, tmp_path, caplog):
+    def broken_ingest(*args, **kwargs):
+        raise RuntimeError('feed exploded')
+
+    monkeypatch.setattr(ingest, 'run_once', broken_ingest)
+    logger.METRICS.reset()
+    with caplog.at_level(logging.ERROR):
+        ingest.run(threading.Event(), db_path=str(tmp_path / 'ingest.db'), once=True)
+    record = next(r for r in caplog.records if 'feed exploded' in r.getMessage())
+    assert record.levelno == logging.ERROR and record.exc_info[0] is RuntimeError
+    counters = {c['labels']['stage']: c['value'] for c in logger.METRICS.snapshot()['counters']
+                if c['name'] == logger.ERRORS}
+    assert counters == {'ingest': 1}
+    logger.METRICS.reset()
+
+def test_lock_prevents_second_daemon(tmp_path):
+    lock_path = str(tmp_path / 'ingest.lock')
+    first = ingest.acquire_lock(lock_path)
+    assert first is not None
+    # A separate process must not get the lock while we hold it
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = f"import sys; sys.path.insert(0, {root!r}); import ingest; sys.exit(0 if ingest.acquire_lock({lock_path!r}) is None else 1)"
+    assert subprocess.run([sys.executable, '-c', code]).returncode == 0
+    first.close()
+    assert subprocess.run([sys.executable, '-c', code]).returncode == 1
+
+def test_once_mode_exits(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, os.path.join(root, 'ingest.py'), '--once', '--db', str(tmp_path / 'empty.db')],
+                            capture_output=True, text=True, timeout=60, cwd=root)
+    assert result.returncode == 0, result.stderr
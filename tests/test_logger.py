@@ -0,0 +1,58 @@
+import json
+import time
+import pytest
+import requests
+from utils import logger
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    logger.METRICS.reset()
+    yield
+    logger.METRICS.reset()
+
+def stage_hist(stage, source=None):
+    labels = {'stage': stage, **({'source': source} if source else {})}
+    return next(h for h in logger.METRICS.snapshot()['histograms']
+                if h['name'] == logger.STAGE_SECONDS and h['labels'] == labels)
+
+def test_span_times_blocks_per_stage_and_source():
+    for _ in range(3):
+        with logger.span('download', source='https://www.example.com/a/1'):
+            time.sleep(0.01)
+    hist = stage_hist('download', 'www.example.com')
+    assert hist['count'] == 3
+    assert hist['sum'] >= 0.03
+    assert hist['buckets']['0.05'] == 3 and hist['buckets']['+Inf'] == 3
+
+def test_span_decorator_counts_errors_and_timeouts():
+    @logger.span('summarize')
+    def flaky(exc):
+        if exc:
+            raise exc
+        return 'ok'
+
+    assert flaky(None) == 'ok'
+    with pytest.raises(ValueError):
+        flaky(ValueError('bad'))
+    with pytest.raises(requests.ReadTimeout):
+        flaky(requests.ReadTimeout('slow'))
+    counters = {(c['name'], c['labels']['stage']): c['value'] for c in logger.METRICS.snapshot()['counters']}
+    assert counters[(logger.ERRORS, 'summarize')] == 2
+    assert counters[(logger.TIMEOUTS, 'summarize')] == 1
+    assert stage_hist('summarize')['count'] == 3
+
+def test_prometheus_and_json_exports(tmp_path):
+    logger.record_cache('summary', hits=2, misses=1)
+    with logger.span('feed.parse', source='http://feeds.example/rss?x="1"'):
+        pass
+    text = logger.export_prometheus()
+    assert '# TYPE clearfeed_cache_hits_total counter' in text
+    assert 'clearfeed_cache_hits_total{cache="summary"} 2' in text
+    assert '# TYPE clearfeed_stage_seconds histogram' in text
+    assert 'clearfeed_stage_seconds_bucket{source="feeds.example",stage="feed.parse",le="+Inf"} 1' in text
+    assert 'clearfeed_stage_seconds_count{source="feeds.example",stage="feed.parse"} 1' in text
+    path = tmp_path / 'metrics.json'
+    logger.write_metrics(str(path))
+    snap = json.loads(path.read_text())
+    assert {'name': logger.CACHE_MISSES, 'labels': {'cache': 'summary'}, 'value': 1} in snap['counters']
+    assert logger.stage_table()[0]['stage'] == 'feed.parse'
@@ -0,0 +1,120 @@
+import time
+import random
+from agents import pipeline, summarizer
+from agents.summary_scheduler import SummaryScheduler
+from db import storage
+
+VOCAB = [f'word{i}' for i in range(2000)]
+
+def story(n=300):
+    return random.choices(VOCAB, k=n)
+
+def copy_of(words, outlet):
+    return f'{outlet} reports: ' + ' '.join(words) + f' Additional reporting by {outlet} staff.'
+
+SOURCES = [{'name': n, 'url': f'http://{n}.example/rss', 'category': 'World', 'trust_score': 8.0}
+           for n in ('reuters', 'guardian', 'aljazeera')]
+
+def setup_fakes(monkeypatch, texts, download_delay=0.0):
+    """texts: url -> raw_text. Downloads of later URLs finish later."""
+    urls = list(texts)
+    started = []
+
+    def fake_plan(sources, max_articles, new_only=False, topics=None, db_path=None, health=None, *args):
+        for i, url in enumerate(urls[:max_articles]):
+            yield {'title': f'Story {i}', 'link': url}, SOURCES[i % len(SOURCES)], None
+
+    def fake_download(entry, src, limiter, timeout, health=None):
+        started.append(entry['link'])
+        time.sleep(download_delay * urls.index(entry['link']))
+        return texts[entry['link']]
+
+    def fake_extract(entry, src, text, matcher=None, db_path=None, health=None):
+        return {'title': entry['title'], 'url': entry['link'], 'source_name': src['name'], 'raw_text': text,
+                'trust_score': src['trust_score']}
+
+    monkeypatch.setattr(pipeline, 'plan_jobs', fake_plan)
+    monkeypatch.setattr(pipeline, 'download_job', fake_download)
+    monkeypatch.setattr(pipeline, 'extract_job', fake_extract)
+    monkeypatch.setattr(summarizer, 'llm_available', lambda: True)
+    monkeypatch.setattr(SummaryScheduler, 'summarize', lambda self, text, template=None: f'Summary of {text[:12]}')
+    return started
+
+def test_stream_yields_before_slow_downloads_finish(monkeypatch, tmp_path):
+    path = str(tmp_path / 'stream.db')
+    storage.save_sources(SOURCES, db_path=path)
+    texts = {f'http://reuters.example/{i}': ' '.join(story()) for i in range(6)}
+    setup_fakes(monkeypatch, texts, download_delay=0.1)
+    start = time.monotonic()
+    stream = pipeline.stream_ingest(SOURCES, max_articles=6, db_path=path, write_batch=2, write_interval=0.05)
+    first = next(stream)
+    # The fastest article arrives while the slowest download (0.5s) is still running
+    assert time.monotonic() - start < 0.4
+    assert first['summary'].startswith('Summary of')
+    rest = list(stream)
+    assert len(rest) == 5
+    rows, _ = storage.feed_page(db_path=path)
+    assert len(rows) == 6
+
+def test_stream_pairs_copies_with_their_story(monkeypatch, tmp_path):
+    path = str(tmp_path / 'stream.db')
+    storage.save_sources(SOURCES, db_path=path)
+    wire = story()
+    texts = {'http://reuters.example/1': copy_of(wire, 'Reuters'),
+             'http://guardian.example/2': ' '.join(story()),
+             'http://aljazeera.example/3': copy_of(wire, 'Al Jazeera')}
+    setup_fakes(monkeypatch, texts)
+    articles = list(pipeline.stream_ingest(SOURCES, max_articles=3, db_path=path))
+    copy = next(a for a in articles if a['url'] == 'http://aljazeera.example/3')
+    wire_art = copy['duplicate_of']
+    assert articles.index(wire_art) < articles.index(copy)
+    assert copy['summary'] == wire_art['summary']
+    rows, _ = storage.feed_page(db_path=path)
+    assert len(rows) == 2
+
+def test_closing_stream_early_saves_what_was_yielded(monkeypatch, tmp_path):
+    path = str(tmp_path / 'stream.db')
+    storage.save_sources(SOURCES, db_path=path)
+    texts = {f'http://reuters.example/{i}': ' '.join(story()) for i in range(20)}
+    started = setup_fakes(monkeypatch, texts, download_delay=0.01)
+    stream = pipeline.stream_ingest(SOURCES, max_articles=20, db_path=path, buffer_size=2, write_batch=50)
+    taken = [next(stream) for _ in range(2)]
+    stream.close()
+    rows, _ = storage.feed_page(db_path=path)
+    assert sorted(r['url'] for r in rows) == sorted(a['url'] for a in taken)
+    # Bounded buffers kept the download stage from running far ahead of the consumer
+    assert len(started) < 20
+
+def test_failed_summaries_never_lose_a_story(monkeypatch, tmp_path):
+    path = str(tmp_path / 'stream.db')
+    storage.save_sources(SOURCES, db_path=path)
+    wire = story()
+    texts = {'http://reuters.example/1': copy_of(wire, 'Reuters'),
+             'http://guardian.example/2': copy_of(wire, 'Guardian'),
+             'http://aljazeera.example/3': copy_of(wire, 'Al Jazeera')}
+    setup_fakes(monkeypatch, texts)
+
+    def broken(self, text, template=None):
+        raise RuntimeError('model overloaded')
+
+    monkeypatch.setattr(SummaryScheduler, 'summarize', broken)
+    articles = list(pipeline.stream_ingest(SOURCES, max_articles=3, db_path=path))
+    assert len(articles) == 3
+    assert {(a['summary'], a['summary_tier']) for a in articles} == {(articles[0]['summary'], 'local')}
+    assert articles[0]['summary']
+
+    # Even a representative that is dropped outright leaves its copies to tell the story
+    path = str(tmp_path / 'dropped.db')
+    storage.save_sources(SOURCES, db_path=path)
+
+    def thumbnails(batch, db_path):
+        if batch[0]['url'] == 'http://reuters.example/1':
+            raise RuntimeError('disk full')
+
+    monkeypatch.setattr(pipeline, '_cache_thumbnails', thumbnails)
+    articles = list(pipeline.stream_ingest(SOURCES, max_articles=3, db_path=path))
+    assert sorted(a['url'] for a in articles) == ['http://aljazeera.example/3', 'http://guardian.example/2']
+    assert all(a['summary'] for a in articles)
+    rows, _ = storage.feed_page(db_path=path)
+    assert len(rows) == 1
+    assert len(storage.cluster_members([rows[0]['id']], db_path=path)[rows[0]['id']]) == 1
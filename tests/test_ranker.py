@@ -0,0 +1,58 @@
+import time
+import random
+from agents import ranker
+from db import storage
+
+NOW = 1_750_000_000
+
+def candidates(rows):
+    # rows: (id, hours old, trust, story, source, category, tags)
+    return ranker.to_columns([(i, NOW - hours * 3600, trust, story, source, category, tags)
+                              for i, hours, trust, story, source, category, tags in rows])
+
+def test_score_combines_recency_trust_topics_and_diversity():
+    columns = candidates([
+        (1, 1, 5.0, 1, 1, 'World', ''),
+        (2, 1, 9.0, 2, 2, 'World', ''),
+        (3, 1, 5.0, 3, 3, 'World', 'Malaria'),
+        (4, 48, 9.0, 4, 4, 'Health', 'Malaria,Dengue'),
+        (5, 2, 9.0, 2, 5, 'World', ''),
+        (6, 1, None, 6, 6, 'World', ''),
+    ])
+    order = ranker.rank(columns, ['Malaria', 'Dengue'], NOW).tolist()
+    # A topic match outweighs trust; a two-day-old article still beats a fresh low-trust one with both
+    assert order.index(3) < order.index(2) < order.index(4) < order.index(1)
+    # Unscored sources rank like newly scouted ones, between low and high trust
+    assert order.index(2) < order.index(6) < order.index(1)
+    # The second article of a story drops below everything else
+    assert order[-1] == 5
+    assert ranker.rank(columns, [], NOW).tolist()[:2] == [2, 6]
+
+def test_ten_thousand_candidates_rank_in_milliseconds():
+    rng = random.Random(7)
+    topics = ['Cancer', 'Tennis', 'Space', 'Economy', 'Climate Change']
+    rows = [(i, rng.random() * 720, rng.choice([None, 4.0, 7.0, 9.5]), rng.randrange(8000), rng.randrange(50),
+             rng.choice(['Health', 'Sports', 'Science']), ','.join(rng.sample(topics, rng.randrange(3))))
+            for i in range(10_000)]
+    columns = candidates(rows)
+    started = time.perf_counter()
+    first = ranker.rank(columns, ['Cancer', 'Space'], NOW)
+    assert time.perf_counter() - started < 0.2
+    assert len(set(first.tolist())) == 10_000
+    assert (ranker.rank(candidates(list(reversed(rows))), ['Cancer', 'Space'], NOW) == first).all()
+
+def test_rankings_are_cached_until_the_database_changes(tmp_path):
+    path = str(tmp_path / 'rank.db')
+    storage.save_sources([{'name': 'Src', 'url': 'http://src.example/rss', 'category': 'Health', 'trust_score': 8.0}], db_path=path)
+    published = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(NOW - 3600))
+    storage.save_articles([{'title': f'T{i}', 'url': f'http://src.example/{i}', 'source_name': 'Src', 'summary': 's',
+                            'published': published, 'tags': ['Malaria'] if i == 2 else []} for i in range(3)], db_path=path)
+    first = ranker.ranked_ids(['Malaria'], db_path=path, now=NOW)
+    assert ranker.ranked_ids(['Malaria'], db_path=path, now=NOW + 1) is first
+    assert [row['title'] for row in storage.feed_rows(first.tolist(), db_path=path)] == ['T2', 'T1', 'T0']
+
+    generation = storage.data_generation(db_path=path)
+    storage.save_articles([{'title': 'T3', 'url': 'http://src.example/3', 'source_name': 'Src', 'summary': 's',
+                            'published': published}], db_path=path)
+    assert storage.data_generation(db_path=path) == generation + 1
+    assert len(ranker.ranked_ids(['Malaria'], db_path=path, now=NOW + 2)) == 4
@@ -0,0 +1,120 @@
+from utils import rss_parser
+
+FEED = '''<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Test</title>
+{items}
+</channel></rss>'''
+
+ITEM = '<item><title>Story {i}</title><link>http://example.com/{i}</link><description>About {i}</description><pubDate>Mon, 06 Jan 2025 10:0{i}:00 GMT</pubDate></item>'
+
+def make_feed(ids):
+    return FEED.format(items=''.join(ITEM.format(i=i) for i in ids)).encode()
+
+def test_conditional_get_and_delta(http_server, tmp_path):
+    state = {'ids': [1, 2], 'etag': '"v1"', 'hits': [], 'not_modified': 0}
+
+    def handler(req):
+        state['hits'].append(req.headers.get('If-None-Match'))
+        if req.headers.get('If-None-Match') == state['etag']:
+            state['not_modified'] += 1
+            return 304, {'ETag': state['etag']}, b''
+        return 200, {'Content-Type': 'application/rss+xml', 'ETag': state['etag']}, make_feed(state['ids'])
+
+    url = http_server(handler) + '/rss'
+    cache = str(tmp_path / 'feeds.db')
+
+    first = rss_parser.poll_feed(url, db_path=cache)
+    assert [a['link'] for a in first['new_entries']] == ['http://example.com/1', 'http://example.com/2']
+    assert first['entries'][0]['published'] == '2025-01-06T10:01:00Z'
+
+    second = rss_parser.poll_feed(url, db_path=cache)
+    assert second['not_modified'] is True
+    assert second['new_entries'] == []
+    assert len(second['entries']) == 2
+    assert state['not_modified'] == 1
+
+    state['ids'], state['etag'] = [3, 1, 2], '"v2"'
+    third = rss_parser.poll_feed(url, db_path=cache)
+    assert [a['link'] for a in third['new_entries']] == ['http://example.com/3']
+    assert len(third['entries']) == 3
+
+def chunked(data, size=256, consumed=None):
+    for i in range(0, len(data), size):
+        if consumed is not None:
+            consumed.append(i)
+        yield data[i:i + size]
+
+def test_streaming_parser_matches_feedparser():
+    data = make_feed([1, 2, 3])
+    streamed = list(rss_parser.iter_entries(chunked(data)))
+    parsed = [rss_parser._entry_to_article(e) for e in rss_parser.feedparser.parse(data).entries]
+    for ours, theirs in zip(streamed, parsed):
+        assert {k: ours[k] for k in ('title', 'link', 'summary', 'published')} == \
+               {k: theirs[k] for k in ('title', 'link', 'summary', 'published')}
+    assert len(streamed) == 3
+
+def test_streaming_parser_stops_reading_early():
+    data = make_feed(range(2000))
+    consumed = []
+    entries = rss_parser.iter_entries(chunked(data, consumed=consumed))
+    first = [next(entries) for _ in range(5)]
+    assert [a['title'] for a in first] == [f'Story {i}' for i in range(5)]
+    assert len(consumed) < 5
+
+def test_streaming_parser_reads_atom():
+    data = b'''<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom"><title>T</title>
+<entry><title>Atom story</title><link rel="alternate" href="http://example.com/atom/1"/>
+<updated>2025-01-06T12:30:00+02:00</updated><summary>Short</summary></entry>
+</feed>'''
+    [entry] = rss_parser.iter_entries([data])
+    assert entry['link'] == 'http://example.com/atom/1'
+    assert entry['published'] == '2025-01-06T10:30:00Z'
+    assert entry['summary'] == 'Short'
+
+def test_malformed_feed_falls_back_to_feedparser():
+    # &nbsp; is not defined in XML, so the strict parser gives up part-way through
+    data = make_feed([1]).replace(b'About 1', b'About&nbsp;1')
+    [entry] = rss_parser.iter_entries(chunked(data))
+    assert entry['link'] == 'http://example.com/1'
+
+def test_limit_with_new_only_keeps_older_entries_seen(http_server, tmp_path):
+    state = {'ids': list(range(10, 0, -1))}
+    url = http_server(lambda req: (200, {'Content-Type': 'application/rss+xml'}, make_feed(state['ids']))) + '/rss'
+    cache = str(tmp_path / 'feeds.db')
+    rss_parser.poll_feed(url, db_path=cache)
+    state['ids'] = [12, 11] + state['ids']
+    result = rss_parser.poll_feed(url, db_path=cache, limit=1, new_only=True)
+    assert [a['link'] for a in result['new_entries']] == ['http://example.com/12']
+    # Only the head of the feed was read, but entries below it are still known
+    later = rss_parser.poll_feed(url, db_path=cache)
+    assert [a['link'] for a in later['new_entries']] == ['http://example.com/11']
+
+def test_partial_reads_do_not_store_validators(http_server, tmp_path):
+    state = {'ids': list(range(10, 0, -1)), 'conditional': []}
+
+    def handler(req):
+        state['conditional'].append(req.headers.get('If-None-Match'))
+        if req.headers.get('If-None-Match') == '"v1"':
+            return 304, {'ETag': '"v1"'}, b''
+        return 200, {'Content-Type': 'application/rss+xml', 'ETag': '"v1"'}, make_feed(state['ids'])
+
+    url = http_server(handler) + '/rss'
+    cache = str(tmp_path / 'feeds.db')
+    first = rss_parser.poll_feed(url, db_path=cache, limit=2)
+    assert len(first['new_entries']) == 2
+    # The rest of the document was never read, so the next poll must not be answered with a 304
+    second = rss_parser.poll_feed(url, db_path=cache)
+    assert second['not_modified'] is False
+    assert [a['link'] for a in second['new_entries']] == [f'http://example.com/{i}' for i in range(8, 0, -1)]
+    assert rss_parser.poll_feed(url, db_path=cache)['not_modified'] is True
+    assert state['conditional'] == [None, None, '"v1"']
+
+def test_new_only_still_reports_the_feed_total(http_server, tmp_path):
+    url = http_server(lambda req: (200, {'Content-Type': 'application/rss+xml'}, make_feed([3, 2, 1]))) + '/rss'
+    cache = str(tmp_path / 'feeds.db')
+    totals = []
+    assert len(rss_parser.parse_rss(url, new_only=True, on_total=totals.append, db_path=cache)) == 3
+    assert rss_parser.parse_rss(url, new_only=True, on_total=totals.append, db_path=cache) == []
+    assert rss_parser.parse_rss(url, new_only=True, limit=2, on_total=totals.append, db_path=cache) == []
+    assert totals == [3, 3, 2]
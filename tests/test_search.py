@@ -0,0 +1,50 @@
+import sqlite3
+from db import storage
+
+def add_source(path):
+    storage.save_sources([{'name': 'Src', 'url': 'http://src.example/rss', 'category': 'Health', 'trust_score': 8.0}], db_path=path)
+
+def test_search_ranks_and_tracks_updates(tmp_path):
+    path = str(tmp_path / 'search.db')
+    add_source(path)
+    storage.save_articles([
+        {'title': 'Malaria vaccine rollout expands', 'url': 'http://src.example/1', 'source_name': 'Src',
+         'summary': 'A new vaccine reaches more regions.', 'raw_text': 'Health ministries report progress.'},
+        {'title': 'Budget talks continue', 'url': 'http://src.example/2', 'source_name': 'Src',
+         'summary': 'Lawmakers meet again.', 'raw_text': 'One aside mentioned malaria funding.'},
+    ], db_path=path)
+    rows = storage.search_articles('malaria', db_path=path)
+    # Title matches outrank body matches
+    assert [r['title'] for r in rows] == ['Malaria vaccine rollout expands', 'Budget talks continue']
+    assert '**malaria**' in rows[1]['snippet']
+    assert [r['title'] for r in storage.search_articles('vaccines', db_path=path)] == ['Malaria vaccine rollout expands']
+    # Upserts and deletes keep the index in sync
+    storage.save_articles([{'title': 'Budget talks collapse', 'url': 'http://src.example/2', 'source_name': 'Src',
+                            'summary': 'No deal.', 'raw_text': 'Nothing about diseases.'}], db_path=path)
+    assert [r['title'] for r in storage.search_articles('malaria', db_path=path)] == ['Malaria vaccine rollout expands']
+    assert [r['title'] for r in storage.search_articles('rollo*', db_path=path)] == ['Malaria vaccine rollout expands']
+    assert storage.search_articles('"; DROP TABLE articles', db_path=path) == []
+    storage.delete_all_articles(db_path=path)
+    assert storage.search_articles('malaria', db_path=path) == []
+
+def test_existing_articles_are_backfilled_incrementally(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(open(storage.schema.SCHEMA_PATH).read())
+    conn.execute("INSERT INTO sources (name, url, category, trust_score) VALUES ('Src', 'http://src.example/rss', 'Health', 8.0)")
+    for i in range(25):
+        conn.execute('INSERT INTO articles (source_id, title, url, raw_text) VALUES (1, ?, ?, ?)',
+                     (f'Legacy story {i}', f'http://src.example/{i}', 'dengue outbreak'))
+    conn.commit()
+    conn.close()
+
+    assert storage.search_articles('dengue', db_path=path) == []
+    conn = storage.get_connection(path)
+    # Touch a row that has not been backfilled yet; it must be indexed exactly once
+    with conn:
+        conn.execute("UPDATE articles SET title = 'Edited story' WHERE id = 20")
+    remaining = [storage.backfill_search_index(batch_size=10, db_path=path) for _ in range(4)]
+    assert remaining == [15, 5, 0, 0]
+    assert len(storage.search_articles('dengue', limit=100, db_path=path)) == 25
+    assert [r['id'] for r in storage.search_articles('edited', db_path=path)] == [20]
+    conn.execute("INSERT INTO articles_fts (articles_fts) VALUES ('integrity-check')")
@@ -0,0 +1,118 @@
+import threading
+import requests
+from agents import article_fetcher, source_health
+from db import storage
+
+class FakeArticle:
+    def __init__(self, url, **kwargs):
+        self.url = url
+        self.title = f"Title for {url}"
+        self.text = '' if 'empty' in url else f"Text for {url}"
+        self.top_image = ''
+
+    def download(self, input_html=None):
+        pass
+
+    def parse(self):
+        pass
+
+def fake_parse_rss(url, on_error=None, on_total=None, new_only=False, **kwargs):
+    host = url.split('/')[2]
+    if 'down' in host:
+        on_error(requests.ConnectionError(f'{host} is down'))
+        return []
+    if on_total is not None:
+        on_total(3)
+    if new_only and 'quiet' in host:
+        return []
+    return [{'title': f'{host} {i}', 'link': f'http://{host}/a/{i}', 'summary': f'summary {i}'} for i in range(3)]
+
+def setup_fakes(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, 'DB_PATH', str(tmp_path / 'fetch.db'))
+    monkeypatch.setattr(article_fetcher, 'Article', FakeArticle)
+    monkeypatch.setattr(article_fetcher, '_fetch_html', lambda url, timeout: f'<html>{url}</html>')
+    monkeypatch.setattr(article_fetcher, 'parse_rss', fake_parse_rss)
+    return storage.DB_PATH
+
+def test_breaker_opens_after_repeated_failures_and_skips_the_source(monkeypatch, tmp_path):
+    path = setup_fakes(monkeypatch, tmp_path)
+    polled = []
+    monkeypatch.setattr(article_fetcher, 'parse_rss', lambda url, **kw: polled.append(url) or fake_parse_rss(url, **kw))
+    down = {'name': 'Down', 'url': 'http://down.example/rss', 'category': 'World', 'trust_score': 7.0}
+    storage.save_sources([down], db_path=path)
+    for _ in range(source_health.FAILURE_THRESHOLD):
+        assert article_fetcher.fetch_articles([down], max_articles=5) == []
+    row = storage.get_source_health([down['url']], db_path=path)[down['url']]
+    assert row['consecutive_failures'] == source_health.FAILURE_THRESHOLD and source_health.breaker_open(row)
+    assert storage.list_sources(db_path=path)[0]['trust_score'] < 7.0
+
+    polled.clear()
+    article_fetcher.fetch_articles([down], max_articles=5)
+    assert polled == []
+    # Once the breaker's time is up the source gets another chance
+    assert not source_health.breaker_open(row, now=row['open_until'] + 1)
+
+def test_sources_are_fetched_best_expected_yield_first(monkeypatch, tmp_path):
+    path = setup_fakes(monkeypatch, tmp_path)
+    sources = [{'name': 'Empty', 'url': 'http://empty.example/rss'}, {'name': 'Good', 'url': 'http://good.example/rss'}]
+    first = article_fetcher.fetch_articles(sources, max_articles=6)
+    assert [a['source_name'] for a in first] == ['Empty'] * 3 + ['Good'] * 3
+
+    health = storage.get_source_health([s['url'] for s in sources], db_path=path)
+    assert health['http://empty.example/rss']['extract_rate'] == 0.0
+    assert health['http://good.example/rss']['extract_rate'] == 1.0
+    # Pages without text now cost more than they yield, so the good feed goes first
+    second = article_fetcher.fetch_articles(sources, max_articles=6)
+    assert [a['source_name'] for a in second] == ['Good'] * 3 + ['Empty'] * 3
+
+def test_quiet_feeds_are_not_penalised_for_frequent_polls(monkeypatch, tmp_path):
+    path = setup_fakes(monkeypatch, tmp_path)
+    quiet = {'name': 'Quiet', 'url': 'http://quiet.example/rss', 'category': 'World', 'trust_score': 7.0}
+    storage.save_sources([quiet], db_path=path)
+    for _ in range(10):
+        assert article_fetcher.fetch_articles([quiet], max_articles=5, new_only=True) == []
+    row = storage.get_source_health([quiet['url']], db_path=path)[quiet['url']]
+    # Nothing new came out of those polls, but the feed still had its entries
+    assert row['polls'] == 10 and row['entries'] == 3
+    assert source_health.expected_yield(row) > source_health.expected_yield(None) / 2
+    assert storage.list_sources(db_path=path)[0]['trust_score'] >= source_health.DEFAULT_TRUST_SCORE
+
+def test_sources_still_running_at_the_deadline_are_recorded_as_timeouts(monkeypatch, tmp_path):
+    path = setup_fakes(monkeypatch, tmp_path)
+    release = threading.Event()
+    finished = threading.Event()
+
+    def slow_fetch_html(url, timeout):
+        release.wait(5)
+        finished.set()
+        return f'<html>{url}</html>'
+
+    monkeypatch.setattr(article_fetcher, '_fetch_html', slow_fetch_html)
+    slow = {'name': 'Slow', 'url': 'http://slow.example/page', 'category': 'World', 'trust_score': 7.0}
+    storage.save_sources([slow], db_path=path)
+    try:
+        assert article_fetcher.fetch_articles([slow], max_articles=5, deadline=0.2) == []
+    finally:
+        release.set()
+        # Let the abandoned download finish before the fakes are undone
+        finished.wait(5)
+    row = storage.get_source_health([slow['url']], db_path=path)[slow['url']]
+    assert (row['polls'], row['failures'], row['timeouts']) == (1, 1, 1)
+    # A result that arrives after the flush is not counted a second time
+    recorder = source_health.HealthRecorder()
+    recorder.started(slow['url'])
+    recorder.flush(path)
+    recorder.poll(slow['url'], 1.0, 1)
+    assert recorder.flush(path) == []
+
+def test_trust_score_starts_at_the_default_and_follows_observations():
+    assert source_health.trust_score(None) == source_health.DEFAULT_TRUST_SCORE
+    row = source_health._new_row('http://feed.example/rss')
+    good = bad = row
+    for i in range(10):
+        good = source_health.fold(good, [(0.2, 5, None)], [(0.1, True)], [True], now=i)
+        bad = source_health.fold(bad, [(2.0, 0, requests.Timeout())], [], [], now=i)
+    assert source_health.trust_score(good) > source_health.DEFAULT_TRUST_SCORE > source_health.trust_score(bad)
+    assert bad['timeouts'] == 10 and bad['timeout_rate'] > 0.9
+    # The backoff doubles with every failure but never exceeds BREAKER_MAX
+    assert bad['open_until'] == 9 + source_health.BREAKER_MAX
@@ -0,0 +1,106 @@
+import time
+import threading
+import pytest
+from agents import source_scout
+from db import storage
+
+SEARCH_RESULTS = {
+    'Cricket': ['https://cricket-a.example', 'https://cricket-b.example', 'https://slow.example'],
+    'Golf': ['https://golf-empty.example'],
+    'Sports': ['https://sports.example'],
+}
+
+def fake_search(query, max_results=10):
+    return SEARCH_RESULTS.get(query, [])[:max_results]
+
+@pytest.fixture
+def fake_find_feeds(monkeypatch, tmp_path):
+    """
+    Feed discovery where slow.example only answers once the test is over. Its workers
+    are released and joined before storage.DB_PATH is restored, so they never write
+    to the real database.
+    """
+    monkeypatch.setattr(storage, 'DB_PATH', str(tmp_path / 'scout.db'))
+    release = threading.Event()
+    workers = []
+
+    def find_feeds(url):
+        if 'slow' in url:
+            workers.append(threading.current_thread())
+            release.wait(10)
+            return [url + '/rss']
+        if 'empty' in url:
+            return []
+        return [url + '/rss', url + '/rss']
+
+    yield find_feeds
+    release.set()
+    for worker in workers:
+        worker.join(10)
+
+def setup_fakes(monkeypatch, fake_find_feeds):
+    monkeypatch.setattr(source_scout, 'scout_sources_for_topic', fake_search)
+    monkeypatch.setattr(source_scout, 'find_feeds', fake_find_feeds)
+
+def test_scout_topics_streams_in_parallel_with_group_fallback(monkeypatch, fake_find_feeds):
+    setup_fakes(monkeypatch, fake_find_feeds)
+    start = time.monotonic()
+    sources = list(source_scout.scout_topics(['Cricket', 'Golf'], {'Cricket': 'Sports', 'Golf': 'Sports'}, deadline=0.5))
+    # The slow site is abandoned at the global deadline instead of blocking the rest
+    assert time.monotonic() - start < 1.5
+    by_url = {s['url']: s for s in sources}
+    assert set(by_url) == {'https://cricket-a.example/rss', 'https://cricket-b.example/rss', 'https://sports.example/rss'}
+    assert by_url['https://cricket-a.example/rss']['category'] == 'Cricket'
+    assert 'filter_topic' not in by_url['https://cricket-a.example/rss']
+    # Golf had no feeds of its own, so it falls back to general Sports feeds filtered by topic
+    assert by_url['https://sports.example/rss']['category'] == 'Sports'
+    assert by_url['https://sports.example/rss']['filter_topic'] == 'Golf'
+
+def test_scout_and_vet_sources_wraps_the_engine(monkeypatch, fake_find_feeds):
+    setup_fakes(monkeypatch, fake_find_feeds)
+    sources = source_scout.scout_and_vet_sources('Golf', 'Sports')
+    assert [s['url'] for s in sources] == ['https://sports.example/rss']
+    assert source_scout.scout_and_vet_sources('Golf') == []
+
+class FakeGoogleSearch:
+    calls = 0
+
+    def __init__(self, params):
+        self.params = params
+
+    def get_dict(self):
+        FakeGoogleSearch.calls += 1
+        if self.params['q'].startswith('Cricket'):
+            return {'organic_results': [{'link': url} for url in SEARCH_RESULTS['Cricket']]}
+        return {'organic_results': []}
+
+def test_repeat_scouting_is_served_from_cache(monkeypatch, fake_find_feeds):
+    monkeypatch.setattr(source_scout, 'SERPAPI_KEY', 'test-key')
+    monkeypatch.setattr(source_scout, 'GoogleSearch', FakeGoogleSearch)
+    crawled = []
+
+    def counting_find_feeds(url):
+        crawled.append(url)
+        return fake_find_feeds(url)
+
+    monkeypatch.setattr(source_scout, 'find_feeds', counting_find_feeds)
+    FakeGoogleSearch.calls = 0
+    first = list(source_scout.scout_topics(['Cricket'], {}, deadline=0.5))
+    assert FakeGoogleSearch.calls == 1
+    assert len(crawled) == 3
+
+    # The slow site timed out and is negatively cached, so the repeat run never waits on it
+    monkeypatch.setattr(source_scout, 'SERPAPI_KEY', None)
+    start = time.monotonic()
+    second = list(source_scout.scout_topics(['Cricket'], {}, deadline=0.5))
+    assert time.monotonic() - start < 0.3
+    assert FakeGoogleSearch.calls == 1
+    assert len(crawled) == 3
+    assert sorted(s['url'] for s in second) == sorted(s['url'] for s in first)
+
+def test_negative_entries_use_short_ttl(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, 'DB_PATH', str(tmp_path / 'scout.db'))
+    source_scout.cache_put('feeds', 'https://dead.example', [], ok=False, ttl=-1)
+    assert source_scout.cache_get('feeds', 'https://dead.example') is None
+    source_scout.cache_put('feeds', 'https://dead.example', [], ok=False)
+    assert source_scout.cache_get('feeds', 'https://dead.example') == ([], False)
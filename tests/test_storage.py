@@ -0,0 +1,112 @@
+import sqlite3
+import pytest
+from db import storage
+
+def make_legacy_db(path):
+    # A database created by the original schema.sql, with duplicate article rows
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE sources (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, url TEXT UNIQUE, category TEXT, trust_score REAL, user_added BOOLEAN DEFAULT 0);
+        CREATE TABLE articles (id INTEGER PRIMARY KEY AUTOINCREMENT, source_id INTEGER, title TEXT, url TEXT, image_url TEXT,
+            published_at TEXT, raw_text TEXT, summary TEXT, language TEXT, tags TEXT);
+        INSERT INTO sources (name, url, category, trust_score) VALUES ('Src', 'http://src.example/rss', 'World', 8.0);
+    ''')
+    for title in ('old copy', 'new copy'):
+        conn.execute('INSERT INTO articles (source_id, title, url) VALUES (1, ?, ?)', (title, 'http://src.example/a'))
+    conn.commit()
+    conn.close()
+
+def test_migrations_dedupe_and_index_legacy_database(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    make_legacy_db(path)
+    legacy = sqlite3.connect(path)
+    text = 'Health officials confirmed a sharp rise in dengue cases across the coastal provinces this week.'
+    legacy.executemany('INSERT INTO articles (source_id, title, url, raw_text, summary) VALUES (1, ?, ?, ?, ?)', [
+        ('summarized', 'http://src.example/b', text, 'A real summary'),
+        ('failed', 'http://src.example/c', text, '[Summary unavailable: timed out]'),
+        ('failed without text', 'http://src.example/d', None, '[Summary unavailable: timed out]')])
+    legacy.commit()
+    legacy.close()
+    conn = storage.get_connection(path)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(storage.MIGRATIONS)
+    rows = conn.execute('SELECT title, summary, summary_tier FROM articles ORDER BY id').fetchall()
+    assert [tuple(r) for r in rows] == [('new copy', None, None), ('summarized', 'A real summary', 'llm'),
+                                        ('failed', text, 'local'), ('failed without text', None, 'local')]
+    indexes = {r['name'] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'idx_articles_url', 'idx_articles_feed', 'idx_articles_source_id', 'idx_summary_cache_last_used',
+            'idx_extraction_cache_fetched', 'idx_thumbnails_last_used'} <= indexes
+    # Reused, not reopened
+    assert storage.get_connection(path) is conn
+
+def test_failed_migration_rolls_back_whole(monkeypatch, tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    make_legacy_db(path)
+    legacy = sqlite3.connect(path)
+    legacy.execute("INSERT INTO articles (source_id, title, url, raw_text, summary) VALUES "
+                   "(1, 'failed', 'http://src.example/b', 'Some text', '[Summary unavailable: timed out]')")
+    legacy.commit()
+    legacy.close()
+
+    def broken_summarize(text):
+        raise RuntimeError('summarizer broke')
+
+    # Migration 8 adds summary_tier, then fails while re-summarizing stored error strings
+    monkeypatch.setattr(storage.extractive, 'summarize', broken_summarize)
+    with pytest.raises(RuntimeError):
+        storage.get_connection(path)
+    check = sqlite3.connect(path)
+    assert check.execute('PRAGMA user_version').fetchone()[0] == 7
+    assert 'summary_tier' not in {r[1] for r in check.execute('PRAGMA table_info(articles)')}
+    check.close()
+
+    monkeypatch.undo()
+    conn = storage.get_connection(path)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(storage.MIGRATIONS)
+    assert conn.execute("SELECT summary_tier FROM articles WHERE title = 'failed'").fetchone()[0] == 'local'
+
+def test_save_articles_bulk_upsert(tmp_path):
+    path = str(tmp_path / 'new.db')
+    storage.save_sources([{'name': 'Src', 'url': 'http://src.example/rss', 'category': 'World', 'trust_score': 8.0}], db_path=path)
+    articles = [{'title': f'T{i}', 'url': f'http://src.example/{i}', 'source_name': 'Src', 'raw_text': 'x',
+                 'summary': 's', 'published': '2025-01-06T10:00:00Z', 'tags': ['World']} for i in range(500)]
+    articles.append({'title': 'Orphan', 'url': 'http://other.example/1', 'source_name': 'Unknown'})
+    conn = storage.get_connection(path)
+    assert storage.save_articles(articles, db_path=path) == 500
+    assert conn.execute('SELECT COUNT(*) FROM articles').fetchone()[0] == 500
+    # Re-fetching the same URLs updates in place instead of duplicating
+    articles[0]['summary'] = 'updated'
+    storage.save_articles(articles[:10], db_path=path)
+    assert conn.execute('SELECT COUNT(*) FROM articles').fetchone()[0] == 500
+    assert conn.execute("SELECT summary FROM articles WHERE url = 'http://src.example/0'").fetchone()[0] == 'updated'
+    assert storage.save_sources([{'name': 'Src', 'url': 'http://src.example/rss', 'category': 'World', 'trust_score': 8.0}], db_path=path) == 0
+
+def test_feed_page_keyset_pagination_and_filters(tmp_path):
+    path = str(tmp_path / 'feed.db')
+    storage.save_sources([
+        {'name': 'World Src', 'url': 'http://w.example/rss', 'category': 'World', 'trust_score': 8.0},
+        {'name': 'Tech Src', 'url': 'http://t.example/rss', 'category': 'Tech', 'trust_score': 7.0},
+    ], db_path=path)
+    articles = []
+    for i in range(25):
+        src = 'World Src' if i % 2 else 'Tech Src'
+        # Pairs of articles share a timestamp so the id tie-breaker matters
+        articles.append({'title': f'T{i}', 'url': f'http://x.example/{i}', 'source_name': src,
+                         'published': f'2025-01-{1 + i // 2:02d}T00:00:00Z', 'summary': 's'})
+    storage.save_articles(articles, db_path=path)
+
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = storage.feed_page(cursor=cursor, limit=10, db_path=path)
+        seen.extend(r['title'] for r in rows)
+        if cursor is None:
+            break
+    assert seen == [f'T{i}' for i in reversed(range(25))]
+
+    rows, cursor = storage.feed_page(limit=50, categories=['World'], date_from='2025-01-03', date_to='2025-01-05', db_path=path)
+    assert [r['title'] for r in rows] == ['T7', 'T5']
+    assert cursor is None
+    world_id = storage.list_sources(path)[1]['id']
+    rows, _ = storage.feed_page(limit=3, source_ids=[world_id], db_path=path)
+    assert [r['source_name'] for r in rows] == ['World Src'] * 3
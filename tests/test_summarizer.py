@@ -0,0 +1,37 @@
+from agents import summarizer
+
+def test_summary_cache_skips_network_on_hit(monkeypatch, tmp_path):
+    db_path = str(tmp_path / 'cache.db')
+    calls = []
+
+    def fake_request(prompt, model=summarizer.MODEL):
+        calls.append(prompt)
+        return f'Summary #{len(calls)}'
+
+    monkeypatch.setattr(summarizer, 'request_summary', fake_request)
+    text = 'A wire story syndicated by several outlets. ' * 200
+    assert summarizer.summarize_article(text, db_path=db_path) == 'Summary #1'
+    # Same truncated text (anything past the 4000 char limit is ignored) is a hit
+    assert summarizer.summarize_article(text + 'extra tail', db_path=db_path) == 'Summary #1'
+    assert len(calls) == 1
+    # A different model is a different cache entry
+    assert summarizer.summarize_article(text, model='gpt-4o-mini', db_path=db_path) == 'Summary #2'
+    stats = summarizer.summary_cache_stats(db_path)
+    assert stats == {'hits': 1, 'misses': 2, 'entries': 2}
+
+def test_summary_cache_evicts_least_recently_used(monkeypatch, tmp_path):
+    db_path = str(tmp_path / 'cache.db')
+    for i in range(4):
+        summarizer.store_summary(f'key{i}', f'summary {i}', db_path=db_path, max_entries=3)
+    assert summarizer.get_cached_summary('key0', db_path) is None
+    assert summarizer.get_cached_summary('key3', db_path) == 'summary 3'
+
+def test_failed_summaries_are_not_cached(monkeypatch, tmp_path):
+    db_path = str(tmp_path / 'cache.db')
+
+    def failing_request(prompt, model=summarizer.MODEL):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(summarizer, 'request_summary', failing_request)
+    assert summarizer.summarize_article('text', db_path=db_path).startswith('[Summary unavailable')
+    assert summarizer.summary_cache_stats(db_path)['entries'] == 0
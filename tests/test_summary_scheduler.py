@@ -0,0 +1,61 @@
+import json
+import openai
+from agents import summarizer
+from agents import summary_scheduler
+
+def fake_openai(http_server, failures):
+    """
+    Local OpenAI-compatible chat endpoint. The first `failures` requests get the
+    listed status codes, after that each request is answered with a summary that
+    echoes the start of the article text.
+    """
+    seen = []
+
+    def handler(req):
+        body = json.loads(req.rfile.read(int(req.headers['Content-Length'])))
+        prompt = body['messages'][0]['content']
+        seen.append(prompt)
+        if failures:
+            status = failures.pop(0)
+            return status, {'Content-Type': 'application/json'}, json.dumps({'error': {'message': f'status {status}', 'type': 'server_error'}}).encode()
+        text = prompt.split('\n\n', 1)[1].strip()
+        payload = {'id': 'x', 'object': 'chat.completion', 'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': f'Summary of {text[:12]}'}}]}
+        return 200, {'Content-Type': 'application/json'}, json.dumps(payload).encode()
+
+    return http_server(handler) + '/v1', seen
+
+def test_retries_rate_limits_and_server_errors(http_server, monkeypatch, tmp_path):
+    api_base, seen = fake_openai(http_server, [429, 503])
+    monkeypatch.setattr(openai, 'api_base', api_base)
+    articles = [{'raw_text': 'Article one body'}]
+    summaries = summary_scheduler.summarize_batch(articles, backoff_base=0.01, db_path=str(tmp_path / 'c.db'))
+    assert summaries == ['Summary of Article one']
+    assert len(seen) == 3
+
+def test_gives_up_on_client_errors(http_server, monkeypatch, tmp_path):
+    api_base, seen = fake_openai(http_server, [400])
+    monkeypatch.setattr(openai, 'api_base', api_base)
+    summaries = summary_scheduler.summarize_batch([{'raw_text': 'Bad request body'}], backoff_base=0.01, db_path=str(tmp_path / 'c.db'))
+    assert summaries[0].startswith('[Summary unavailable')
+    assert len(seen) == 1
+
+def test_priority_order_and_result_alignment(http_server, monkeypatch, tmp_path):
+    api_base, seen = fake_openai(http_server, [])
+    monkeypatch.setattr(openai, 'api_base', api_base)
+    articles = [
+        {'raw_text': 'Low trust old', 'trust_score': 5.0, 'published': '2025-01-01T00:00:00Z'},
+        {'raw_text': 'High trust old', 'trust_score': 9.0, 'published': '2025-01-01T00:00:00Z'},
+        {'raw_text': 'High trust new', 'trust_score': 9.0, 'published': 'Tue, 07 Jan 2025 10:00:00 GMT'},
+    ]
+    summaries = summary_scheduler.summarize_batch(articles, max_workers=1, db_path=str(tmp_path / 'c.db'))
+    assert summaries == ['Summary of Low trust ol', 'Summary of High trust o', 'Summary of High trust n']
+    assert [p.split('\n\n', 1)[1].strip() for p in seen] == ['High trust new', 'High trust old', 'Low trust old']
+
+def test_rate_limiter_blocks_when_budget_spent():
+    limiter = summary_scheduler.RateLimiter(requests_per_minute=600, tokens_per_minute=100000)
+    limiter._requests = 0
+    import time
+    start = time.monotonic()
+    limiter.acquire(10)
+    # One request refills every 0.1 s at 600 requests per minute
+    assert time.monotonic() - start >= 0.08
@@ -0,0 +1,88 @@
+import time
+from agents import summarizer, summary_scheduler
+from db import storage
+from utils import extractive
+
+ARTICLE = '''By Staff Reporter
+Health officials confirmed a sharp rise in dengue cases across the coastal provinces this week.
+The weather was mild on Tuesday, according to residents.
+Hospitals in the coastal provinces reported that dengue admissions doubled compared with last month.
+Read more
+Officials urged residents to remove standing water, where dengue mosquitoes breed.'''
+
+def test_local_summary_keeps_key_sentences_in_order():
+    started = time.perf_counter()
+    summary = extractive.summarize(ARTICLE, max_sentences=2)
+    assert time.perf_counter() - started < 0.05
+    assert summary == ('Health officials confirmed a sharp rise in dengue cases across the coastal provinces this week. '
+                       'Hospitals in the coastal provinces reported that dengue admissions doubled compared with last month.')
+    assert len(extractive.summarize(ARTICLE, max_chars=80)) <= 80
+    assert extractive.summarize('') == ''
+    assert extractive.summarize('Breaking news') == 'Breaking news'
+
+def test_tier_policy_and_offline_fallback(monkeypatch):
+    requested = []
+
+    def fake_summarize(self, text, template=None):
+        requested.append(text)
+        return '[Summary unavailable: timed out]' if 'fail' in text else 'LLM summary'
+
+    monkeypatch.setattr(summary_scheduler.SummaryScheduler, 'summarize', fake_summarize)
+    articles = [{'raw_text': ARTICLE, 'trust_score': 9.0}, {'raw_text': ARTICLE, 'trust_score': 5.0},
+                {'raw_text': ARTICLE + ' fail', 'trust_score': 9.0}]
+    scheduler = summary_scheduler.SummaryScheduler(use_cache=False)
+    monkeypatch.setattr(summarizer, 'llm_available', lambda: False)
+    assert [scheduler.summarize_tiered(a)[1] for a in articles] == ['local'] * 3
+    assert requested == []
+
+    monkeypatch.setattr(summarizer, 'llm_available', lambda: True)
+    results = [scheduler.summarize_tiered(a) for a in articles]
+    assert [tier for _, tier in results] == ['llm', 'local', 'local']
+    assert results[0][0] == 'LLM summary'
+    # A failed request never surfaces as the summary
+    assert results[2][0] == extractive.summarize(ARTICLE + ' fail')
+    assert len(requested) == 2
+
+def test_viewed_local_summaries_are_upgraded(monkeypatch, tmp_path):
+    path = str(tmp_path / 'tiers.db')
+    storage.save_sources([{'name': 'Src', 'url': 'http://src.example/rss', 'category': 'Health', 'trust_score': 5.0}], db_path=path)
+    storage.save_articles([
+        {'title': 'Local', 'url': 'http://src.example/1', 'source_name': 'Src', 'raw_text': ARTICLE,
+         'summary': extractive.summarize(ARTICLE), 'summary_tier': 'local'},
+        {'title': 'Copy', 'url': 'http://src.example/2', 'source_name': 'Src', 'raw_text': ARTICLE,
+         'summary': extractive.summarize(ARTICLE), 'summary_tier': 'local', 'cluster_url': 'http://src.example/1'},
+        {'title': 'LLM', 'url': 'http://src.example/3', 'source_name': 'Src', 'raw_text': ARTICLE,
+         'summary': 'Written by the LLM', 'summary_tier': 'llm'},
+    ], db_path=path)
+    monkeypatch.setattr(summary_scheduler, 'summarize_batch', lambda articles, **kwargs: ['Upgraded'] * len(articles))
+    monkeypatch.setattr(summarizer, 'llm_available', lambda: True)
+    rows = storage.feed_rows([1, 3], db_path=path)
+    generation = storage.data_generation(db_path=path)
+    summary_scheduler.upgrade_in_background([r['id'] for r in rows if r['summary_tier'] == 'local'], db_path=path).join()
+
+    conn = storage.get_connection(path)
+    stored = conn.execute('SELECT title, summary, summary_tier FROM articles ORDER BY id').fetchall()
+    assert [tuple(r) for r in stored] == [('Local', 'Upgraded', 'llm'), ('Copy', 'Upgraded', 'llm'),
+                                          ('LLM', 'Written by the LLM', 'llm')]
+    assert storage.data_generation(db_path=path) == generation + 1
+    assert summary_scheduler.upgrade_summaries([1, 2, 3], db_path=path) == 0
+
+def test_failed_upgrades_are_not_retried_on_every_view(monkeypatch, tmp_path):
+    path = str(tmp_path / 'tiers.db')
+    storage.save_sources([{'name': 'Src', 'url': 'http://src.example/rss', 'category': 'Health', 'trust_score': None}], db_path=path)
+    storage.save_articles([{'title': 'Local', 'url': 'http://src.example/1', 'source_name': 'Src', 'raw_text': ARTICLE,
+                            'summary': extractive.summarize(ARTICLE), 'summary_tier': 'local'}], db_path=path)
+    requests = []
+    monkeypatch.setattr(summary_scheduler, '_upgrade_failed', {})
+    monkeypatch.setattr(summary_scheduler, 'summarize_batch',
+                        lambda articles, **kwargs: requests.append(len(articles)) or [summarizer.failed_summary('down')])
+    monkeypatch.setattr(summarizer, 'llm_available', lambda: True)
+    summary_scheduler.upgrade_in_background([1], db_path=path).join()
+    assert summary_scheduler.upgrade_in_background([1], db_path=path) is None
+    assert requests == [1]
+    monkeypatch.setattr(summary_scheduler, 'UPGRADE_RETRY_AFTER', 0)
+    summary_scheduler.upgrade_in_background([1], db_path=path).join()
+    assert requests == [1, 1]
+    # Unscored sources are judged at the default score, below the bar for LLM summaries at ingest
+    assert not summary_scheduler.wants_llm({'trust_score': None})
+    assert summary_scheduler.wants_llm({'trust_score': summary_scheduler.LLM_MIN_TRUST})
@@ -0,0 +1,68 @@
+import io
+import os
+from PIL import Image
+from db import storage
+from utils import thumbnails
+
+def image_bytes(size=(800, 600), color=(200, 30, 30), fmt='JPEG', mode='RGB'):
+    out = io.BytesIO()
+    Image.new(mode, size, color).save(out, fmt)
+    return out.getvalue()
+
+def setup(monkeypatch, tmp_path, images):
+    downloads = []
+
+    def fake_download(url, timeout):
+        downloads.append(url)
+        if isinstance(images[url], Exception):
+            raise images[url]
+        return images[url]
+
+    monkeypatch.setattr(thumbnails, '_download', fake_download)
+    return downloads, str(tmp_path / 'thumbs.db'), str(tmp_path / 'thumbs')
+
+def test_images_are_thumbnailed_once_and_shared_by_content(monkeypatch, tmp_path):
+    big = image_bytes()
+    images = {'http://a.example/1.jpg': big, 'http://b.example/copy.jpg': big,
+              'http://c.example/logo.png': image_bytes((300, 300), (0, 0, 0, 0), 'PNG', 'RGBA')}
+    downloads, db, folder = setup(monkeypatch, tmp_path, images)
+    assert thumbnails.cache_thumbnails(list(images), db_path=db, thumbnail_dir=folder) == 3
+    assert thumbnails.cache_thumbnails(list(images), db_path=db, thumbnail_dir=folder) == 0
+    assert sorted(downloads) == sorted(images)
+    found = thumbnails.load_thumbnails(list(images), db_path=db, thumbnail_dir=folder)
+    assert found['http://a.example/1.jpg'] == found['http://b.example/copy.jpg']
+    # One file per distinct thumbnail
+    assert sum(len(files) for _, _, files in os.walk(folder)) == 2
+    thumb = Image.open(io.BytesIO(found['http://a.example/1.jpg']))
+    assert thumb.format == 'JPEG' and thumb.size == (120, 90)
+    assert len(found['http://a.example/1.jpg']) < len(big)
+    # Transparent images are flattened onto white
+    assert Image.open(io.BytesIO(found['http://c.example/logo.png'])).getpixel((60, 60))[0] > 240
+
+def test_failed_images_are_not_retried_and_render_the_placeholder(monkeypatch, tmp_path):
+    images = {'http://a.example/broken.jpg': OSError('connection refused'), 'http://a.example/junk.jpg': b'not an image'}
+    downloads, db, folder = setup(monkeypatch, tmp_path, images)
+    assert thumbnails.cache_thumbnails(list(images), db_path=db, thumbnail_dir=folder) == 0
+    thumbnails.cache_thumbnails(list(images), db_path=db, thumbnail_dir=folder)
+    assert len(downloads) == 2
+    found = thumbnails.load_thumbnails(list(images) + [None], db_path=db, thumbnail_dir=folder)
+    assert found == {}
+    assert thumbnails.thumbnail_for('http://a.example/broken.jpg', found) == thumbnails.placeholder_bytes()
+    assert thumbnails.thumbnail_for(None, found).startswith(b'\x89PNG')
+
+def test_least_recently_used_thumbnails_are_evicted(monkeypatch, tmp_path):
+    images = {f'http://a.example/{i}.jpg': image_bytes(color=(i * 40, 90, 90)) for i in range(4)}
+    downloads, db, folder = setup(monkeypatch, tmp_path, images)
+    urls = list(images)
+    thumbnails.cache_thumbnails(urls[:3], db_path=db, thumbnail_dir=folder)
+    # Articles ingested again with 1 and 2 leave 0 as the least recently used; room for three thumbnails only
+    thumbnails.cache_thumbnails(urls[1:3], db_path=db, thumbnail_dir=folder)
+    conn = storage.get_connection(db)
+    used = conn.execute('SELECT digest, last_used_at FROM thumbnails').fetchall()
+    sizes = {u: len(t) for u, t in thumbnails.load_thumbnails(urls[1:3], db_path=db, thumbnail_dir=folder).items()}
+    # Rendering is read-only
+    assert conn.execute('SELECT digest, last_used_at FROM thumbnails').fetchall() == used
+    limit = sum(sizes.values()) + max(sizes.values()) + 100
+    thumbnails.cache_thumbnails(urls[3:], db_path=db, thumbnail_dir=folder, max_bytes=limit)
+    found = thumbnails.load_thumbnails(urls, db_path=db, thumbnail_dir=folder)
+    assert sorted(found) == urls[1:]
@@ -0,0 +1,59 @@
+from agents import article_fetcher
+from db import storage
+from utils.topic_matcher import TopicMatcher, compile_matcher
+
+def test_matches_synonyms_on_word_boundaries():
+    matcher = TopicMatcher(['Artificial Intelligence', 'COVID-19', 'Cricket'])
+    assert matcher.topics_in('New AI model beats doctors at spotting coronavirus cases') == ['Artificial Intelligence', 'COVID-19']
+    # No substring hits: "said" does not contain the acronym AI as a word, "cricketer" is not "cricket"
+    assert matcher.search('The minister said the plan was sound') is None
+    assert matcher.search('A cricketer retired today') is None
+    assert matcher.search('IPL auction breaks records') == 'Cricket'
+
+def test_acronyms_are_case_sensitive():
+    matcher = TopicMatcher(['Multiple Sclerosis'])
+    assert matcher.search('New MS treatment approved') == 'Multiple Sclerosis'
+    assert matcher.search('Results are in ms, not seconds') is None
+
+def test_compile_matcher_is_cached_and_ignores_empty_topics():
+    assert compile_matcher([]) is None
+    assert compile_matcher([None]) is None
+    assert compile_matcher(['Tennis', None]) is compile_matcher(['Tennis'])
+
+def test_hybrid_sources_rejected_before_download(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, 'DB_PATH', str(tmp_path / 'fetch.db'))
+    downloaded = []
+
+    class FakeArticle:
+        def __init__(self, url, **kwargs):
+            self.url, self.title, self.text, self.top_image = url, 'Title', 'Text', ''
+
+        def download(self, input_html=None):
+            pass
+
+        def parse(self):
+            pass
+
+    def fake_parse_rss(url, limit=None, match=None, **kwargs):
+        entries = [{'title': 'Insulin prices fall', 'link': 'http://health.example/1', 'summary': ''},
+                   {'title': 'Hospital opens new wing', 'link': 'http://health.example/2', 'summary': ''},
+                   {'title': 'Chemotherapy trial', 'link': 'http://health.example/3', 'summary': 'A cancer study'}]
+        return [e for e in entries if match is None or match(e)][:limit]
+
+    monkeypatch.setattr(article_fetcher, 'Article', FakeArticle)
+    monkeypatch.setattr(article_fetcher, '_fetch_html', lambda url, timeout: downloaded.append(url))
+    monkeypatch.setattr(article_fetcher, 'parse_rss', fake_parse_rss)
+    source = {'name': 'Health', 'url': 'http://health.example/rss', 'filter_topic': 'Diabetes'}
+    articles = article_fetcher.fetch_articles([source], topics=['Cancer'])
+    assert downloaded == ['http://health.example/1', 'http://health.example/3']
+    assert [a['tags'] for a in articles] == [['Diabetes'], ['Cancer']]
+
+def test_filter_topic_and_tags_are_stored(tmp_path):
+    path = str(tmp_path / 'topics.db')
+    storage.save_sources([{'name': 'Health', 'url': 'http://health.example/rss', 'category': 'Health',
+                           'trust_score': 7.0, 'filter_topic': 'Diabetes'}], db_path=path)
+    assert storage.list_sources(path)[0]['filter_topic'] == 'Diabetes'
+    storage.save_articles([{'title': 'Insulin', 'url': 'http://health.example/1', 'source_name': 'Health',
+                            'summary': 's', 'tags': ['Diabetes', 'Nutrition']}], db_path=path)
+    row = storage.get_connection(path).execute('SELECT tags FROM articles').fetchone()
+    assert row['tags'] == 'Diabetes,Nutrition'
@@ -0,0 +1,50 @@
+from agents import translator
+from db import storage
+
+class FakeBackend:
+    def __init__(self):
+        self.calls = []
+
+    def translate_batch(self, texts, dest):
+        self.calls.append((list(texts), dest))
+        return [f'[{dest}] {t}' for t in texts]
+
+def setup(monkeypatch, tmp_path, n=3):
+    backend = FakeBackend()
+    monkeypatch.setattr(translator, '_backend', backend)
+    path = str(tmp_path / 'translate.db')
+    storage.save_sources([{'name': 'S', 'url': 'http://s.example/rss', 'category': 'World', 'trust_score': 8.0}], db_path=path)
+    storage.save_articles([{'title': f'T{i}', 'url': f'http://s.example/{i}', 'source_name': 'S', 'summary': f'Summary {i}'}
+                           for i in range(n)], db_path=path)
+    rows, _ = storage.feed_page(limit=n, db_path=path)
+    return backend, path, rows
+
+def test_translations_are_batched_and_stored(monkeypatch, tmp_path):
+    backend, path, rows = setup(monkeypatch, tmp_path, n=45)
+    first = translator.translate_articles(rows[:5], 'Spanish', db_path=path)
+    assert first[rows[0]['id']] == f"[es] {rows[0]['summary']}"
+    assert len(backend.calls) == 1
+    # The second view of the page is served from the table; only new rows are translated
+    again = translator.translate_articles(rows[:7], 'Spanish', db_path=path)
+    assert again == {**first, **{r['id']: f"[es] {r['summary']}" for r in rows[5:7]}}
+    assert [len(texts) for texts, _ in backend.calls] == [5, 2]
+    translator.translate_articles(rows, 'Spanish', db_path=path)
+    assert [len(texts) for texts, _ in backend.calls][2:] == [translator.BATCH_SIZE, 38 - translator.BATCH_SIZE]
+
+def test_english_needs_no_backend(monkeypatch, tmp_path):
+    backend, path, rows = setup(monkeypatch, tmp_path)
+    assert translator.translate_articles(rows, 'English', db_path=path) == {r['id']: r['summary'] for r in rows}
+    assert backend.calls == []
+
+def test_new_summary_invalidates_translation(monkeypatch, tmp_path):
+    backend, path, rows = setup(monkeypatch, tmp_path, n=1)
+    translator.translate_articles(rows, 'Hindi', db_path=path)
+    storage.save_articles([{'title': 'T0', 'url': 'http://s.example/0', 'source_name': 'S', 'summary': 'Better summary'}], db_path=path)
+    rows, _ = storage.feed_page(db_path=path)
+    assert translator.translate_articles(rows, 'Hindi', db_path=path) == {rows[0]['id']: '[hi] Better summary'}
+
+def test_backend_failure_falls_back_to_original(monkeypatch, tmp_path):
+    backend, path, rows = setup(monkeypatch, tmp_path, n=1)
+    backend.translate_batch = lambda texts, dest: 1 / 0
+    assert translator.translate_articles(rows, 'French', db_path=path) == {rows[0]['id']: rows[0]['summary']}
+    assert storage.get_translations([rows[0]['id']], 'fr', db_path=path) == {}
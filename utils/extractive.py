@@ -0,0 +1,72 @@
+"""
+Local extractive summaries: an article's most informative sentences, picked by TF-IDF
+and kept in their original order. Runs in-process in milliseconds, with no network.
+
+Each sentence is scored by the article-wide weight (term frequency x inverse sentence
+frequency) of the distinct words it contains, normalised for length, with a bonus for
+sentences near the top, where news stories put the key facts.
+"""
+import re
+import math
+from collections import Counter
+
+MAX_SENTENCES = 3
+MAX_CHARS = 600
+MAX_INPUT_CHARS = 20000
+# Shorter sentences (bylines, captions, "Read more") are never picked
+MIN_SENTENCE_WORDS = 6
+LEAD_BONUS = 0.5
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])["”\')\]]*\s+(?=["“\'(]?[A-Z0-9])')
+_WORD_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)?", re.UNICODE)
+STOPWORDS = frozenset('''
+    a about after again against all also an and any are as at be because been before being between both but by
+    can could did do does doing down during each few for from further had has have having he her here hers him
+    his how i if in into is it its itself just me more most my no nor not now of off on once only or other our
+    out over own said same she should so some such than that the their them then there these they this those
+    through to too under until up very was we were what when where which while who whom why will with would
+    you your says say told year years new
+'''.split())
+
+def split_sentences(text):
+    sentences = []
+    for paragraph in (text or '').splitlines():
+        sentences.extend(s.strip() for s in _SENTENCE_END_RE.split(paragraph) if s.strip())
+    return sentences
+
+def _terms(sentence):
+    return [w for w in _WORD_RE.findall(sentence.lower()) if w not in STOPWORDS and not w.isdigit()]
+
+def summarize(text, max_sentences=MAX_SENTENCES, max_chars=MAX_CHARS) -> str:
+    """
+    Up to `max_sentences` of the highest-scoring sentences of `text`, in article order
+    and at most `max_chars` long. Empty for empty text.
+    """
+    sentences = split_sentences((text or '')[:MAX_INPUT_CHARS])
+    if not sentences:
+        return ''
+    terms = [_terms(s) for s in sentences]
+    count = len(sentences)
+    frequency = Counter(w for ws in terms for w in ws)
+    spread = Counter(w for ws in terms for w in set(ws))
+    weight = {w: frequency[w] * math.log((1 + count) / spread[w]) for w in frequency}
+    scores = []
+    for i, ws in enumerate(terms):
+        if len(sentences[i].split()) < MIN_SENTENCE_WORDS:
+            scores.append(-1.0)
+            continue
+        distinct = set(ws)
+        score = sum(weight[w] for w in distinct) / math.sqrt(len(distinct) or 1)
+        scores.append(score * (1 + LEAD_BONUS / (1 + i)))
+    best = sorted(range(count), key=lambda i: (-scores[i], i))[:max_sentences]
+    # Fragments only make it in when the text has nothing else
+    best = [i for i in best if scores[i] >= 0] or best[:1]
+    picked = []
+    length = 0
+    for i in sorted(best):
+        if picked and length + len(sentences[i]) + 1 > max_chars:
+            break
+        picked.append(sentences[i])
+        length += len(sentences[i]) + 1
+    summary = ' '.join(picked)
+    return summary if len(summary) <= max_chars else summary[:max_chars - 1].rstrip() + '…'
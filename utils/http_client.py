@@ -0,0 +1,137 @@
+"""
+One pooled HTTP client for everything Clearfeed downloads: feeds, feed discovery,
+article pages and images.
+
+A single requests.Session keeps connections alive per host (so repeat requests to a
+host skip the DNS lookup and TCP/TLS handshake), negotiates gzip, retries idempotent
+GETs on connection errors and 5xx responses, and every body read through it is capped.
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+from utils.logger import count, source_label
+
+USER_AGENT = 'Mozilla/5.0 (compatible; Clearfeed/1.0)'
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 15
+CHUNK_SIZE = 64 * 1024
+MAX_RESPONSE_BYTES = 5 * 1024 * 1024
+# Hosts with a pool kept open, and connections kept per host
+POOL_HOSTS = 64
+POOL_PER_HOST = 8
+RETRIES = 2
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = (500, 502, 503, 504)
+
+HTTP_REQUESTS = 'clearfeed_http_requests_total'
+HTTP_BYTES = 'clearfeed_http_bytes_total'
+HTTP_TOO_LARGE = 'clearfeed_http_too_large_total'
+
+class ResponseTooLarge(requests.RequestException):
+    pass
+
+_session = None
+_session_lock = threading.Lock()
+
+def _make_session():
+    session = requests.Session()
+    retry = Retry(total=RETRIES, backoff_factor=RETRY_BACKOFF, status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset({'GET', 'HEAD'}), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_PER_HOST, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    # ACCEPT_ENCODING adds br/zstd when their decoders are installed
+    session.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': ACCEPT_ENCODING})
+    return session
+
+def get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _make_session()
+        return _session
+
+def reset_session():
+    """
+    Close every pooled connection; the next request starts a fresh session.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+def _timeout(timeout):
+    if timeout is None:
+        return (CONNECT_TIMEOUT, READ_TIMEOUT)
+    if isinstance(timeout, (int, float)):
+        return (min(CONNECT_TIMEOUT, timeout), timeout)
+    return timeout
+
+def get(url, headers=None, timeout=None) -> requests.Response:
+    """
+    Streaming GET on the shared session. `timeout` is the read timeout in seconds (or
+    a (connect, read) pair). The caller reads the body, e.g. with iter_content(), and
+    closes the response so its connection goes back to the pool.
+    """
+    response = get_session().get(url, headers=headers, timeout=_timeout(timeout), stream=True)
+    count(HTTP_REQUESTS, host=source_label(url), status=f'{response.status_code // 100}xx')
+    return response
+
+def iter_content(response, chunk_size=CHUNK_SIZE, max_bytes=MAX_RESPONSE_BYTES):
+    """
+    The (decompressed) body of `response` in chunks. Raises ResponseTooLarge as soon as
+    more than `max_bytes` arrive, or up front if Content-Length already says so.
+    """
+    host = source_label(response.url)
+    declared = response.headers.get('Content-Length', '')
+    if max_bytes and declared.isdigit() and int(declared) > max_bytes:
+        count(HTTP_TOO_LARGE, host=host)
+        raise ResponseTooLarge(f'{response.url} is {declared} bytes (limit {max_bytes})')
+    total = 0
+    for chunk in response.iter_content(chunk_size):
+        total += len(chunk)
+        count(HTTP_BYTES, len(chunk), host=host)
+        if max_bytes and total > max_bytes:
+            count(HTTP_TOO_LARGE, host=host)
+            raise ResponseTooLarge(f'{response.url} is larger than {max_bytes} bytes')
+        yield chunk
+
+def fetch(url, headers=None, timeout=None, max_bytes=MAX_RESPONSE_BYTES) -> requests.Response:
+    """
+    GET `url` and read the whole body, at most `max_bytes` of it. Raises HTTPError for
+    non-2xx statuses and ResponseTooLarge for oversized bodies. The returned response
+    has been closed, and its .content and .text are ready to use.
+    """
+    response = get(url, headers, timeout)
+    with response:
+        response.raise_for_status()
+        body = b''.join(iter_content(response, max_bytes=max_bytes))
+    # Where requests keeps a body it has already read
+    response._content = body
+    return response
+
+def pool_stats():
+    """
+    One row per host pool: connections opened, requests sent over them ('reused' of
+    those went over a kept-alive connection) and idle connections ready for reuse.
+    """
+    session = _session
+    if session is None:
+        return []
+    rows = []
+    for adapter in {id(a): a for a in session.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            rows.append({'host': f'{pool.scheme}://{pool.host}:{pool.port}', 'connections': pool.num_connections,
+                         'requests': pool.num_requests, 'reused': max(0, pool.num_requests - pool.num_connections),
+                         # The queue is pre-filled with None placeholders for connections not yet opened
+                         'idle': sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0})
+    return sorted(rows, key=lambda r: r['requests'], reverse=True)
@@ -1,8 +1,226 @@
-import logging
+"""
+Logging and lightweight instrumentation for Clearfeed.
+
+log_event() writes to clearfeed.log (level from CLEARFEED_LOG_LEVEL, default INFO).
+span() times a block or a function per stage and source, count() bumps a counter;
+both feed a process-wide registry that can be exported in the Prometheus text
+format or as a JSON snapshot.
+"""
 import os
+import json
+import time
+import logging
+import functools
+import threading
+from urllib.parse import urlparse
 
 LOG_PATH = os.path.join(os.path.dirname(__file__), '../clearfeed.log')
-logging.basicConfig(filename=LOG_PATH, level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+LOG_LEVEL = os.environ.get('CLEARFEED_LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(filename=LOG_PATH, level=LOG_LEVEL, format='%(asctime)s %(levelname)s:%(message)s')
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = 'clearfeed_stage_seconds'
+ERRORS = 'clearfeed_errors_total'
+TIMEOUTS = 'clearfeed_timeouts_total'
+CACHE_HITS = 'clearfeed_cache_hits_total'
+CACHE_MISSES = 'clearfeed_cache_misses_total'
+
+HELP = {
+    STAGE_SECONDS: 'Time spent per pipeline stage and source.',
+    ERRORS: 'Failed operations per stage.',
+    TIMEOUTS: 'Operations that timed out, per stage.',
+    CACHE_HITS: 'Cache lookups answered from the cache.',
+    CACHE_MISSES: 'Cache lookups that had to do the work.',
+}
+
+def log_event(event, level=logging.INFO, exc_info=False):
+    logging.log(level, event, exc_info=exc_info)
+
+def source_label(url):
+    """
+    The host of `url`, which is what per-source metrics are labelled with.
+    """
+    if not url:
+        return ''
+    return urlparse(url).netloc.lower() or url
+
+def is_timeout(exc):
+    # requests, openai and concurrent.futures all name their timeout exceptions "...Timeout..."
+    return isinstance(exc, TimeoutError) or 'timeout' in type(exc).__name__.lower()
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+class Metrics:
+    """
+    Thread-safe counters and cumulative latency histograms keyed by name and labels.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist['buckets'][i] += 1
+            hist['sum'] += seconds
+            hist['count'] += 1
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """
+        Plain-data copy of every metric, suitable for json.dumps.
+        """
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{'name': name, 'labels': dict(labels), 'count': h['count'], 'sum': h['sum'],
+                           'buckets': {**{_bound(b): n for b, n in zip(self.buckets, h['buckets'])}, '+Inf': h['count']}}
+                          for (name, labels), h in sorted(self.histograms.items())]
+        return {'timestamp': time.time(), 'counters': counters, 'histograms': histograms}
+
+    def to_prometheus(self):
+        """
+        Every metric in the Prometheus text exposition format.
+        """
+        snap = self.snapshot()
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# HELP {name} {HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for c in snap['counters']:
+            header(c['name'], 'counter')
+            lines.append(f"{c['name']}{_format_labels(c['labels'])} {c['value']}")
+        for h in snap['histograms']:
+            header(h['name'], 'histogram')
+            for bound, n in h['buckets'].items():
+                lines.append(f"{h['name']}_bucket{_format_labels({**h['labels'], 'le': bound})} {n}")
+            lines.append(f"{h['name']}_sum{_format_labels(h['labels'])} {h['sum']:.6f}")
+            lines.append(f"{h['name']}_count{_format_labels(h['labels'])} {h['count']}")
+        return '\n'.join(lines) + '\n'
+
+def _bound(b):
+    return f'{b:g}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+METRICS = Metrics()
+
+def count(name, value=1, **labels):
+    METRICS.inc(name, value, **labels)
+
+def record_error(stage, exc=None, source=None):
+    """
+    Count a failed `stage`; timeouts are also counted separately.
+    """
+    labels = {'stage': stage, 'source': source_label(source) if source else None}
+    METRICS.inc(ERRORS, **labels)
+    if exc is not None and is_timeout(exc):
+        METRICS.inc(TIMEOUTS, **labels)
+
+def record_timeout(stage, source=None):
+    # For timeouts noticed by whoever waits on the work (e.g. a future), not inside a span
+    record_error(stage, TimeoutError(), source)
+
+def record_cache(cache, hits=0, misses=0):
+    if hits:
+        METRICS.inc(CACHE_HITS, hits, cache=cache)
+    if misses:
+        METRICS.inc(CACHE_MISSES, misses, cache=cache)
+
+class span:
+    """
+    Time a block or a function as `stage`, optionally per `source` (a URL or host):
+
+        with span('download', source=url):
+            ...
+
+        @span('summarize')
+        def request_summary(...):
+            ...
+
+    The duration goes into the stage latency histogram whether or not the block
+    raises; exceptions are counted with record_error() and re-raised.
+    """
+    def __init__(self, stage, source=None):
+        self.stage = stage
+        self.source = source
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        source = source_label(self.source) if self.source else None
+        METRICS.observe(STAGE_SECONDS, time.perf_counter() - self.started, stage=self.stage, source=source)
+        if exc is not None:
+            record_error(self.stage, exc, self.source)
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            # A fresh span per call, so concurrent calls do not share a start time
+            with span(self.stage, self.source):
+                return fn(*args, **kwargs)
+        return timed
+
+def export_prometheus():
+    return METRICS.to_prometheus()
+
+def export_json():
+    return json.dumps(METRICS.snapshot(), indent=2)
+
+def write_metrics(path):
+    """
+    Write the current metrics to `path`, as JSON if it ends in .json and in the
+    Prometheus text format otherwise (e.g. for node_exporter's textfile collector).
+    The file is replaced atomically.
+    """
+    data = export_json() if path.endswith('.json') else export_prometheus()
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
 
-def log_event(event):
-    logging.info(event)
+def stage_table():
+    """
+    One row per (stage, source) with call count, total and mean seconds, busiest first.
+    """
+    rows = []
+    for h in METRICS.snapshot()['histograms']:
+        if h['name'] != STAGE_SECONDS:
+            continue
+        rows.append({'stage': h['labels'].get('stage'), 'source': h['labels'].get('source', ''), 'calls': h['count'],
+                     'total_s': round(h['sum'], 3), 'mean_s': round(h['sum'] / h['count'], 3) if h['count'] else None})
+    return sorted(rows, key=lambda r: r['total_s'], reverse=True)
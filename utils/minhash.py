@@ -0,0 +1,58 @@
+"""
+MinHash signatures and LSH banding for near-duplicate article detection.
+
+The fraction of equal positions in two signatures estimates the Jaccard similarity
+of the texts' word shingles. Signatures are split into BANDS bands of ROWS values;
+near-duplicates share at least one band with high probability, so candidates come
+from indexed bucket lookups instead of comparing every pair.
+"""
+import re
+import random
+import struct
+import hashlib
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+THRESHOLD = 0.7
+SHINGLE_SIZE = 3
+MIN_WORDS = 40
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+def signature(text):
+    """
+    MinHash signature (NUM_PERM ints) of the word shingles in `text`.
+    Returns None for texts too short to compare reliably.
+    """
+    words = _WORD_RE.findall((text or '').lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = {_hash64(' '.join(words[i:i + SHINGLE_SIZE]).encode('utf-8')) % _PRIME
+                for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return [min((a * h + b) % _PRIME for h in shingles) for a, b in _PERMUTATIONS]
+
+def similarity(sig_a, sig_b):
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+def band_buckets(sig):
+    """
+    One (band, bucket) pair per band; bucket is a signed 64-bit hash that fits an SQLite INTEGER.
+    """
+    buckets = []
+    for band in range(BANDS):
+        data = struct.pack(f'>{ROWS}Q', *sig[band * ROWS:(band + 1) * ROWS])
+        buckets.append((band, _hash64(data) - (1 << 63)))
+    return buckets
+
+def pack(sig):
+    return struct.pack(f'>{NUM_PERM}Q', *sig)
+
+def unpack(blob):
+    return list(struct.unpack(f'>{NUM_PERM}Q', blob))
@@ -1,42 +1,271 @@
+import json
+import time
+import datetime
+from email.utils import parsedate_to_datetime
+from xml.etree import ElementTree
 import feedparser
+import requests
 
-def parse_rss(url):
-    feed = feedparser.parse(url)
-    articles = []
-    for entry in feed.entries:
-        # Robust timestamp extraction
-        pub_fields = [
-            ('published_parsed', entry.get('published_parsed')),
-            ('updated_parsed', entry.get('updated_parsed')),
-            ('issued_parsed', entry.get('issued_parsed')),
-            ('created_parsed', entry.get('created_parsed')),
-            ('published', entry.get('published')),
-            ('updated', entry.get('updated')),
-            ('pubDate', entry.get('pubDate')),
-            ('date', entry.get('date')),
-            ('issued', entry.get('issued')),
-            ('created', entry.get('created')),
-        ]
-        pub_val = ''
-        pub_raw = {}
-        import time, datetime
-        for k, v in pub_fields:
-            if v:
-                pub_raw[k] = v
-                if isinstance(v, (tuple, time.struct_time)):
-                    try:
-                        pub_val = datetime.datetime(*v[:6], tzinfo=datetime.timezone.utc).isoformat().replace('+00:00', 'Z')
-                        break
-                    except Exception:
-                        continue
-                elif isinstance(v, str) and v.strip():
-                    pub_val = v.strip()
+from db import storage
+from utils import http_client
+from utils.logger import span, record_cache, record_error
+
+FEED_TIMEOUT = 15
+CHUNK_SIZE = 64 * 1024
+MAX_FEED_BYTES = 10 * 1024 * 1024
+MAX_CACHED_ENTRIES = 500
+
+# Timestamp fields in order of preference, as feedparser names them
+PUB_FIELDS = ('published_parsed', 'updated_parsed', 'issued_parsed', 'created_parsed',
+              'published', 'updated', 'pubDate', 'date', 'issued', 'created')
+# The same fields as XML element names (local part, namespace stripped)
+PUB_TAGS = ('pubDate', 'published', 'date', 'issued', 'created', 'updated', 'modified')
+ENTRY_TAGS = ('item', 'entry')
+
+def _iso_utc(dt):
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.astimezone(datetime.timezone.utc).replace(microsecond=0).isoformat().replace('+00:00', 'Z')
+
+def _entry_to_article(entry):
+    # Robust timestamp extraction
+    pub_val = ''
+    pub_raw = {}
+    for k in PUB_FIELDS:
+        v = entry.get(k)
+        if v:
+            pub_raw[k] = v
+            if isinstance(v, (tuple, time.struct_time)):
+                try:
+                    pub_val = _iso_utc(datetime.datetime(*v[:6]))
                     break
-        articles.append({
-            'title': entry.get('title', ''),
-            'link': entry.get('link', ''),
-            'summary': entry.get('summary', ''),
-            'published': pub_val,
-            'published_raw': pub_raw
-        })
-    return articles
+                except Exception:
+                    continue
+            elif isinstance(v, str) and v.strip():
+                pub_val = v.strip()
+                break
+    return {
+        'title': entry.get('title', ''),
+        'link': entry.get('link', ''),
+        'summary': entry.get('summary', ''),
+        'categories': [t.get('term') for t in entry.get('tags', []) if t.get('term')],
+        'published': pub_val,
+        'published_raw': pub_raw
+    }
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+def _normalize_date(value):
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            dt = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return value
+    return _iso_utc(dt)
+
+def _element_to_article(elem):
+    """
+    Build the same dict as _entry_to_article() from an RSS <item> or Atom <entry>.
+    """
+    fields = {}
+    link = ''
+    guid = ''
+    categories = []
+    for child in elem:
+        name = _local(child.tag)
+        text = (child.text or '').strip()
+        if name == 'link':
+            href = child.get('href')
+            if href is None and text and not link:
+                link = text
+            elif href and child.get('rel', 'alternate') == 'alternate' and not link:
+                link = href
+        elif name == 'guid' and child.get('isPermaLink', 'true') != 'false':
+            guid = text
+        elif name == 'category':
+            if child.get('term') or text:
+                categories.append(child.get('term') or text)
+        elif text and name not in fields:
+            fields[name] = text
+    pub_val = ''
+    pub_raw = {}
+    for tag in PUB_TAGS:
+        if tag in fields:
+            pub_raw[tag] = fields[tag]
+            if not pub_val:
+                pub_val = _normalize_date(fields[tag])
+    return {
+        'title': fields.get('title', ''),
+        'link': link or guid,
+        'summary': fields.get('description') or fields.get('summary') or fields.get('content') or fields.get('encoded', ''),
+        'categories': categories,
+        'published': pub_val,
+        'published_raw': pub_raw
+    }
+
+def iter_entries(chunks):
+    """
+    Yield articles from an RSS 1.0/2.0 or Atom document given as an iterable of byte
+    chunks, parsing incrementally: each entry is yielded as soon as its closing tag
+    arrives and dropped from the tree afterwards, so stopping early skips the rest of
+    the document. Malformed XML falls back to feedparser on the whole document,
+    skipping the entries already yielded.
+    """
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    received = []
+    chunks = iter(chunks)
+    stack = []
+    yielded = 0
+    try:
+        for chunk in chunks:
+            received.append(chunk)
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    stack.append(elem)
+                    continue
+                stack.pop()
+                if _local(elem.tag) in ENTRY_TAGS:
+                    article = _element_to_article(elem)
+                    if stack:
+                        stack[-1].remove(elem)
+                    yielded += 1
+                    yield article
+        parser.close()
+    except ElementTree.ParseError:
+        received.extend(chunks)
+        feed = feedparser.parse(b''.join(received))
+        for entry in feed.entries[yielded:]:
+            yield _entry_to_article(entry)
+        return
+    if not yielded and received:
+        # Well-formed but not a format we recognise: let feedparser have a go
+        for entry in feedparser.parse(b''.join(received)).entries:
+            yield _entry_to_article(entry)
+
+def _request(url, etag=None, modified=None):
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if modified:
+        headers['If-Modified-Since'] = modified
+    return http_client.get(url, headers=headers, timeout=FEED_TIMEOUT)
+
+def _read_entries(response, limit=None, wanted=None):
+    """
+    Stream entries out of `response`, stopping once `limit` entries satisfy `wanted`.
+    Returns (entries, complete) where complete is False if the feed was cut short,
+    either here or because it is larger than MAX_FEED_BYTES.
+    """
+    entries = []
+    matched = 0
+    with response:
+        try:
+            for article in iter_entries(http_client.iter_content(response, CHUNK_SIZE, MAX_FEED_BYTES)):
+                entries.append(article)
+                if limit and (wanted is None or wanted(article)):
+                    matched += 1
+                    if matched >= limit:
+                        return entries, False
+        except http_client.ResponseTooLarge as e:
+            record_error('feed.parse', e, response.url)
+            return entries, False
+    return entries, True
+
+def _entry_key(article):
+    return article.get('link') or article.get('title', '')
+
+def poll_feed(url, db_path=None, limit=None, match=None, new_only=False):
+    """
+    Fetch a feed with a conditional GET (If-None-Match / If-Modified-Since) using the
+    ETag and Last-Modified stored in `db_path` by the previous complete read.
+    With `limit`, parsing stops once `limit` entries satisfy `match` (and are new, with
+    `new_only`); the rest of the document is never read.
+    Returns a dict with the current 'entries', the 'new_entries' not seen on the
+    previous poll, 'not_modified' (True when the server answered 304) and 'error'
+    (why the poll failed, or None).
+    """
+    conn = storage.get_connection(db_path)
+    row = conn.execute('SELECT etag, modified, entries FROM feed_cache WHERE url = ?', (url,)).fetchone()
+    etag, modified, cached = row if row else (None, None, None)
+    cached_entries = json.loads(cached) if cached else None
+    seen = {_entry_key(a) for a in cached_entries or []}
+    error = None
+    try:
+        response = _request(url, etag, modified)
+    except requests.RequestException as e:
+        record_error('feed.parse', e, url)
+        response = None
+        error = e
+    if response is not None and response.status_code == 304 and cached_entries is not None:
+        record_cache('feed', hits=1)
+        response.close()
+        with conn:
+            conn.execute('UPDATE feed_cache SET fetched_at = ? WHERE url = ?', (time.time(), url))
+        return {'entries': cached_entries, 'new_entries': [], 'not_modified': True, 'error': None}
+    entries, complete = [], True
+    if response is not None:
+        if response.ok:
+            record_cache('feed', misses=1)
+            wanted = lambda a: (match is None or match(a)) and (not new_only or _entry_key(a) not in seen)
+            entries, complete = _read_entries(response, limit, wanted)
+        else:
+            record_error('feed.parse', source=url)
+            error = requests.HTTPError(f'{response.status_code} {response.reason} for {url}', response=response)
+            response.close()
+    if not entries:
+        # Fetch failed or the feed came back empty: serve the last good copy
+        return {'entries': cached_entries or [], 'new_entries': [], 'not_modified': False,
+                'error': error or ValueError(f'{url} has no feed entries')}
+    new_entries = [a for a in entries if _entry_key(a) not in seen]
+    stored = entries
+    etag, modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+    if not complete:
+        # Only the head of the feed was read; remember older entries so they are not new next time.
+        # Without validators the next poll reads the document again instead of getting a 304
+        # that would hide the entries below the head
+        head = {_entry_key(a) for a in entries}
+        stored = (entries + [a for a in cached_entries or [] if _entry_key(a) not in head])[:MAX_CACHED_ENTRIES]
+        etag = modified = None
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO feed_cache (url, etag, modified, entries, fetched_at) VALUES (?, ?, ?, ?, ?)',
+                     (url, etag, modified, json.dumps(stored), time.time()))
+    return {'entries': entries, 'new_entries': new_entries, 'not_modified': False, 'error': None}
+
+def parse_rss(url, use_cache=True, new_only=False, limit=None, match=None, on_error=None, on_total=None, db_path=None):
+    """
+    Entries of the feed at `url` that satisfy `match`, at most `limit` of them.
+    If the feed could not be fetched or had no entries, on_error(exception) is called
+    (the last good copy is still returned when there is one). on_total(count) gets
+    the number of such entries the feed has now, new or not. The feed cache lives in
+    `db_path`.
+    """
+    error = None
+    with span('feed.parse', source=url):
+        if use_cache:
+            result = poll_feed(url, db_path, limit=limit, match=match, new_only=new_only)
+            entries = result['new_entries'] if new_only else result['entries']
+            total = result['entries']
+            error = result['error']
+        else:
+            try:
+                response = _request(url)
+                response.raise_for_status()
+                entries, _ = _read_entries(response, limit, match)
+                total = entries
+                if not entries:
+                    error = ValueError(f'{url} has no feed entries')
+            except requests.RequestException as e:
+                record_error('feed.parse', e, url)
+                entries = total = []
+                error = e
+    if error is not None and on_error is not None:
+        on_error(error)
+    entries = [a for a in entries if match is None or match(a)]
+    if on_total is not None:
+        total = [a for a in total if match is None or match(a)]
+        on_total(min(len(total), limit) if limit else len(total))
+    return entries[:limit] if limit else entries
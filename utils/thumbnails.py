@@ -0,0 +1,196 @@
+"""
+Local thumbnail cache: article images are downloaded once, at ingestion, shrunk to the
+width the feed displays them at and stored on disk under the SHA-256 of their bytes.
+Pages then render local bytes, or the bundled placeholder, without hitting the image's
+origin or writing to the database.
+"""
+import io
+import os
+import time
+import hashlib
+import concurrent.futures
+from typing import Dict, List
+
+from db import storage
+from utils.logger import span, record_cache, record_error
+
+PLACEHOLDER_PATH = os.path.join(os.path.dirname(__file__), '../data/placeholder.png')
+THUMBNAIL_WIDTH = 120
+THUMBNAIL_MAX_HEIGHT = 240
+JPEG_QUALITY = 80
+MAX_CACHE_BYTES = 50 * 1024 * 1024
+# Larger downloads are abandoned; no article image needs more than this for a 120 px thumbnail
+MAX_IMAGE_BYTES = 8 * 1024 * 1024
+IMAGE_TIMEOUT = 10
+FAILED_RETRY_AFTER = 24 * 3600
+DOWNLOAD_WORKERS = 4
+
+_placeholder = None
+
+def placeholder_bytes() -> bytes:
+    global _placeholder
+    if _placeholder is None:
+        with open(PLACEHOLDER_PATH, 'rb') as f:
+            _placeholder = f.read()
+    return _placeholder
+
+def thumbnail_dir_for(db_path=None):
+    # Next to the database that records them, like the text archive
+    return os.path.join(os.path.dirname(os.path.abspath(db_path or storage.DB_PATH)), 'thumbnails')
+
+def _path(digest, thumbnail_dir):
+    return os.path.join(thumbnail_dir, digest[:2], f'{digest}.jpg')
+
+def make_thumbnail(data: bytes, width=THUMBNAIL_WIDTH, max_height=THUMBNAIL_MAX_HEIGHT) -> bytes:
+    """
+    JPEG of the image in `data`, no wider than `width` and no taller than `max_height`.
+    """
+    # Pillow and the HTTP client are only needed at ingestion, not by pages reading the cache
+    from PIL import Image
+    img = Image.open(io.BytesIO(data))
+    # Lets the JPEG decoder scale down while decoding instead of building the full-size image
+    img.draft('RGB', (width * 2, max_height * 2))
+    if img.mode in ('RGBA', 'LA', 'P'):
+        # Flatten transparency onto white, as the image would look on the page
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.thumbnail((width, max_height), Image.LANCZOS)
+    out = io.BytesIO()
+    img.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+    return out.getvalue()
+
+def _download(url, timeout):
+    from utils import http_client
+    with span('thumbnail', source=url):
+        return http_client.fetch(url, timeout=timeout, max_bytes=MAX_IMAGE_BYTES).content
+
+def _store(conn, url, thumbnail, thumbnail_dir):
+    digest = hashlib.sha256(thumbnail).hexdigest()
+    path = _path(digest, thumbnail_dir)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(thumbnail)
+        os.replace(tmp_path, path)
+    now = time.time()
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO thumbnails (digest, size, last_used_at) VALUES (?, ?, ?)',
+                     (digest, len(thumbnail), now))
+        conn.execute('INSERT OR REPLACE INTO thumbnail_urls (image_url, digest, fetched_at) VALUES (?, ?, ?)',
+                     (url, digest, now))
+    return digest
+
+def evict(max_bytes=None, db_path=None, thumbnail_dir=None):
+    """
+    Delete the least recently used thumbnails (cached, or seen again, at ingestion) until
+    the cache fits in `max_bytes`.
+    Returns the number of files removed.
+    """
+    max_bytes = max_bytes or MAX_CACHE_BYTES
+    thumbnail_dir = thumbnail_dir or thumbnail_dir_for(db_path)
+    conn = storage.get_connection(db_path)
+    stale = [row[0] for row in conn.execute('''
+        SELECT digest FROM (
+            SELECT digest, SUM(size) OVER (ORDER BY last_used_at DESC, rowid DESC) AS running FROM thumbnails
+        ) WHERE running > ?''', (max_bytes,))]
+    if not stale:
+        return 0
+    with conn:
+        for i in range(0, len(stale), 500):
+            chunk = stale[i:i + 500]
+            marks = ','.join('?' * len(chunk))
+            conn.execute(f'DELETE FROM thumbnails WHERE digest IN ({marks})', chunk)
+            conn.execute(f'DELETE FROM thumbnail_urls WHERE digest IN ({marks})', chunk)
+    for digest in stale:
+        try:
+            os.remove(_path(digest, thumbnail_dir))
+        except FileNotFoundError:
+            pass
+    return len(stale)
+
+def cache_thumbnails(image_urls: List[str], db_path=None, thumbnail_dir=None, timeout=IMAGE_TIMEOUT,
+                     max_workers=DOWNLOAD_WORKERS, max_bytes=None) -> int:
+    """
+    Download and thumbnail every image in `image_urls` that is not cached yet, a few
+    at a time, and mark the cached ones as used again. Images that recently failed
+    are skipped. Returns the number of new thumbnails.
+    """
+    urls = list(dict.fromkeys(u for u in image_urls if u and u.startswith(('http://', 'https://'))))
+    if not urls:
+        return 0
+    thumbnail_dir = thumbnail_dir or thumbnail_dir_for(db_path)
+    conn = storage.get_connection(db_path)
+    known = set()
+    reused = set()
+    for i in range(0, len(urls), 500):
+        chunk = urls[i:i + 500]
+        rows = conn.execute(f"SELECT image_url, digest FROM thumbnail_urls WHERE (digest IS NOT NULL OR fetched_at > ?) "
+                            f"AND image_url IN ({','.join('?' * len(chunk))})", [time.time() - FAILED_RETRY_AFTER, *chunk])
+        for url, digest in rows:
+            known.add(url)
+            if digest is not None:
+                reused.add(digest)
+    missing = [u for u in urls if u not in known]
+    record_cache('thumbnail', hits=len(known), misses=len(missing))
+    if reused:
+        # Recency is kept here, at ingestion, so rendering a page never writes
+        with conn:
+            conn.executemany('UPDATE thumbnails SET last_used_at = ? WHERE digest = ?',
+                             [(time.time(), digest) for digest in reused])
+    if not missing:
+        return 0
+
+    def fetch(url):
+        try:
+            return url, make_thumbnail(_download(url, timeout))
+        except Exception as e:
+            record_error('thumbnail', e, url)
+            return url, None
+
+    added = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as executor:
+        # Results are written from this thread, so the database connection is never shared
+        for url, thumbnail in executor.map(fetch, missing):
+            if thumbnail is None:
+                with conn:
+                    conn.execute('INSERT OR REPLACE INTO thumbnail_urls (image_url, digest, fetched_at) VALUES (?, NULL, ?)',
+                                 (url, time.time()))
+                continue
+            _store(conn, url, thumbnail, thumbnail_dir)
+            added += 1
+    evict(max_bytes, db_path, thumbnail_dir)
+    return added
+
+def load_thumbnails(image_urls: List[str], db_path=None, thumbnail_dir=None) -> Dict[str, bytes]:
+    """
+    Thumbnail bytes for the cached ones among `image_urls`, keyed by URL. Read-only:
+    never touches the network or writes to the database.
+    """
+    urls = list(dict.fromkeys(u for u in image_urls if u))
+    if not urls:
+        return {}
+    thumbnail_dir = thumbnail_dir or thumbnail_dir_for(db_path)
+    conn = storage.get_connection(db_path)
+    digests = {}
+    for i in range(0, len(urls), 500):
+        chunk = urls[i:i + 500]
+        rows = conn.execute(f"SELECT image_url, digest FROM thumbnail_urls WHERE digest IS NOT NULL "
+                            f"AND image_url IN ({','.join('?' * len(chunk))})", chunk)
+        digests.update((row[0], row[1]) for row in rows)
+    found = {}
+    for url, digest in digests.items():
+        try:
+            with open(_path(digest, thumbnail_dir), 'rb') as f:
+                found[url] = f.read()
+        except FileNotFoundError:
+            continue
+    return found
+
+def thumbnail_for(image_url, thumbnails: Dict[str, bytes]) -> bytes:
+    # What to hand st.image: the cached thumbnail, or the bundled placeholder
+    return thumbnails.get(image_url) or placeholder_bytes()
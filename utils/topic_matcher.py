@@ -0,0 +1,146 @@
+"""
+Match feed entries against a set of topics in one pass: every topic and its synonyms
+are compiled into a single regular expression with word boundaries.
+"""
+import re
+from functools import lru_cache
+from typing import List, Dict, Optional
+
+# The topics users can pick, by group (the group is the category sources are scouted under)
+GROUPED_TOPICS = {
+    'Sports': ['Football', 'Cricket', 'Tennis', 'Basketball', 'Baseball', 'Formula 1', 'Olympics', 'Golf', 'Hockey'],
+    'Health': [
+        'Diabetes', 'Cancer', 'Mental Health', 'Heart Disease', 'COVID-19', 'Nutrition', 'Fitness', 'Obesity', "Alzheimer's",
+        'Malaria', 'HIV/AIDS', 'Tuberculosis', 'Dengue', 'Zika', 'Ebola', 'Polio', 'Measles', 'Influenza', 'Asthma', 'Arthritis', 'Epilepsy', 'Autism', 'Parkinson\'s', 'Multiple Sclerosis', 'Lupus', 'Cystic Fibrosis', 'Rare Diseases'
+    ],
+    'Technology': ['Artificial Intelligence', 'Cybersecurity', 'Gadgets', 'Software Development', 'Space', 'Blockchain', 'Startups'],
+    'Science': ['Astronomy', 'Physics', 'Biology', 'Climate Change', 'Genetics', 'Chemistry'],
+    'World': ['Asia', 'Europe', 'Americas', 'Africa', 'Middle East', 'Oceania'],
+    'Business': ['Stock Market', 'Startups', 'Economy', 'Personal Finance', 'Real Estate', 'Cryptocurrency'],
+    'Education': ['EdTech', 'Higher Education', 'K-12', 'Online Learning'],
+    'Politics': ['Elections', 'Policy', 'International Relations', 'Government'],
+    'Entertainment': ['Movies', 'Music', 'Television', 'Celebrities', 'Gaming'],
+    'Climate': ['Global Warming', 'Renewable Energy', 'Wildlife', 'Pollution']
+}
+ALL_TOPICS = [topic for topics in GROUPED_TOPICS.values() for topic in topics]
+# A topic listed in several groups belongs to the last one
+TOPIC_TO_GROUP = {topic: group for group, topics in GROUPED_TOPICS.items() for topic in topics}
+
+# Extra ways articles refer to a topic; the topic name itself always matches
+TOPIC_SYNONYMS = {
+    'Football': ['soccer', 'Premier League', 'Champions League', 'FIFA', 'UEFA', 'NFL'],
+    'Cricket': ['Test match', 'IPL', 'ODI', 'T20'],
+    'Tennis': ['Wimbledon', 'US Open', 'Roland Garros', 'ATP', 'WTA'],
+    'Basketball': ['NBA', 'WNBA'],
+    'Baseball': ['MLB', 'World Series'],
+    'Formula 1': ['F1', 'Grand Prix', 'Formula One'],
+    'Olympics': ['Olympic', 'Olympic Games', 'Paralympics'],
+    'Golf': ['PGA', 'LIV Golf', 'Ryder Cup'],
+    'Hockey': ['NHL', 'ice hockey'],
+    'Diabetes': ['diabetic', 'insulin', 'blood sugar'],
+    'Cancer': ['tumour', 'tumor', 'oncology', 'chemotherapy', 'leukaemia', 'leukemia'],
+    'Mental Health': ['depression', 'anxiety', 'mental illness', 'psychiatry'],
+    'Heart Disease': ['cardiovascular', 'heart attack', 'cardiac', 'heart failure'],
+    'COVID-19': ['COVID', 'coronavirus', 'SARS-CoV-2', 'pandemic'],
+    'Nutrition': ['diet', 'dietary', 'nutrients'],
+    'Fitness': ['exercise', 'workout'],
+    'Obesity': ['obese', 'overweight', 'weight loss'],
+    "Alzheimer's": ['Alzheimer', 'Alzheimers', 'dementia'],
+    'HIV/AIDS': ['HIV', 'AIDS'],
+    'Tuberculosis': ['TB'],
+    'Influenza': ['flu', 'bird flu', 'H5N1'],
+    "Parkinson's": ['Parkinson', 'Parkinsons'],
+    'Multiple Sclerosis': ['MS'],
+    'Artificial Intelligence': ['AI', 'machine learning', 'deep learning', 'neural network', 'LLM', 'ChatGPT',
+                                'generative AI'],
+    'Cybersecurity': ['cyber security', 'cyberattack', 'ransomware', 'data breach', 'malware', 'hackers'],
+    'Gadgets': ['smartphone', 'iPhone', 'wearable', 'laptop'],
+    'Software Development': ['programming', 'software engineering', 'developers', 'open source'],
+    'Space': ['NASA', 'SpaceX', 'ESA', 'rocket launch', 'satellite', 'astronaut'],
+    'Blockchain': ['distributed ledger', 'smart contract'],
+    'Startups': ['startup', 'start-up', 'venture capital', 'seed round', 'Series A'],
+    'Astronomy': ['telescope', 'galaxy', 'exoplanet', 'astronomer'],
+    'Physics': ['physicist', 'quantum', 'particle'],
+    'Biology': ['biologist', 'cell biology', 'evolution'],
+    'Climate Change': ['climate crisis', 'global warming', 'emissions', 'net zero'],
+    'Genetics': ['genome', 'gene', 'DNA', 'CRISPR'],
+    'Chemistry': ['chemist', 'chemical'],
+    'Middle East': ['Israel', 'Gaza', 'Iran', 'Saudi Arabia', 'Syria'],
+    'Stock Market': ['stocks', 'shares', 'Wall Street', 'S&P 500', 'Nasdaq', 'Dow Jones'],
+    'Economy': ['economic', 'inflation', 'GDP', 'recession', 'interest rates'],
+    'Personal Finance': ['savings', 'mortgage', 'pension', 'budgeting'],
+    'Real Estate': ['housing market', 'property market', 'house prices'],
+    'Cryptocurrency': ['crypto', 'bitcoin', 'ethereum', 'stablecoin'],
+    'EdTech': ['education technology', 'ed tech'],
+    'Higher Education': ['university', 'universities', 'college'],
+    'K-12': ['school', 'schools', 'teachers'],
+    'Online Learning': ['e-learning', 'MOOC', 'remote learning'],
+    'Elections': ['election', 'vote', 'ballot', 'polls'],
+    'Policy': ['legislation', 'regulation'],
+    'International Relations': ['diplomacy', 'diplomatic', 'foreign policy', 'summit'],
+    'Government': ['parliament', 'congress', 'ministry', 'cabinet'],
+    'Movies': ['film', 'box office', 'Hollywood', 'cinema'],
+    'Music': ['album', 'concert', 'singer'],
+    'Television': ['TV series', 'streaming series', 'sitcom'],
+    'Celebrities': ['celebrity'],
+    'Gaming': ['video game', 'video games', 'esports', 'PlayStation', 'Xbox', 'Nintendo'],
+    'Global Warming': ['climate change', 'greenhouse gas', 'heatwave'],
+    'Renewable Energy': ['solar power', 'wind power', 'wind farm', 'renewables', 'clean energy'],
+    'Wildlife': ['endangered species', 'conservation', 'biodiversity'],
+    'Pollution': ['air quality', 'plastic waste', 'smog', 'contamination'],
+}
+
+def _term_pattern(term):
+    pattern = re.escape(term.strip()).replace(r'\ ', r'[\s-]+')
+    # Short acronyms (AI, MS, TB) only count in capitals, so "ms" and "ai" in ordinary text do not match
+    if term.isupper() and term.isalnum() and len(term) <= 4:
+        pattern = f'(?-i:{pattern})'
+    return pattern
+
+class TopicMatcher:
+    """
+    Finds which of `topics` a piece of text mentions. Matches whole words only,
+    case-insensitively except for short acronyms.
+    """
+    def __init__(self, topics: List[str], synonyms: Dict[str, List[str]] = TOPIC_SYNONYMS):
+        self.topics = list(dict.fromkeys(t for t in topics if t))
+        self._names = {}
+        groups = []
+        for i, topic in enumerate(self.topics):
+            terms = {topic, *synonyms.get(topic, [])}
+            # Longest first, so "generative AI" wins over "AI"
+            alternatives = '|'.join(_term_pattern(t) for t in sorted(terms, key=len, reverse=True))
+            self._names[f't{i}'] = topic
+            groups.append(f'(?P<t{i}>{alternatives})')
+        self.pattern = re.compile(r'(?<!\w)(?:' + '|'.join(groups) + r')(?!\w)', re.IGNORECASE)
+
+    def search(self, text: str) -> Optional[str]:
+        """
+        First topic mentioned in `text`, or None.
+        """
+        m = self.pattern.search(text or '')
+        return self._names[m.lastgroup] if m else None
+
+    def topics_in(self, text: str) -> List[str]:
+        """
+        All topics mentioned in `text`, in the order the matcher was given them.
+        """
+        found = {self._names[m.lastgroup] for m in self.pattern.finditer(text or '')}
+        return [t for t in self.topics if t in found]
+
+def entry_text(entry: Dict) -> str:
+    """
+    The metadata a feed entry is matched on: title, summary and the feed's own categories.
+    """
+    return ' \n '.join([entry.get('title') or '', entry.get('summary') or '', *entry.get('categories', [])])
+
+@lru_cache(maxsize=256)
+def _compile(topics):
+    return TopicMatcher(list(topics))
+
+def compile_matcher(topics) -> Optional[TopicMatcher]:
+    """
+    Cached TopicMatcher for `topics`, or None when there are no topics to match.
+    """
+    topics = tuple(dict.fromkeys(t for t in topics or [] if t))
+    return _compile(topics) if topics else None